@@ -0,0 +1,551 @@
+"""
+A haystack backend that stores search documents in PostgreSQL and queries
+them with full text search, for Councilmatic instances that would rather not
+run Solr, or as a fallback for when Solr is down. Configure it with, e.g.,
+
+    HAYSTACK_CONNECTIONS = {
+        "default": {
+            "ENGINE": "councilmatic_core.backends.postgres_backend.PostgresSearchEngine",
+            "SEARCH_CONFIG": "english",
+        },
+    }
+"""
+import datetime
+import json
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.fields.json import KeyTextTransform
+from haystack import connections
+from haystack.backends import (
+    BaseEngine,
+    BaseSearchBackend,
+    BaseSearchQuery,
+    SearchNode,
+    log_query,
+)
+from haystack.constants import DJANGO_CT, DJANGO_ID, ID
+from haystack.inputs import BaseInput
+from haystack.models import SearchResult
+from haystack.utils import get_model_ct
+from haystack.utils.app_loading import haystack_get_model
+
+from councilmatic_core.indexing import reset_document_hashes
+from councilmatic_core.models import SearchDocument
+
+
+# Indexed fields are weighted A to D, mirroring their boosts.
+WEIGHTS = ("A", "B", "C", "D")
+
+# Separates fragments of highlighted fields.
+FRAGMENT_DELIMITER = "\x1f"
+
+NARROW_QUERY_RE = re.compile(r'^(?P<field>\w+):"?(?P<value>.*?)"?$')
+
+
+def field_weight(field):
+    if field.boost > 1:
+        return "A"
+    elif field.document:
+        return "B"
+    return "C"
+
+
+def serialize(value):
+    if isinstance(value, (list, tuple, set)):
+        return [serialize(v) for v in value]
+    elif isinstance(value, datetime.datetime):
+        # Store UTC to the second, as haystack reads datetimes back, so
+        # values from results compare equal to stored ones.
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value.isoformat(timespec="seconds")
+    elif isinstance(value, datetime.date):
+        # Dates are indexed in DateTimeFields, which only read datetimes.
+        return serialize(datetime.datetime(value.year, value.month, value.day))
+    elif value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    def __init__(self, connection_alias, **connection_options):
+        super().__init__(connection_alias, **connection_options)
+        self.search_config = connection_options.get("SEARCH_CONFIG", "english")
+
+    def update(self, index, iterable, commit=True):
+        rows = []
+        params = []
+
+        for obj in iterable:
+            document = {
+                key: serialize(value) for key, value in index.full_prepare(obj).items()
+            }
+
+            weighted_text = {weight: [] for weight in WEIGHTS}
+
+            for field in index.fields.values():
+                value = document.get(field.index_fieldname)
+
+                # Like Solr, only search fields that aren't stored, e.g., bill
+                # texts, rather than keeping them in the document data.
+                if not field.stored:
+                    document.pop(field.index_fieldname, None)
+
+                if not field.indexed or hasattr(field, "facet_for") or not value:
+                    continue
+
+                if field.field_type not in ("string", "edge_ngram", "ngram"):
+                    continue
+
+                if isinstance(value, list):
+                    value = " ".join(str(v) for v in value if v)
+
+                weighted_text[field_weight(field)].append(str(value))
+
+            rows.append(
+                "(%s, %s, %s, %s, {})".format(
+                    " || ".join(
+                        "setweight(to_tsvector(%s::regconfig, %s), %s)" for _ in WEIGHTS
+                    )
+                )
+            )
+
+            params += [
+                document[ID],
+                document[DJANGO_CT],
+                document[DJANGO_ID],
+                json.dumps(document),
+            ]
+
+            for weight in WEIGHTS:
+                params += [self.search_config, " ".join(weighted_text[weight]), weight]
+
+        if not rows:
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO {table} (id, django_ct, django_id, data, search_vector)
+                VALUES {rows}
+                ON CONFLICT (id) DO UPDATE SET
+                  django_ct = EXCLUDED.django_ct,
+                  django_id = EXCLUDED.django_id,
+                  data = EXCLUDED.data,
+                  search_vector = EXCLUDED.search_vector
+                """.format(
+                    table=SearchDocument._meta.db_table, rows=", ".join(rows)
+                ),
+                params,
+            )
+
+    def remove(self, obj_or_string, commit=True):
+        if isinstance(obj_or_string, str):
+            documents = SearchDocument.objects.filter(id=obj_or_string)
+        else:
+            # Indexes may override the id field, e.g., BillIndex uses the
+            # bill's own id, so match objects by model and primary key.
+            documents = SearchDocument.objects.filter(
+                django_ct=get_model_ct(obj_or_string),
+                django_id=str(obj_or_string.pk),
+            )
+
+        documents.delete()
+
+    def clear(self, models=None, commit=True):
+        documents = SearchDocument.objects.all()
+
+        if models is not None:
+            documents = documents.filter(
+                django_ct__in=[get_model_ct(model) for model in models]
+            )
+
+        documents.delete()
+        reset_document_hashes(models)
+
+    @log_query
+    def search(self, query, **kwargs):
+        documents = SearchDocument.objects.filter(query)
+
+        if kwargs.get("models"):
+            models = [get_model_ct(model) for model in kwargs["models"]]
+        elif getattr(settings, "HAYSTACK_LIMIT_TO_REGISTERED_MODELS", True):
+            models = self.build_models_list()
+        else:
+            models = None
+
+        if models is not None:
+            documents = documents.filter(django_ct__in=models)
+
+        for narrow_query in kwargs.get("narrow_queries", []):
+            documents = documents.filter(self.narrow_query(narrow_query))
+
+        text_query = kwargs.get("text_query")
+
+        if text_query is not None:
+            documents = documents.annotate(
+                score=SearchRank(F("search_vector"), text_query)
+            )
+
+        documents = documents.order_by(*self.build_order_by(kwargs, text_query))
+
+        start_offset = kwargs.get("start_offset", 0)
+        end_offset = kwargs.get("end_offset")
+
+        hits = documents.count()
+        page = list(documents[start_offset:end_offset])
+
+        highlights = {}
+        if kwargs.get("highlight") and text_query is not None and page:
+            highlights = self.highlight(
+                [document.id for document in page], text_query, kwargs["highlight"]
+            )
+
+        result_class = kwargs.get("result_class") or SearchResult
+        results = [
+            self.build_result(
+                document,
+                result_class,
+                highlights.get(document.id),
+                fields=kwargs.get("fields"),
+            )
+            for document in page
+        ]
+
+        facets = {}
+        if kwargs.get("facets"):
+            facets = {
+                "fields": {
+                    field: self.facet_counts(documents, field, options)
+                    for field, options in kwargs["facets"].items()
+                },
+                "dates": {},
+                "queries": {},
+            }
+
+        return {
+            "results": results,
+            "hits": hits,
+            "facets": facets,
+            "spelling_suggestion": None,
+        }
+
+    def narrow_query(self, narrow_query):
+        # Narrow queries are strings like 'bill_type_exact:"ordinance"'.
+        match = NARROW_QUERY_RE.match(narrow_query)
+        return self.field_query(match.group("field"), "exact", match.group("value"))
+
+    def field_query(self, field_name, filter_type, value):
+        field = (
+            connections[self.connection_alias]
+            .get_unified_index()
+            .all_searchfields()
+            .get(field_name)
+        )
+
+        key = "data__{}".format(field_name)
+        value = serialize(value)
+
+        if filter_type == "in":
+            query = Q()
+            for v in value:
+                query |= self.field_query(field_name, "exact", v)
+            return query
+
+        if filter_type == "range":
+            start, end = value
+            return Q(**{key + "__gte": start, key + "__lte": end})
+
+        if filter_type in ("gt", "gte", "lt", "lte", "startswith"):
+            return Q(**{"{}__{}".format(key, filter_type): value})
+
+        if (
+            field is not None
+            and field.field_type == "edge_ngram"
+            and filter_type in ("content", "contains")
+        ):
+            # Match words that start with value, as edge n-grams do.
+            return Q(**{key + "__iregex": r"\m" + re.escape(value)})
+
+        if field is not None and field.is_multivalued:
+            return Q(**{key + "__contains": [value]})
+
+        if filter_type == "exact":
+            return Q(**{key: value})
+
+        return Q(**{key + "__icontains": value})
+
+    def build_order_by(self, kwargs, text_query):
+        order_by = []
+
+        for field_name in kwargs.get("sort_by") or []:
+            descending = field_name.startswith("-")
+            field_name = field_name.lstrip("-")
+
+            if field_name == "score":
+                if text_query is not None:
+                    order_by.append(
+                        F("score").asc() if not descending else F("score").desc()
+                    )
+                continue
+
+            expression = KeyTextTransform(field_name, "data")
+            order_by.append(
+                expression.desc(nulls_last=True)
+                if descending
+                else expression.asc(nulls_last=True)
+            )
+
+        if not order_by and text_query is not None:
+            order_by.append(F("score").desc())
+
+        # Break ties consistently, so pages don't overlap.
+        order_by.append("id")
+
+        return order_by
+
+    def highlight(self, ids, text_query, options):
+        """
+        Return fragments of the highlighted fields around matches of
+        text_query, by document. options is True, to highlight the document
+        field, or a dict of Solr highlighting options, of which fl, snippets
+        and fragsize are supported.
+        """
+        if not isinstance(options, dict):
+            options = {}
+
+        content_field = (
+            connections[self.connection_alias].get_unified_index().document_field
+        )
+        fields = options.get("fl", content_field).split(",")
+
+        headline_options = {}
+
+        if "snippets" in options:
+            headline_options["max_fragments"] = int(options["snippets"])
+            headline_options["fragment_delimiter"] = FRAGMENT_DELIMITER
+
+        if "fragsize" in options:
+            # Fragments are sized in words, rather than characters.
+            max_words = max(int(options["fragsize"]) // 6, 2)
+            headline_options["max_words"] = max_words
+            headline_options["min_words"] = max_words // 2
+
+        headlines = {
+            "headline_{}".format(i): SearchHeadline(
+                KeyTextTransform(field, "data"),
+                text_query,
+                config=self.search_config,
+                start_sel="<em>",
+                stop_sel="</em>",
+                **headline_options
+            )
+            for i, field in enumerate(fields)
+        }
+
+        highlights = {}
+
+        for document_id, *fragments in (
+            SearchDocument.objects.filter(id__in=ids)
+            .annotate(**headlines)
+            .values_list("id", *headlines)
+        ):
+            # Like Solr, leave out fields without matches, whose headline is
+            # the start of the field.
+            highlights[document_id] = {
+                field: field_fragments.split(FRAGMENT_DELIMITER)
+                for field, field_fragments in zip(fields, fragments)
+                if field_fragments and "<em>" in field_fragments
+            }
+
+        return highlights
+
+    def facet_counts(self, documents, field_name, options):
+        """
+        Return (value, count) pairs for field_name over documents, with a
+        grouped query. Multivalued fields are counted per value. The prefix
+        option matches the start of values, ignoring case.
+        """
+        subquery, subquery_params = (
+            documents.order_by().values("id").query.sql_with_params()
+        )
+
+        order_by = "value" if options.get("sort") == "index" else "count DESC, value"
+
+        sql = """
+            SELECT value, COUNT(*) AS count
+            FROM {table} AS d
+            CROSS JOIN LATERAL jsonb_array_elements_text(
+                CASE jsonb_typeof(d.data -> %s)
+                  WHEN 'array' THEN d.data -> %s
+                  ELSE jsonb_build_array(d.data -> %s)
+                END
+            ) AS value
+            WHERE d.id IN ({subquery}) AND value IS NOT NULL AND value ILIKE %s
+            GROUP BY value
+            HAVING COUNT(*) >= %s
+            ORDER BY {order_by}
+        """.format(
+            table=SearchDocument._meta.db_table,
+            subquery=subquery,
+            order_by=order_by,
+        )
+
+        prefix = re.sub(r"([\\%_])", r"\\\1", options.get("prefix", ""))
+
+        params = [field_name, field_name, field_name, *subquery_params]
+        params.append(prefix + "%")
+        params.append(options.get("mincount", 1))
+
+        limit = options.get("limit")
+        if limit is not None and limit >= 0:
+            sql += " LIMIT %s"
+            params.append(limit)
+
+        if options.get("offset"):
+            sql += " OFFSET %s"
+            params.append(options["offset"])
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def build_result(self, document, result_class, highlight=None, fields=None):
+        app_label, model_name = document.django_ct.split(".")
+
+        unified_index = connections[self.connection_alias].get_unified_index()
+        model = haystack_get_model(app_label, model_name)
+        index = unified_index.get_index(model) if model else None
+
+        stored_fields = {}
+
+        for key, value in document.data.items():
+            # Like Solr, keep the id, which cursors break ties by.
+            if key in (DJANGO_CT, DJANGO_ID):
+                continue
+
+            if fields and key not in fields:
+                continue
+
+            if index is not None and key in index.fields:
+                if not index.fields[key].stored:
+                    continue
+
+                value = index.fields[key].convert(value)
+
+            stored_fields[key] = value
+
+        if highlight is not None:
+            stored_fields["highlighted"] = highlight
+
+        return result_class(
+            app_label,
+            model_name,
+            document.django_id,
+            getattr(document, "score", 0),
+            **stored_fields
+        )
+
+
+class PostgresSearchQuery(BaseSearchQuery):
+    """
+    Compile the query tree into a Q object over SearchDocument, rather than a
+    query string.
+    """
+
+    def clean(self, query_fragment):
+        # Values are passed as query parameters, so nothing needs escaping.
+        return query_fragment
+
+    def build_query(self):
+        return self.build_q(self.query_filter)
+
+    def build_q(self, node):
+        query = Q()
+
+        for child in node.children:
+            if isinstance(child, SearchNode):
+                child_query = self.build_q(child)
+            else:
+                expression, value = child
+                field, filter_type = node.split_expression(expression)
+                child_query = self.build_query_fragment(field, filter_type, value)
+
+            if node.connector == SearchNode.OR:
+                query |= child_query
+            else:
+                query &= child_query
+
+        if node.negated:
+            query = ~query
+
+        return query
+
+    def build_query_fragment(self, field, filter_type, value):
+        if isinstance(value, BaseInput):
+            value = value.query_string
+
+        if self.is_text_query(field, filter_type):
+            return Q(search_vector=self.text_query(value))
+
+        return self.backend.field_query(field, filter_type, value)
+
+    def is_text_query(self, field, filter_type):
+        unified_index = connections[self._using].get_unified_index()
+        return field in ("content", unified_index.document_field) and filter_type in (
+            "content",
+            "contains",
+            "exact",
+            "fuzzy",
+        )
+
+    def text_query(self, value):
+        return SearchQuery(
+            str(value), search_type="websearch", config=self.backend.search_config
+        )
+
+    def build_text_query(self, node=None):
+        """
+        Combine the full text terms of the query, to rank and highlight
+        results by.
+        """
+        node = node or self.query_filter
+        text_queries = []
+
+        for child in node.children:
+            if isinstance(child, SearchNode):
+                if not child.negated:
+                    text_query = self.build_text_query(child)
+                    if text_query is not None:
+                        text_queries.append(text_query)
+            else:
+                expression, value = child
+                field, filter_type = node.split_expression(expression)
+
+                if self.is_text_query(field, filter_type):
+                    if isinstance(value, BaseInput):
+                        value = value.query_string
+                    text_queries.append(self.text_query(value))
+
+        if not text_queries:
+            return None
+
+        text_query = text_queries[0]
+        for other in text_queries[1:]:
+            text_query &= other
+
+        return text_query
+
+    def build_params(self, spelling_query=None):
+        kwargs = super().build_params(spelling_query=spelling_query)
+        kwargs["text_query"] = self.build_text_query()
+        return kwargs
+
+
+class PostgresSearchEngine(BaseEngine):
+    backend = PostgresSearchBackend
+    query = PostgresSearchQuery
@@ -0,0 +1,40 @@
+"""
+haystack's Solr backend, resetting the hashes update_bill_index records of
+posted bill documents when the index is cleared, e.g., by rebuild_index or
+clear_index. Configure it with, e.g.,
+
+    HAYSTACK_CONNECTIONS = {
+        "default": {
+            "ENGINE": "councilmatic_core.backends.solr_backend.SolrEngine",
+            "URL": "http://127.0.0.1:8983/solr/councilmatic",
+        },
+    }
+
+Documents removed from Solr directly, e.g., by deleting the core, leave their
+hashes behind, so run update_bill_index --force to post them again. Set
+RESET_DOCUMENT_HASHES to False for connections to cores other than the live
+one, like the standby core of update_bill_index --swap.
+"""
+from haystack.backends import solr_backend
+
+from councilmatic_core.indexing import reset_document_hashes
+
+
+class SolrSearchBackend(solr_backend.SolrSearchBackend):
+    def __init__(self, connection_alias, **connection_options):
+        super().__init__(connection_alias, **connection_options)
+
+        # Standby cores, e.g., don't hold the documents the hashes describe.
+        self.reset_document_hashes = connection_options.get(
+            "RESET_DOCUMENT_HASHES", True
+        )
+
+    def clear(self, models=None, commit=True):
+        super().clear(models=models, commit=commit)
+
+        if self.reset_document_hashes:
+            reset_document_hashes(models)
+
+
+class SolrEngine(solr_backend.SolrEngine):
+    backend = SolrSearchBackend
@@ -0,0 +1,508 @@
+"""
+Benchmark bill search on a synthetic corpus, indexed by the PostgreSQL search
+backend as a local stand-in for Solr, by replaying a log of searches through
+the search form. Report latency, throughput and how much the hits of each
+search overlap with those of a baseline run, so changes to BillIndex, the
+search form or the view can be compared.
+
+The corpus is generated from a seed, so runs with the same seed index the
+same bills, with the same ids, and their hits can be compared.
+"""
+import collections
+import datetime
+import json
+import math
+import random
+import time
+import urllib.parse
+
+from django.conf import settings
+from haystack import connections as haystack_connections
+from haystack.query import SearchQuerySet
+from opencivicdata.core.models import Division, Jurisdiction
+from opencivicdata.legislative.models import BillAbstract, LegislativeSession
+
+from .indexing import bill_queryset, get_bill_index, index_range, pk_ranges
+from .backends.postgres_backend import PostgresSearchBackend
+from .models import (
+    BillAction,
+    BillActionRelatedEntity,
+    BillSponsorship,
+    Organization,
+    Person,
+    SearchDocument,
+)
+from .search import (
+    SEARCH_FACET_FIELDS,
+    limit_facets,
+    only_bills,
+    with_default_order,
+    with_highlighting,
+)
+from .views import CouncilmaticSearchForm
+
+
+BENCHMARK_CONNECTION = "benchmark"
+
+BENCHMARK_SESSION = "benchmark"
+
+BILL_TYPES = [
+    ("ordinance", "O", 5),
+    ("resolution", "R", 3),
+    ("order", "Or", 4),
+    ("appointment", "A", 1),
+    ("claim", "CL", 2),
+]
+
+SUBJECTS = [
+    "sidewalk cafe permit",
+    "business license",
+    "zoning reclassification",
+    "property tax exemption",
+    "grant agreement",
+    "intergovernmental agreement",
+    "landmark designation",
+    "traffic signal",
+    "parking restriction",
+    "loading zone",
+    "tax increment financing district",
+    "affordable housing program",
+    "water main replacement",
+    "sign permit",
+    "vehicle damage claim",
+    "public way encroachment",
+    "special service area",
+    "bond issuance",
+    "budget amendment",
+    "police accountability",
+    "community development grant",
+    "lease agreement",
+    "street renaming",
+    "health department contract",
+    "snow removal",
+]
+
+VERBS = [
+    "Amendment of",
+    "Authorization of",
+    "Approval of",
+    "Issuance of",
+    "Extension of",
+    "Repeal of",
+    "Designation of",
+    "Call for hearing on",
+]
+
+STREETS = [
+    "Main St",
+    "Ashland Ave",
+    "Halsted St",
+    "Western Ave",
+    "Madison St",
+    "Lake Shore Dr",
+    "Cermak Rd",
+    "Pulaski Rd",
+    "Fullerton Ave",
+    "Division St",
+]
+
+FILLER = (
+    "the city shall department commissioner agreement ordinance section "
+    "municipal code hereby amended provided funds fiscal year program public "
+    "property contract authorized execute pursuant chapter council approval "
+    "requirements applicant notice hearing resident ward district services"
+).split()
+
+FIRST_NAMES = [
+    "Maria",
+    "James",
+    "Aisha",
+    "Robert",
+    "Mei",
+    "Carlos",
+    "Patricia",
+    "Samuel",
+    "Fatima",
+    "Thomas",
+]
+
+LAST_NAMES = [
+    "Hernandez",
+    "Johnson",
+    "Okafor",
+    "Kowalski",
+    "Chen",
+    "Murphy",
+    "Nguyen",
+    "Reilly",
+    "Washington",
+    "Burke",
+    "Lopez",
+    "Sawyer",
+]
+
+COMMITTEES = [
+    "Committee on Finance",
+    "Committee on Zoning, Landmarks and Building Standards",
+    "Committee on Transportation and Public Way",
+    "Committee on Public Safety",
+    "Committee on Housing and Real Estate",
+    "Committee on License and Consumer Protection",
+]
+
+
+def zipf_choice(rng, values, exponent=1.0):
+    """
+    Return a value of values, the first ones most often, as words are in
+    real text.
+    """
+    weights = [1 / (rank + 1) ** exponent for rank in range(len(values))]
+    return rng.choices(values, weights=weights)[0]
+
+
+def paragraph(rng, words):
+    return " ".join(zipf_choice(rng, FILLER) for _ in range(words)).capitalize()
+
+
+def generate_corpus(count, seed=0):
+    """
+    Create count synthetic bills, with sponsors, actions, abstracts and
+    texts, in a legislative session of their own. Return the session.
+    """
+    rng = random.Random(seed)
+    index = get_bill_index(BENCHMARK_CONNECTION)
+    bill_model = index.get_model()
+
+    division = Division.objects.create(
+        id="ocd-division/country:us/state:zz/place:benchmark",
+        name="Benchmark City",
+    )
+    jurisdiction = Jurisdiction.objects.create(
+        id="ocd-jurisdiction/country:us/state:zz/place:benchmark/government",
+        name="Benchmark City Government",
+        url="https://example.com",
+        classification="government",
+        division=division,
+    )
+    session = LegislativeSession.objects.create(
+        jurisdiction=jurisdiction,
+        identifier=BENCHMARK_SESSION,
+        name="Benchmark Session",
+        start_date="2019-01-01",
+        end_date="2023-12-31",
+    )
+
+    council = Organization.objects.create(
+        id="ocd-organization/benchmark-council",
+        name="Benchmark City Council",
+        classification="legislature",
+        jurisdiction=jurisdiction,
+        slug="benchmark-city-council",
+    )
+    committees = [
+        Organization.objects.create(
+            id="ocd-organization/benchmark-committee-{}".format(i),
+            name=name,
+            classification="committee",
+            jurisdiction=jurisdiction,
+            slug="benchmark-committee-{}".format(i),
+        )
+        for i, name in enumerate(COMMITTEES)
+    ]
+    people = [
+        Person.objects.create(
+            name="{} {}".format(first_name, last_name),
+            slug="benchmark-{}-{}".format(first_name, last_name).lower(),
+        )
+        for last_name in LAST_NAMES
+        for first_name in FIRST_NAMES
+    ]
+
+    bill_types = [bill_type for bill_type, _, _ in BILL_TYPES]
+    prefixes = {bill_type: prefix for bill_type, prefix, _ in BILL_TYPES}
+    type_weights = [weight for _, _, weight in BILL_TYPES]
+
+    for i in range(count):
+        bill_type = rng.choices(bill_types, weights=type_weights)[0]
+        subject = zipf_choice(rng, SUBJECTS)
+        introduced = datetime.date(2019, 1, 1) + datetime.timedelta(
+            days=rng.randrange(5 * 365)
+        )
+
+        title = "{} {} at {} {}".format(
+            rng.choice(VERBS), subject, rng.randrange(100, 9999), rng.choice(STREETS)
+        )
+        if rng.random() < 0.3:
+            title += ". " + paragraph(rng, rng.randrange(10, 40))
+
+        extras = {}
+        if rng.random() < 0.5:
+            extras["plain_text"] = "\n\n".join(
+                paragraph(rng, rng.randrange(50, 300))
+                for _ in range(rng.randrange(1, 6))
+            )
+
+        bill = bill_model.objects.create(
+            id="ocd-bill/benchmark-{}".format(i),
+            identifier="{}{}-{}".format(prefixes[bill_type], introduced.year, i),
+            title=title,
+            slug="benchmark-{}".format(i),
+            legislative_session=session,
+            classification=[bill_type],
+            extras=extras,
+        )
+
+        for j, person in enumerate(rng.sample(people, rng.randrange(1, 4))):
+            BillSponsorship.objects.create(
+                bill=bill, person=person, name=person.name, primary=j == 0
+            )
+
+        if rng.random() < 0.4:
+            BillAbstract.objects.create(
+                bill=bill, abstract=paragraph(rng, rng.randrange(20, 80))
+            )
+
+        committee = zipf_choice(rng, committees)
+        steps = [
+            (council, "Introduced", None),
+            (council, "Referred", committee),
+            (committee, "Recommended to Pass", None),
+            (council, "Passed", None),
+        ]
+
+        date = introduced
+        for order, (organization, description, referred_to) in enumerate(
+            steps[: rng.randrange(1, len(steps) + 1)], start=1
+        ):
+            action = BillAction.objects.create(
+                bill=bill,
+                organization=organization,
+                description=description,
+                date=date.isoformat(),
+                order=order,
+            )
+
+            if referred_to:
+                BillActionRelatedEntity.objects.create(
+                    action=action,
+                    organization=referred_to,
+                    name=referred_to.name,
+                    entity_type="organization",
+                )
+
+            date += datetime.timedelta(days=rng.randrange(1, 60))
+
+        bill.last_action_date = action.date
+        bill.save()
+
+    return session
+
+
+def shared_search_connections():
+    """
+    Return the aliases of the other search connections that use the
+    PostgreSQL backend, whose documents share a table with the benchmark's.
+    """
+    return sorted(
+        alias
+        for alias in settings.HAYSTACK_CONNECTIONS
+        if alias != BENCHMARK_CONNECTION
+        and isinstance(haystack_connections[alias].get_backend(), PostgresSearchBackend)
+    )
+
+
+def index_corpus(batch_size=500):
+    """
+    Index the synthetic bills, and only them, on the benchmark connection.
+    No other connection may use the PostgreSQL backend, since documents left
+    in its table would be searched too.
+    """
+    # Documents left by an earlier configuration. The backend's clear() would
+    # also reset the hashes recorded on every bill.
+    SearchDocument.objects.all().delete()
+
+    index = get_bill_index(BENCHMARK_CONNECTION)
+    qs = bill_queryset(index, BENCHMARK_CONNECTION, sessions=[BENCHMARK_SESSION])
+
+    counts = collections.Counter(posted=0, skipped=0)
+
+    for start, end in pk_ranges(qs, batch_size):
+        counts.update(
+            index_range(
+                BENCHMARK_CONNECTION,
+                start,
+                end,
+                batch_size,
+                force=True,
+                sessions=[BENCHMARK_SESSION],
+            )
+        )
+
+    return counts
+
+
+def add_benchmark_connection():
+    """
+    Add the benchmark search connection, unless the settings configure it.
+    """
+    settings.HAYSTACK_CONNECTIONS.setdefault(
+        BENCHMARK_CONNECTION,
+        {"ENGINE": "councilmatic_core.backends.postgres_backend.PostgresSearchEngine"},
+    )
+
+
+def query_key(query):
+    return urllib.parse.urlencode(
+        [("q", query["q"])]
+        + [("selected_facets", facet) for facet in query.get("selected_facets", [])]
+    )
+
+
+def read_query_log(lines):
+    """
+    Return the searches of a query log, with a search per line: either its
+    terms, or a JSON object with "q" and "selected_facets", e.g.,
+    {"q": "zoning", "selected_facets": ["bill_type_exact:ordinance"]}.
+    """
+    queries = []
+
+    for line in lines:
+        line = line.strip()
+
+        if not line:
+            continue
+        elif line.startswith("{"):
+            query = json.loads(line)
+            queries.append(
+                {
+                    "q": query.get("q", ""),
+                    "selected_facets": query.get("selected_facets", []),
+                }
+            )
+        else:
+            queries.append({"q": line, "selected_facets": []})
+
+    return queries
+
+
+def synthetic_queries(count, seed=0):
+    """
+    Return count searches like those users make of the synthetic corpus:
+    subjects, sponsors and streets, some narrowed to a bill type, and some
+    with no terms at all.
+    """
+    rng = random.Random(seed)
+    queries = []
+
+    for _ in range(count):
+        kind = rng.random()
+
+        if kind < 0.4:
+            words = zipf_choice(rng, SUBJECTS).split()
+            q = " ".join(words[: rng.randrange(1, len(words) + 1)])
+        elif kind < 0.6:
+            q = rng.choice(LAST_NAMES)
+        elif kind < 0.75:
+            q = rng.choice(STREETS)
+        elif kind < 0.9:
+            q = " ".join(rng.sample(FILLER, 2))
+        else:
+            q = ""
+
+        selected_facets = []
+        if rng.random() < 0.2:
+            selected_facets.append(
+                "bill_type_exact:{}".format(rng.choice(BILL_TYPES)[0])
+            )
+
+        queries.append({"q": q, "selected_facets": selected_facets})
+
+    return queries
+
+
+def run_search(query, page_size=20):
+    """
+    Search as the search view does, for its first page of results and facet
+    counts. Return the ids of the bills on the page.
+    """
+    searchqueryset = only_bills(SearchQuerySet(using=BENCHMARK_CONNECTION))
+    for field in SEARCH_FACET_FIELDS:
+        searchqueryset = searchqueryset.facet(field)
+
+    form = CouncilmaticSearchForm(
+        {"q": query["q"]},
+        searchqueryset=searchqueryset,
+        selected_facets=query.get("selected_facets", []),
+    )
+    results = form.search()
+
+    if form.is_valid() and form.cleaned_data["q"]:
+        results = with_highlighting(results, form.cleaned_data["q"])
+    else:
+        results = with_default_order(results)
+
+    results = limit_facets(results)
+    results.facet_counts()
+
+    return [result.pk for result in results[:page_size]]
+
+
+def replay(queries, page_size=20):
+    """
+    Run each search, and return its key, hits and latency in seconds.
+    """
+    runs = []
+
+    for query in queries:
+        start = time.perf_counter()
+        hits = run_search(query, page_size=page_size)
+        latency = time.perf_counter() - start
+
+        runs.append({"query": query_key(query), "hits": hits, "latency": latency})
+
+    return runs
+
+
+def percentile(values, p):
+    """
+    Return the p-th percentile of values, by the nearest rank.
+    """
+    values = sorted(values)
+    rank = max(math.ceil(p / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def overlap(hits, baseline_hits):
+    """
+    Return the share of the baseline hits of a search that it still finds,
+    in any order. A search with no hits before or after overlaps fully.
+    """
+    if not baseline_hits:
+        return 1.0 if not hits else 0.0
+
+    return len(set(hits) & set(baseline_hits)) / len(baseline_hits)
+
+
+def summarize(runs, elapsed, baseline=None):
+    """
+    Return latency percentiles in milliseconds, searches per second and, if
+    a baseline run is given, the overlap of each search with it.
+    """
+    latencies = [run["latency"] for run in runs]
+
+    summary = {
+        "queries": len(runs),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "qps": len(runs) / elapsed if elapsed else 0,
+    }
+
+    if baseline is not None:
+        baseline_hits = {run["query"]: run["hits"] for run in baseline}
+        summary["overlap"] = {
+            run["query"]: overlap(run["hits"], baseline_hits[run["query"]])
+            for run in runs
+            if run["query"] in baseline_hits
+        }
+
+    return summary
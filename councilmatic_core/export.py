@@ -0,0 +1,215 @@
+import csv
+import itertools
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from opencivicdata.legislative.models import (
+    BillAbstract,
+    BillAction,
+    BillSponsorship,
+    EventAgendaItem,
+)
+
+from .models import Bill, Event
+
+
+EXPORT_CHUNK_SIZE = 500
+
+# Seconds browsers and proxies may cache a download of an export.
+EXPORT_MAX_AGE = getattr(settings, "EXPORT_MAX_AGE", 60 * 60 * 24)
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def _group_by(rows, key):
+    grouped = {}
+
+    for row in rows:
+        grouped.setdefault(row.pop(key), []).append(row)
+
+    return grouped
+
+
+def _export(queryset, related, fk, chunk_size):
+    """
+    Stream rows from queryset through a server-side cursor, attaching related
+    rows to each chunk with one query per relation. Only chunk_size parent
+    rows (and their children) are held in memory at any time.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+
+    for chunk in _chunked(rows, chunk_size):
+        ids = [row["id"] for row in chunk]
+
+        children = {
+            name: _group_by(related_qs.filter(**{fk + "__in": ids}), fk)
+            for name, related_qs in related.items()
+        }
+
+        for row in chunk:
+            for name, grouped in children.items():
+                row[name] = grouped.get(row["id"], [])
+
+            yield row
+
+
+def export_bills(chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield one dictionary per public bill, with its actions, sponsorships and
+    abstracts nested as lists.
+    """
+    bills = (
+        Bill.objects.filter(restrict_view=False)
+        .order_by("id")
+        .values(
+            "id",
+            "slug",
+            "identifier",
+            "title",
+            "classification",
+            "subject",
+            "last_action_date",
+            "created_at",
+            "updated_at",
+            session=F("legislative_session__identifier"),
+            from_organization_name=F("from_organization__name"),
+        )
+    )
+
+    related = {
+        "actions": BillAction.objects.order_by("bill_id", "order").values(
+            "bill_id",
+            "order",
+            "date",
+            "description",
+            "classification",
+            organization_name=F("organization__name"),
+        ),
+        "sponsorships": BillSponsorship.objects.order_by(
+            "bill_id", "-primary", "name"
+        ).values(
+            "bill_id",
+            "name",
+            "entity_type",
+            "primary",
+            "classification",
+            "person_id",
+            "organization_id",
+        ),
+        "abstracts": BillAbstract.objects.order_by("bill_id", "date").values(
+            "bill_id", "abstract", "note", "date"
+        ),
+    }
+
+    yield from _export(bills, related, "bill_id", chunk_size)
+
+
+def export_events(chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield one dictionary per event, with its agenda items nested as a list.
+    """
+    events = Event.objects.order_by("id").values(
+        "id",
+        "slug",
+        "name",
+        "description",
+        "classification",
+        "start_date",
+        "end_date",
+        "status",
+        "created_at",
+        "updated_at",
+        location_name=F("location__name"),
+    )
+
+    related = {
+        "agenda_items": EventAgendaItem.objects.order_by("event_id", "order").values(
+            "event_id",
+            "order",
+            "description",
+            "classification",
+            "subjects",
+            "notes",
+        ),
+    }
+
+    yield from _export(events, related, "event_id", chunk_size)
+
+
+EXPORT_DATASETS = {
+    "bills": export_bills,
+    "events": export_events,
+}
+
+
+class Echo:
+    """
+    File-like object that hands back whatever is written to it, so csv.writer
+    can be used to produce lines for a streaming response.
+    https://docs.djangoproject.com/en/3.2/howto/outputting-csv/#streaming-large-csv-files
+    """
+
+    def write(self, value):
+        return value
+
+
+def _to_json(value):
+    return json.dumps(value, cls=DjangoJSONEncoder)
+
+
+def serialize_ndjson(rows):
+    for row in rows:
+        yield _to_json(row) + "\n"
+
+
+def serialize_csv(rows):
+    """
+    Flatten each row into a CSV line. Nested lists, e.g., bill actions, are
+    written as JSON strings, so every dataset fits in a single file.
+    """
+    writer = csv.writer(Echo())
+    header = None
+
+    for row in rows:
+        if header is None:
+            header = list(row.keys())
+            yield writer.writerow(header)
+
+        yield writer.writerow(
+            [
+                _to_json(row[key]) if isinstance(row[key], (list, dict)) else row[key]
+                for key in header
+            ]
+        )
+
+
+SERIALIZERS = {
+    "ndjson": serialize_ndjson,
+    "csv": serialize_csv,
+}
+
+
+def stream_export(dataset, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Return a generator of serialized lines for the given dataset and format.
+    """
+    rows = EXPORT_DATASETS[dataset](chunk_size=chunk_size)
+    return SERIALIZERS[export_format](rows)
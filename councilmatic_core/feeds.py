@@ -3,18 +3,40 @@ import urllib
 from haystack.query import SearchQuerySet
 
 from django.contrib.syndication.views import Feed
+from django.http import Http404
 from django.utils.feedgenerator import Rss201rev2Feed
 from django.urls import reverse, reverse_lazy
 from django.conf import settings
 
 from .models import Person, Bill, Organization, Event
+from .search import (
+    CachedSearchResults,
+    after_cursor,
+    get_next_cursor,
+    get_search_connection,
+    only_bills,
+)
 from .utils import to_datetime
 
 
+class SearchFeedGenerator(Rss201rev2Feed):
+    """Links to the next page of a search feed, if there is one."""
+
+    def add_root_elements(self, handler):
+        super().add_root_elements(handler)
+
+        if self.feed.get("next_url"):
+            handler.addQuickElement(
+                "atom:link", None, {"rel": "next", "href": self.feed["next_url"]}
+            )
+
+
 class CouncilmaticFacetedSearchFeed(Feed):
     title_template = "feeds/search_item_title.html"
     description_template = "feeds/search_item_description.html"
+    feed_type = SearchFeedGenerator
     bill_model = Bill
+    items_per_page = 20
 
     all_results = None
     sqs = (
@@ -31,8 +53,9 @@ class CouncilmaticFacetedSearchFeed(Feed):
 
     def get_object(self, request):
         self.queryDict = request.GET
+        self.request = request
 
-        all_results = SearchQuerySet().all()
+        all_results = only_bills(SearchQuerySet(using=get_search_connection())).all()
         facets = None
 
         if "selected_facets" in request.GET:
@@ -53,7 +76,17 @@ class CouncilmaticFacetedSearchFeed(Feed):
                 facet_name = facet_name.rsplit("_exact")[0]
                 results = all_results.narrow("%s:%s" % (facet_name, facet_value))
 
-        return results.order_by("-last_action_date")
+        results = results.order_by("-last_action_date")
+
+        # Feed readers catching up on a search page past the latest bills
+        # with the cursor of the last bill they saw.
+        if "cursor" in request.GET:
+            try:
+                results = after_cursor(results, request.GET["cursor"])
+            except ValueError:
+                raise Http404("Not a valid cursor.")
+
+        return CachedSearchResults(results)
 
     def title(self, obj):
         if self.query:
@@ -88,8 +121,26 @@ class CouncilmaticFacetedSearchFeed(Feed):
     def description(self, obj):
         return "Bills returned from search"
 
+    def feed_extra_kwargs(self, query):
+        next_cursor = None
+        if len(query) > self.items_per_page:
+            next_cursor = get_next_cursor(
+                query.searchqueryset, query[: self.items_per_page]
+            )
+
+        if not next_cursor:
+            return {}
+
+        params = self.queryDict.copy()
+        params["cursor"] = next_cursor
+        return {
+            "next_url": self.request.build_absolute_uri(
+                "?" + params.urlencode(safe=":")
+            )
+        }
+
     def items(self, query):
-        l_items = query[:20]
+        l_items = query[: self.items_per_page]
         pks = [i.pk for i in l_items]
         bills = self.bill_model.objects.filter(pk__in=pks).order_by("-last_action_date")
         return bills
@@ -1,15 +1,135 @@
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.utils.html import conditional_escape
 from haystack import indexes
+from haystack.constants import DJANGO_CT, DJANGO_ID, ID
+from haystack.utils import get_identifier, get_model_ct
+
+from councilmatic_core.indexing import (
+    BILL_TEXT_EXCERPT_SIZE,
+    chunk_text,
+    with_document_data,
+)
+from councilmatic_core.models import Bill, Event, Organization, Person
+from councilmatic_core.templatetags.extras import alternative_identifiers, clean_html
+
+
+class PrefetchedRelation(list):
+    def all(self):
+        return self
+
+
+class BillDocument(object):
+    """
+    Stand-in for a bill in the text template, with the sponsorships and
+    actions from the document data annotated by with_document_data. Other
+    attributes are read from the bill.
+    """
+
+    def __init__(self, obj):
+        self.obj = obj
+
+        self.sponsorships = PrefetchedRelation(
+            SimpleNamespace(person=SimpleNamespace(name=name) if name else None)
+            for name in obj.document_sponsorships
+        )
+
+        self.actions = PrefetchedRelation(
+            SimpleNamespace(
+                organization=SimpleNamespace(name=action["organization"]),
+                description=action["description"],
+            )
+            for action in obj.document_actions
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.obj, name)
+
+
+def render_bill_text(obj):
+    """
+    Render the same text as search/indexes/councilmatic_core/bill_text.txt,
+    without the template engine. obj is a Bill or a BillDocument.
+    """
+
+    def render(value):
+        # Mirror how the template engine renders a variable.
+        return conditional_escape(value)
+
+    def lookup(obj, *attrs):
+        # Mirror a dotted template variable, which renders as "" when an
+        # attribute is missing.
+        for attr in attrs:
+            try:
+                obj = getattr(obj, attr)
+            except AttributeError:
+                return ""
 
-from councilmatic_core.models import Bill
-from councilmatic_core.templatetags.extras import clean_html
+        return render(obj)
+
+    parts = [
+        "\n",
+        render(alternative_identifiers(obj.identifier)),
+        "\n",
+        render(obj.friendly_name),
+        "\n",
+        render(obj.classification),
+        "\n",
+        lookup(obj, "description"),
+        "\n",
+        lookup(obj, "abstract"),
+        "\n",
+    ]
+
+    for sponsorship in obj.sponsorships.all():
+        parts += ["\n    ", lookup(sponsorship, "person", "name"), "\n"]
+
+    parts.append("\n")
+
+    for action in obj.actions.all():
+        parts += [
+            "\n    ",
+            render(action.organization.name),
+            "\n    ",
+            render(action.description),
+            "\n",
+        ]
+
+    parts.append("\n")
+
+    for topic in obj.topics:
+        parts += ["\n\t", render(topic), "\n"]
+
+    parts += ["\n", render(clean_html(obj.ocr_full_text)), "\n"]
+
+    return "".join(parts)
+
+
+class BillTextField(indexes.CharField):
+    """
+    Document field for bills. Set BILL_TEXT_RENDERER = "python" to render it
+    with render_bill_text instead of the text template. Leave it unset if
+    you override the template.
+    """
+
+    def prepare(self, obj):
+        if getattr(settings, "BILL_TEXT_RENDERER", "template") == "python":
+            return self.convert(render_bill_text(obj))
+
+        return super().prepare(obj)
 
 
 class BillIndex(indexes.SearchIndex):
-    text = indexes.CharField(
+    # The document field holds the OCR text, so only the start of it is
+    # stored, for highlighting matches in. Prepared after the document field.
+    text = BillTextField(
         document=True,
         use_template=True,
         template_name="search/indexes/councilmatic_core/bill_text.txt",
+        stored=False,
     )
+    text_excerpt = indexes.CharField(default="")
     slug = indexes.CharField(model_attr="slug", indexed=False)
     id = indexes.CharField(model_attr="id", indexed=False)
     bill_type = indexes.CharField(faceted=True)
@@ -26,15 +146,174 @@ class BillIndex(indexes.SearchIndex):
     sponsorships = indexes.MultiValueField(faceted=True)
     actions = indexes.MultiValueField()
     controlling_body = indexes.MultiValueField(faceted=True)
-    full_text = indexes.CharField(model_attr="full_text", default="")
-    ocr_full_text = indexes.CharField(model_attr="ocr_full_text", default="")
+    # Bill texts are searched, not shown, so they aren't stored, and are
+    # indexed in chunks of at most BILL_TEXT_CHUNK_SIZE characters.
+    full_text = indexes.MultiValueField(stored=False)
+    ocr_full_text = indexes.MultiValueField(stored=False)
     last_action_date = indexes.DateTimeField()
     inferred_status = indexes.CharField(faceted=True)
     legislative_session = indexes.CharField(faceted=True)
 
+    # Stored for rendering search results without loading bills.
+    listing_description = indexes.CharField(indexed=False)
+    last_action_description = indexes.CharField(indexed=False, null=True)
+    primary_sponsor = indexes.CharField(indexed=False, null=True)
+    topics = indexes.MultiValueField(indexed=False)
+    pseudo_topics = indexes.MultiValueField(indexed=False)
+
+    # Identifiers, friendly name, sponsors and controlling bodies, for
+    # suggesting bills as users type.
+    suggest = indexes.EdgeNgramField()
+
+    # Bill properties that fields prepared from document data mirror. If the
+    # indexed model overrides one, the field is prepared from the model.
+    document_data_properties = {
+        "controlling_body": ["controlling_body"],
+        "listing_description": ["listing_description"],
+        "last_action_description": ["current_action"],
+        "primary_sponsor": ["primary_sponsor"],
+        "pseudo_topics": ["pseudo_topics", "controlling_body"],
+        "suggest": ["controlling_body"],
+    }
+
     def get_model(self):
         return Bill
 
+    def build_queryset(self, using=None, start_date=None, end_date=None):
+        qs = super().build_queryset(
+            using=using, start_date=start_date, end_date=end_date
+        )
+        return with_document_data(qs)
+
+    def prepare(self, obj):
+        """
+        Prepare bills from build_queryset from their document data, and any
+        other bill one query at a time.
+
+        Fields and prepare_<field> methods overridden by a subclass are
+        prepared as usual.
+        """
+        if not hasattr(obj, "document_actions"):
+            return super().prepare(obj)
+
+        self.prepared_data = {
+            ID: get_identifier(obj),
+            DJANGO_CT: get_model_ct(self.get_model()),
+            DJANGO_ID: str(obj.pk),
+        }
+
+        from_document_data = {
+            "text": lambda field: field.prepare(BillDocument(obj)),
+            "source_url": lambda field: self._prepare_related(
+                field, [source["url"] for source in obj.document_sources]
+            ),
+            "source_note": lambda field: self._prepare_related(
+                field, [source["note"] for source in obj.document_sources]
+            ),
+            "abstract": lambda field: self._prepare_related(
+                field, obj.document_abstracts
+            ),
+            "sponsorships": lambda field: obj.document_sponsorships,
+            "actions": lambda field: [
+                "{0} action on {1}".format(obj.identifier, action["date"])
+                for action in obj.document_actions
+            ],
+            "controlling_body": lambda field: self._controlling_body(obj),
+            "listing_description": lambda field: (
+                obj.document_abstracts[0] if obj.document_abstracts else obj.title
+            ),
+            "last_action_description": lambda field: (
+                obj.document_actions[-1]["description"]
+                if obj.document_actions
+                else None
+            ),
+            "primary_sponsor": lambda field: obj.document_primary_sponsor,
+            "pseudo_topics": lambda field: self._pseudo_topics(obj),
+            "suggest": lambda field: self._suggest(
+                obj,
+                [name for name in obj.document_sponsorships if name],
+                self._controlling_body(obj) or [],
+            ),
+        }
+
+        for field_name, field in self.fields.items():
+            method_name = "prepare_%s" % field_name
+            prepare_method = getattr(type(self), method_name, None)
+
+            if (
+                field_name in from_document_data
+                and field is BillIndex.fields[field_name]
+                and prepare_method is getattr(BillIndex, method_name, None)
+                and not self._overrides_bill_properties(field_name)
+            ):
+                value = from_document_data[field_name](field)
+            else:
+                value = field.prepare(obj)
+
+                if prepare_method:
+                    value = getattr(self, method_name)(obj)
+
+            self.prepared_data[field.index_fieldname] = value
+
+        return self.prepared_data
+
+    def _prepare_related(self, field, values):
+        # Mirror SearchField.prepare for a model_attr that spans a relation.
+        if len(values) == 1:
+            value = values[0]
+        elif values:
+            value = values
+        elif field.has_default():
+            value = field.default
+        else:
+            value = None
+
+        return field.convert(value)
+
+    def _overrides_bill_properties(self, field_name):
+        model = self.get_model()
+
+        return any(
+            getattr(model, name) is not getattr(Bill, name)
+            for name in self.document_data_properties.get(field_name, [])
+        )
+
+    def _pseudo_topics(self, obj):
+        # Mirror Bill.pseudo_topics
+        if not obj.document_actions:
+            return []
+
+        topics = {
+            action["organization"]
+            for action in obj.document_actions
+            if action["organization"] not in ("Mayor", settings.CITY_COUNCIL_NAME)
+        }
+
+        controlling_body = self._controlling_body(obj)
+        if (
+            not topics
+            and controlling_body
+            and controlling_body[0] != settings.CITY_COUNCIL_NAME
+        ):
+            topics = controlling_body
+
+        return sorted(topics)
+
+    def _suggest(self, obj, sponsors, controlling_body):
+        names = alternative_identifiers(obj.identifier).split()
+        names += [obj.friendly_name, *sponsors, *controlling_body]
+
+        # Drop duplicates, keeping the order.
+        return "\n".join(dict.fromkeys(names))
+
+    def _controlling_body(self, obj):
+        # Mirror Bill.controlling_body
+        if obj.document_actions:
+            current_action = obj.document_actions[-1]
+            return current_action["related_organizations"] or [
+                current_action["organization"]
+            ]
+
     def prepare_friendly_name(self, obj):
         return obj.friendly_name
 
@@ -54,8 +333,44 @@ class BillIndex(indexes.SearchIndex):
         if obj.controlling_body:
             return [org.name for org in obj.controlling_body]
 
+    def prepare_listing_description(self, obj):
+        description = obj.listing_description
+        return getattr(description, "abstract", description)
+
+    def prepare_last_action_description(self, obj):
+        if obj.current_action:
+            return obj.current_action.description
+
+    def prepare_primary_sponsor(self, obj):
+        if obj.primary_sponsor:
+            return obj.primary_sponsor.name
+
+    def prepare_topics(self, obj):
+        return list(obj.topics)
+
+    def prepare_pseudo_topics(self, obj):
+        # Sorted, so unchanged bills have unchanged documents.
+        return sorted(str(topic) for topic in obj.pseudo_topics)
+
+    def prepare_suggest(self, obj):
+        return self._suggest(
+            obj,
+            [
+                sponsorship.person.name
+                for sponsorship in obj.sponsorships.all()
+                if sponsorship.person
+            ],
+            [org.name for org in obj.controlling_body or []],
+        )
+
+    def prepare_text_excerpt(self, obj):
+        chunks = chunk_text(
+            self.prepared_data.get(self.get_content_field()), BILL_TEXT_EXCERPT_SIZE
+        )
+        return chunks[0] if chunks else ""
+
     def prepare_full_text(self, obj):
-        return clean_html(obj.full_text)
+        return chunk_text(clean_html(obj.full_text or ""))
 
     def prepare_inferred_status(self, obj):
         return obj.inferred_status
@@ -64,7 +379,7 @@ class BillIndex(indexes.SearchIndex):
         return obj.legislative_session.identifier
 
     def prepare_ocr_full_text(self, obj):
-        return clean_html(obj.ocr_full_text)
+        return chunk_text(clean_html(obj.ocr_full_text or ""))
 
     def get_updated_field(self):
         return "updated_at"
@@ -72,3 +387,94 @@ class BillIndex(indexes.SearchIndex):
     def prepare_last_action_date(self, obj):
         if obj.last_action_date:
             return obj.last_action_date
+
+
+class EventIndex(indexes.SearchIndex):
+    """
+    Index of events, by their names, agenda items, participants and
+    location. Like BillIndex, Councilmatic instances register a subclass
+    that is also indexes.Indexable.
+    """
+
+    text = indexes.CharField(
+        document=True,
+        use_template=True,
+        template_name="search/indexes/councilmatic_core/event_text.txt",
+    )
+
+    slug = indexes.CharField(model_attr="slug", indexed=False)
+    id = indexes.CharField(model_attr="id", indexed=False)
+    friendly_name = indexes.CharField(model_attr="name")
+    start_time = indexes.DateTimeField(model_attr="start_time", null=True)
+    participants = indexes.MultiValueField()
+    suggest = indexes.EdgeNgramField(model_attr="name")
+
+    def get_model(self):
+        return Event
+
+    def index_queryset(self, using=None):
+        return (
+            self.get_model()
+            .objects.select_related("location")
+            .prefetch_related("participants", "agenda")
+        )
+
+    def prepare_participants(self, obj):
+        return [participant.name for participant in obj.participants.all()]
+
+    def get_updated_field(self):
+        return "updated_at"
+
+
+class PersonIndex(indexes.SearchIndex):
+    """
+    Index of people, by their names and the posts they have held.
+    """
+
+    text = indexes.CharField(
+        document=True,
+        use_template=True,
+        template_name="search/indexes/councilmatic_core/person_text.txt",
+    )
+
+    slug = indexes.CharField(model_attr="slug", indexed=False)
+    id = indexes.CharField(model_attr="id", indexed=False)
+    friendly_name = indexes.CharField(model_attr="name")
+    suggest = indexes.EdgeNgramField(model_attr="name")
+
+    def get_model(self):
+        return Person
+
+    def index_queryset(self, using=None):
+        return self.get_model().objects.prefetch_related(
+            "memberships__organization", "memberships__post"
+        )
+
+    def get_updated_field(self):
+        return "updated_at"
+
+
+class CommitteeIndex(indexes.SearchIndex):
+    """
+    Index of committees, as Organization.committees lists them.
+    """
+
+    text = indexes.CharField(
+        document=True,
+        use_template=True,
+        template_name="search/indexes/councilmatic_core/committee_text.txt",
+    )
+
+    slug = indexes.CharField(model_attr="slug", indexed=False)
+    id = indexes.CharField(model_attr="id", indexed=False)
+    friendly_name = indexes.CharField(model_attr="name")
+    suggest = indexes.EdgeNgramField(model_attr="name")
+
+    def get_model(self):
+        return Organization
+
+    def index_queryset(self, using=None):
+        return self.get_model().committees()
+
+    def get_updated_field(self):
+        return "updated_at"
@@ -0,0 +1,451 @@
+import collections
+import datetime
+import hashlib
+import itertools
+import json
+import os
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from haystack import connections as haystack_connections
+from haystack.constants import DEFAULT_ALIAS
+from haystack.exceptions import NotHandled
+from haystack.utils import get_model_ct
+import requests
+
+from .models import Bill, BillIndexQueue
+
+
+# How long a queued bill must go without changes before it is re-indexed.
+BILL_INDEX_DEBOUNCE = getattr(settings, "BILL_INDEX_DEBOUNCE", 60)
+
+# Longest chunk, in characters, that bill texts are indexed in.
+BILL_TEXT_CHUNK_SIZE = getattr(settings, "BILL_TEXT_CHUNK_SIZE", 10000)
+
+# Longest excerpt, in characters, of the document text of bills that is
+# stored for highlighting matches in.
+BILL_TEXT_EXCERPT_SIZE = getattr(settings, "BILL_TEXT_EXCERPT_SIZE", 10000)
+
+
+# Related rows embedded in bill documents, aggregated per bill so a batch of
+# documents is loaded in a single statement. Relations without a default
+# ordering are aggregated by id, so the documents, and their hashes, don't
+# change with the order PostgreSQL happens to return rows in.
+DOCUMENT_DATA_SQL = {
+    "document_sources": """
+        SELECT COALESCE(
+            json_agg(json_build_object('url', s.url, 'note', s.note) ORDER BY s.id),
+            '[]'
+        )
+        FROM opencivicdata_billsource AS s
+        WHERE s.bill_id = councilmatic_core_bill.bill_id
+    """,
+    "document_abstracts": """
+        SELECT COALESCE(json_agg(a.abstract ORDER BY a.id), '[]')
+        FROM opencivicdata_billabstract AS a
+        WHERE a.bill_id = councilmatic_core_bill.bill_id
+    """,
+    "document_sponsorships": """
+        SELECT COALESCE(json_agg(p.name ORDER BY s.id), '[]')
+        FROM opencivicdata_billsponsorship AS s
+        LEFT JOIN opencivicdata_person AS p ON p.id = s.person_id
+        WHERE s.bill_id = councilmatic_core_bill.bill_id
+    """,
+    "document_primary_sponsor": """
+        SELECT s.name
+        FROM opencivicdata_billsponsorship AS s
+        WHERE s.bill_id = councilmatic_core_bill.bill_id AND s."primary"
+        ORDER BY s.id
+        LIMIT 1
+    """,
+    "document_actions": """
+        SELECT COALESCE(
+            json_agg(
+                json_build_object(
+                    'organization', o.name,
+                    'description', a.description,
+                    'date', a.date,
+                    'related_organizations', (
+                        SELECT json_agg(ro.name ORDER BY r.id)
+                        FROM opencivicdata_billactionrelatedentity AS r
+                        LEFT JOIN opencivicdata_organization AS ro
+                          ON ro.id = r.organization_id
+                        WHERE r.action_id = a.id
+                          AND r.entity_type = 'organization'
+                    )
+                )
+                ORDER BY a."order"
+            ),
+            '[]'
+        )
+        FROM opencivicdata_billaction AS a
+        JOIN opencivicdata_organization AS o ON o.id = a.organization_id
+        WHERE a.bill_id = councilmatic_core_bill.bill_id
+    """,
+}
+
+
+def with_document_data(queryset):
+    """
+    Annotate a queryset of bills with the related rows BillIndex embeds in
+    each document, so BillIndex.prepare does not query per bill.
+    """
+    return queryset.select_related("legislative_session").annotate(
+        **{name: RawSQL(sql, ()) for name, sql in DOCUMENT_DATA_SQL.items()}
+    )
+
+
+def get_bill_index(using=DEFAULT_ALIAS):
+    """
+    Return the registered subclass of BillIndex. Councilmatic instances
+    register their own index, often against a proxy of Bill, so look it up by
+    type rather than by model.
+    """
+    from .haystack_indexes import BillIndex
+
+    unified_index = haystack_connections[using].get_unified_index()
+
+    for index in unified_index.get_indexes().values():
+        if isinstance(index, BillIndex):
+            return index
+
+    raise NotHandled("No subclass of BillIndex is registered")
+
+
+def bill_queryset(index, using=DEFAULT_ALIAS, start_date=None, sessions=None):
+    """
+    Return the bills to index, updated since start_date, if given, and in the
+    legislative sessions with the given identifiers, if any.
+    """
+    qs = index.build_queryset(using=using, start_date=start_date)
+
+    if sessions:
+        qs = qs.filter(legislative_session__identifier__in=sessions)
+
+    return qs
+
+
+def batches(iterable, batch_size):
+    iterator = iter(iterable)
+
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+
+        if not batch:
+            return
+
+        yield batch
+
+
+def chunk_text(text, chunk_size=BILL_TEXT_CHUNK_SIZE):
+    """
+    Split text into chunks of at most chunk_size characters, breaking at
+    whitespace where possible.
+    """
+    chunks = []
+    text = (text or "").strip()
+
+    while len(text) > chunk_size:
+        end = text.rfind(" ", 0, chunk_size + 1)
+
+        if end <= 0:
+            end = chunk_size
+
+        chunks.append(text[:end].rstrip())
+        text = text[end:].lstrip()
+
+    if text:
+        chunks.append(text)
+
+    return chunks
+
+
+def pk_ranges(queryset, shard_size):
+    """
+    Split queryset into [start, end) primary key ranges of at most shard_size
+    objects each. The last range is open ended, i.e., end is None, so objects
+    created during a rebuild are still picked up.
+    """
+    pks = queryset.order_by("pk").values_list("pk", flat=True)
+
+    boundaries = [
+        pk
+        for i, pk in enumerate(pks.iterator(chunk_size=shard_size * 10))
+        if i % shard_size == 0
+    ]
+
+    return [list(pair) for pair in zip(boundaries, boundaries[1:] + [None])]
+
+
+def document_hash(document):
+    serialized = json.dumps(document, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class PreparedIndex(object):
+    """
+    Stand in for a search index when posting documents that were already
+    prepared, so the backend does not prepare them again.
+    """
+
+    def __init__(self, index, documents):
+        self.index = index
+        self.documents = documents
+
+    def full_prepare(self, obj):
+        return self.documents[obj.pk]
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+def post_changed_documents(index, backend, bills, force=False, record_hashes=True):
+    """
+    Post the documents for bills that changed since they were last posted,
+    and record the hash of each posted document on its bill, unless
+    record_hashes is false, e.g., when posting to a standby core. OCD bumps
+    updated_at on every scrape, so most bills in an incremental update have
+    not changed. Return a Counter of posted and skipped documents.
+    """
+    counts = collections.Counter(posted=0, skipped=0)
+    changed = []
+    documents = {}
+
+    for bill in bills:
+        document = index.full_prepare(bill)
+        search_document_hash = document_hash(document)
+
+        if search_document_hash == bill.search_document_hash and not force:
+            counts["skipped"] += 1
+            continue
+
+        bill.search_document_hash = search_document_hash
+        changed.append(bill)
+        documents[bill.pk] = document
+
+    if changed:
+        backend.update(PreparedIndex(index, documents), changed)
+
+        if record_hashes:
+            index.get_model().objects.bulk_update(changed, ["search_document_hash"])
+
+        counts["posted"] += len(changed)
+
+    return counts
+
+
+def reset_document_hashes(models=None):
+    """
+    Forget the hashes of the posted documents of the given models, or of all
+    models, when their documents are cleared from the index, so they are
+    posted again rather than skipped as unchanged.
+    """
+    if models is None:
+        models = [Bill]
+
+    for model in models:
+        if issubclass(model, Bill):
+            model._base_manager.update(search_document_hash=None)
+
+
+def index_range(
+    using,
+    start,
+    end,
+    batch_size,
+    start_date=None,
+    force=False,
+    sessions=None,
+    record_hashes=True,
+):
+    """
+    Prepare the documents for bills with primary keys in [start, end) and
+    post those that changed. Return a Counter of posted and skipped
+    documents.
+    """
+    index = get_bill_index(using)
+    backend = haystack_connections[using].get_backend()
+
+    qs = bill_queryset(index, using, start_date, sessions).filter(pk__gte=start)
+
+    if end is not None:
+        qs = qs.filter(pk__lt=end)
+
+    counts = collections.Counter(posted=0, skipped=0)
+
+    for batch in batches(qs.order_by("pk").iterator(chunk_size=batch_size), batch_size):
+        counts.update(
+            post_changed_documents(
+                index, backend, batch, force=force, record_hashes=record_hashes
+            )
+        )
+
+    return counts
+
+
+def flush_bill_index_queue(
+    using=DEFAULT_ALIAS, debounce=BILL_INDEX_DEBOUNCE, batch_size=500
+):
+    """
+    Post the documents for bills queued by BillIndexSignalProcessor that have
+    not changed in the past debounce seconds, and remove queued bills that no
+    longer exist or are no longer indexed. Return a Counter of posted, skipped
+    and removed documents.
+    """
+    index = get_bill_index(using)
+    backend = haystack_connections[using].get_backend()
+    model_ct = get_model_ct(index.get_model())
+
+    cutoff = timezone.now() - datetime.timedelta(seconds=debounce)
+    queued = BillIndexQueue.objects.filter(enqueued_at__lte=cutoff)
+
+    counts = collections.Counter(posted=0, skipped=0, removed=0)
+
+    for bill_ids in batches(queued.values_list("bill_id", flat=True), batch_size):
+        bills = list(index.build_queryset(using=using).filter(pk__in=bill_ids))
+        counts.update(post_changed_documents(index, backend, bills))
+
+        for bill_id in set(bill_ids) - {bill.pk for bill in bills}:
+            backend.remove("{}.{}".format(model_ct, bill_id))
+            counts["removed"] += 1
+
+        # Bills enqueued again while this batch was posted stay queued.
+        queued.filter(bill_id__in=bill_ids).delete()
+
+    return counts
+
+
+def init_index_worker(using):
+    """
+    Set up a worker process forked by the update_bill_index command. Workers
+    are forked, rather than spawned, so Django is already set up in them.
+    """
+    # Connections were closed before the pool was created, so each worker
+    # opens its own, but sessions with the search backend are not.
+    haystack_connections[using].reset_sessions()
+
+
+def index_range_worker(args):
+    i, using, start, end, batch_size, start_date, force, sessions, record_hashes = args
+
+    try:
+        return i, index_range(
+            using,
+            start,
+            end,
+            batch_size,
+            start_date=start_date,
+            force=force,
+            sessions=sessions,
+            record_hashes=record_hashes,
+        )
+    finally:
+        connections.close_all()
+
+
+def standby_connection(using=DEFAULT_ALIAS):
+    """
+    Add a search connection to the standby Solr core of connection using, at
+    the URL of its REBUILD_URL option, and return its alias. Rebuilds write to
+    the standby core, then swap it with the live one. Clearing the standby
+    core leaves the hashes of the live core's documents be.
+    """
+    options = settings.HAYSTACK_CONNECTIONS[using]
+
+    if not options.get("REBUILD_URL"):
+        raise ImproperlyConfigured(
+            "Set REBUILD_URL for search connection '{}' to the URL of a standby "
+            "core to rebuild into".format(using)
+        )
+
+    alias = "{}_standby".format(using)
+    settings.HAYSTACK_CONNECTIONS[alias] = dict(
+        options, URL=options["REBUILD_URL"], RESET_DOCUMENT_HASHES=False
+    )
+
+    return alias
+
+
+def swap_solr_cores(url, other_url):
+    """
+    Swap the Solr cores at url and other_url, so that requests to url are
+    served by the documents of other_url, and vice versa, at once.
+    """
+    admin_url, core = url.rstrip("/").rsplit("/", 1)
+    other_core = other_url.rstrip("/").rsplit("/", 1)[1]
+
+    response = requests.get(
+        "{}/admin/cores".format(admin_url),
+        params={"action": "SWAP", "core": core, "other": other_core},
+        timeout=60,
+    )
+    response.raise_for_status()
+
+
+class Checkpoint(object):
+    """
+    Record the ranges of a rebuild, which of them are done, and the bills
+    it indexes, i.e., those updated since start_date and in sessions, if
+    set, so an interrupted rebuild can resume where it left off.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ranges = []
+        self.done = set()
+        self.start_date = None
+        self.sessions = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        with open(self.path) as f:
+            checkpoint = json.load(f)
+
+        self.ranges = checkpoint["ranges"]
+        self.done = set(checkpoint["done"])
+        self.start_date = (
+            parse_datetime(checkpoint["start_date"])
+            if checkpoint.get("start_date")
+            else None
+        )
+        self.sessions = checkpoint.get("sessions")
+
+    def save(self):
+        # Write then rename, so the checkpoint survives an interrupted write.
+        tmp_path = "{}.tmp".format(self.path)
+
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "ranges": self.ranges,
+                    "done": sorted(self.done),
+                    "start_date": (
+                        self.start_date.isoformat() if self.start_date else None
+                    ),
+                    "sessions": self.sessions,
+                },
+                f,
+            )
+
+        os.replace(tmp_path, self.path)
+
+    def delete(self):
+        if self.exists():
+            os.remove(self.path)
+
+    def pending(self):
+        return [
+            (i, start, end)
+            for i, (start, end) in enumerate(self.ranges)
+            if i not in self.done
+        ]
+
+    def mark_done(self, i):
+        self.done.add(i)
+        self.save()
@@ -0,0 +1,152 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from councilmatic_core.benchmark import (
+    add_benchmark_connection,
+    generate_corpus,
+    index_corpus,
+    read_query_log,
+    replay,
+    shared_search_connections,
+    summarize,
+    synthetic_queries,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks bill search on a synthetic corpus indexed by the PostgreSQL "
+        "search backend, replaying a query log, and reports latency, queries per "
+        "second and the overlap of each search's hits with a baseline run. The "
+        "corpus is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bills",
+            default=2000,
+            type=int,
+            help="Number of synthetic bills to index.",
+        )
+
+        parser.add_argument(
+            "--seed",
+            default=0,
+            type=int,
+            help="Seed of the synthetic corpus and queries. Compare runs with the same seed.",
+        )
+
+        parser.add_argument(
+            "--queries",
+            help=(
+                "Query log to replay, with a search per line: its terms, or a JSON "
+                'object like {"q": "zoning", "selected_facets": '
+                '["bill_type_exact:ordinance"]}. By default, synthetic searches '
+                "are replayed."
+            ),
+        )
+
+        parser.add_argument(
+            "--query-count",
+            default=200,
+            type=int,
+            help="Number of synthetic searches to replay, without --queries.",
+        )
+
+        parser.add_argument(
+            "--repeat",
+            default=1,
+            type=int,
+            help="Times to replay the searches. Only the last replay is reported.",
+        )
+
+        parser.add_argument(
+            "--baseline",
+            help="Results of an earlier run, saved with --output, to compare hits with.",
+        )
+
+        parser.add_argument(
+            "--output",
+            help="Save the results of this run to this file, e.g., as a baseline.",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat should be at least 1")
+
+        add_benchmark_connection()
+
+        shared = shared_search_connections()
+        if shared:
+            raise CommandError(
+                "Search connection(s) {} use the PostgreSQL backend, whose "
+                "documents the benchmark would search and clear. Run it "
+                "against another database.".format(", ".join(shared))
+            )
+
+        if options["queries"]:
+            with open(options["queries"]) as query_log:
+                queries = read_query_log(query_log)
+        else:
+            queries = synthetic_queries(options["query_count"], seed=options["seed"])
+
+        if not queries:
+            raise CommandError("There are no searches to replay")
+
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                baseline = json.load(baseline_file)["runs"]
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            generate_corpus(options["bills"], seed=options["seed"])
+            counts = index_corpus()
+            self.stdout.write(
+                "Indexed {} synthetic bill(s) in {:.1f}s".format(
+                    counts["posted"], time.perf_counter() - start
+                )
+            )
+
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                runs = replay(queries)
+                elapsed = time.perf_counter() - start
+
+            # Leave no synthetic bills or search documents behind.
+            transaction.set_rollback(True)
+
+        summary = summarize(runs, elapsed, baseline=baseline)
+
+        self.stdout.write(
+            "Replayed {queries} search(es): p50 {p50_ms:.1f} ms, p95 {p95_ms:.1f} ms, "
+            "{qps:.1f} queries/s".format(**summary)
+        )
+
+        if baseline is not None:
+            self.write_overlap(summary["overlap"], verbose=options["verbosity"] > 1)
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(
+                    {"summary": summary, "runs": runs}, output, indent=2, sort_keys=True
+                )
+
+    def write_overlap(self, overlap, verbose=False):
+        if not overlap:
+            self.stdout.write("No search was in the baseline")
+            return
+
+        self.stdout.write(
+            "Mean overlap with the baseline: {:.2f} over {} search(es)".format(
+                sum(overlap.values()) / len(overlap), len(overlap)
+            )
+        )
+
+        # Searches that lost hits first, then, if verbose, the rest.
+        for query, value in sorted(overlap.items(), key=lambda item: item[1]):
+            if value < 1 or verbose:
+                self.stdout.write("  {:.2f}  {}".format(value, query))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from haystack.constants import DEFAULT_ALIAS
+
+from councilmatic_core.search_schema import render_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a Solr schema for the search indexes, with docValues string "
+        "fields for facets and sorts, date point fields for dates and norms only "
+        "for the document field and boosted fields"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--using",
+            default=DEFAULT_ALIAS,
+            help="Search connection whose indexes to generate a schema for.",
+        )
+
+        parser.add_argument(
+            "--filename",
+            help="Write the schema to this file, e.g., schema.xml, instead of stdout.",
+        )
+
+    def handle(self, *args, **options):
+        schema_xml = render_schema(options["using"])
+
+        if options["filename"]:
+            with open(options["filename"], "w") as schema_file:
+                schema_file.write(schema_xml)
+
+            self.stdout.write(
+                self.style.SUCCESS("Wrote schema to {}".format(options["filename"]))
+            )
+
+        else:
+            self.stdout.write(schema_xml)
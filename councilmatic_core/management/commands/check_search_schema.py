@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from haystack.constants import DEFAULT_ALIAS
+
+from councilmatic_core.search_schema import (
+    build_schema_fields,
+    core_schema_fields,
+    diff_schema,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the fields of a running Solr core with those of the schema "
+        "build_search_schema generates, and fails if they differ"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--using",
+            default=DEFAULT_ALIAS,
+            help="Search connection whose core to check.",
+        )
+
+        parser.add_argument(
+            "--url",
+            help="URL of the core to check, if not that of the search connection.",
+        )
+
+    def handle(self, *args, **options):
+        using = options["using"]
+        url = options["url"] or settings.HAYSTACK_CONNECTIONS[using].get("URL")
+
+        if not url:
+            raise CommandError(
+                "Search connection '{}' has no URL. Is it a Solr connection?".format(
+                    using
+                )
+            )
+
+        differences = diff_schema(build_schema_fields(using), core_schema_fields(url))
+
+        for difference in differences:
+            self.stdout.write(difference)
+
+        if differences:
+            raise CommandError(
+                "The schema of the core at {} differs from the generated one in "
+                "{} way(s). Regenerate it with build_search_schema.".format(
+                    url, len(differences)
+                )
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS("The schema of the core at {} is up to date".format(url))
+        )
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from councilmatic_core.export import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_DATASETS,
+    EXPORT_FORMATS,
+    stream_export,
+)
+
+
+class Command(BaseCommand):
+    help = "Streams a full dump of bills or events as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "dataset",
+            choices=sorted(EXPORT_DATASETS),
+            help="Export bills (with actions, sponsorships and abstracts) or events (with agenda items).",
+        )
+
+        parser.add_argument(
+            "--format",
+            default="ndjson",
+            choices=sorted(EXPORT_FORMATS),
+            help="Output format. Nested lists are JSON-encoded in CSV output.",
+        )
+
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="File to write to. Defaults to stdout.",
+        )
+
+        parser.add_argument(
+            "--chunk_size",
+            default=EXPORT_CHUNK_SIZE,
+            type=int,
+            help="Number of rows to hold in memory at a time.",
+        )
+
+    def handle(self, *args, **options):
+        lines = stream_export(
+            options["dataset"], options["format"], chunk_size=options["chunk_size"]
+        )
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as f:
+                f.writelines(lines)
+
+            self.stderr.write(self.style.SUCCESS("Wrote {}".format(options["output"])))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
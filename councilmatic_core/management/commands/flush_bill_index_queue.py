@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from haystack.constants import DEFAULT_ALIAS
+
+from councilmatic_core.indexing import BILL_INDEX_DEBOUNCE, flush_bill_index_queue
+from councilmatic_core.search import index_updated
+
+
+class Command(BaseCommand):
+    help = "Re-indexes bills queued by BillIndexSignalProcessor"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--using",
+            default=DEFAULT_ALIAS,
+            help="Search connection to update.",
+        )
+
+        parser.add_argument(
+            "--debounce",
+            default=BILL_INDEX_DEBOUNCE,
+            type=int,
+            help="Only index bills that have not changed in the past DEBOUNCE seconds.",
+        )
+
+        parser.add_argument(
+            "--batch_size",
+            default=500,
+            type=int,
+            help="Number of documents posted to the search backend at once.",
+        )
+
+    def handle(self, *args, **options):
+        counts = flush_bill_index_queue(
+            using=options["using"],
+            debounce=options["debounce"],
+            batch_size=options["batch_size"],
+        )
+
+        if counts["posted"] or counts["removed"]:
+            index_updated(using=options["using"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Posted {posted} bill(s), skipped {skipped} unchanged bill(s), "
+                "removed {removed} bill(s)".format(**counts)
+            )
+        )
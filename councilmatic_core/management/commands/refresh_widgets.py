@@ -0,0 +1,44 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from councilmatic_core.widgets import WIDGETS, refresh_widget
+
+
+class Command(BaseCommand):
+    help = "Precomputes embeddable widget payloads for recently updated bills, people and committees"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--update_all",
+            default=False,
+            action="store_true",
+            help="Refresh payloads for every bill, person and committee.",
+        )
+
+        parser.add_argument(
+            "--window",
+            default=24,
+            type=int,
+            help="Refresh payloads for entities updated in the past WINDOW hours.",
+        )
+
+    def handle(self, *args, **options):
+        window_start = timezone.now() - datetime.timedelta(hours=options["window"])
+
+        for kind, (model, _) in WIDGETS.items():
+            qs = model.objects.all()
+
+            if not options["update_all"]:
+                qs = qs.filter(updated_at__gte=window_start)
+
+            refreshed = 0
+
+            for obj in qs.iterator():
+                refresh_widget(kind, obj)
+                refreshed += 1
+
+            self.stdout.write("Refreshed {} {} widget(s)".format(refreshed, kind))
+
+        self.stdout.write(self.style.SUCCESS("Widget payloads are up to date"))
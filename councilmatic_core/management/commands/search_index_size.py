@@ -0,0 +1,217 @@
+import collections
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from haystack import connections
+from haystack.constants import DEFAULT_ALIAS
+from haystack.utils import get_model_ct
+
+from councilmatic_core.backends.postgres_backend import PostgresSearchBackend
+from councilmatic_core.indexing import get_bill_index
+from councilmatic_core.models import SearchDocument
+from councilmatic_core.search_schema import core_field_info
+
+# Size, in bytes, of each key of the data of bill documents.
+DATA_SIZE_SQL = """
+    SELECT d.key, SUM(pg_column_size(d.value))
+    FROM {table} s CROSS JOIN LATERAL jsonb_each(s.data) d
+    WHERE s.django_ct = %s
+    GROUP BY d.key
+"""
+
+# Number of bill documents, and the size, in bytes, of their data and search
+# vectors, as stored, i.e., compressed.
+DOCUMENT_SIZE_SQL = """
+    SELECT
+      COUNT(*),
+      COALESCE(SUM(pg_column_size(data)), 0),
+      COALESCE(SUM(pg_column_size(search_vector)), 0)
+    FROM {table}
+    WHERE django_ct = %s
+"""
+
+
+def value_size(value):
+    """
+    Return the size, in bytes, of a prepared value as posted to the search
+    backend.
+    """
+    if value is None:
+        return 0
+    elif isinstance(value, (list, tuple, set)):
+        return sum(value_size(v) for v in value)
+
+    return len(str(value).encode())
+
+
+def megabytes(size):
+    return size / 1024 / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports the size of bill search documents by field, and whether each "
+        "field is stored and indexed. Sizes are measured in PostgreSQL, and "
+        "documents and distinct terms counted in Solr. Otherwise, sizes are "
+        "estimated from a sample of bills."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--using",
+            default=DEFAULT_ALIAS,
+            help="Search connection whose index to report on.",
+        )
+
+        parser.add_argument(
+            "--estimate",
+            action="store_true",
+            help="Estimate sizes from a sample of bills, rather than measuring the index.",
+        )
+
+        parser.add_argument(
+            "--sample",
+            default=1000,
+            type=int,
+            help=(
+                "Number of bills to prepare documents for when estimating, or 0 "
+                "for all of them."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        using = options["using"]
+        index = get_bill_index(using)
+
+        if not options["estimate"]:
+            url = settings.HAYSTACK_CONNECTIONS[using].get("URL")
+
+            if isinstance(connections[using].get_backend(), PostgresSearchBackend):
+                self.measure_postgres(index)
+                return
+            elif url:
+                try:
+                    self.count_solr(index, url)
+                    return
+                except requests.RequestException as e:
+                    self.stderr.write(
+                        "Could not read the fields of the core at {} ({}), so "
+                        "estimating sizes instead".format(url, e)
+                    )
+
+        self.estimate(index, using, options["sample"])
+
+    def write_header(self, *columns):
+        self.stdout.write(
+            "{:<28} {:>6} {:>7} {:>12} {:>12}".format(
+                "field", "stored", "indexed", *columns
+            )
+        )
+
+    def write_row(self, field_name, field, *values):
+        self.stdout.write(
+            "{:<28} {:>6} {:>7} {:>12} {:>12}".format(
+                field_name,
+                "yes" if field is None or field.stored else "no",
+                "yes" if field is not None and field.indexed else "no",
+                *values
+            )
+        )
+
+    def measure_postgres(self, index):
+        """
+        Report the size of each field of the bill documents, before
+        compression, with pg_column_size.
+        """
+        django_ct = get_model_ct(index.get_model())
+        table = SearchDocument._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute(DOCUMENT_SIZE_SQL.format(table=table), [django_ct])
+            count, data_size, vector_size = cursor.fetchone()
+
+            cursor.execute(DATA_SIZE_SQL.format(table=table), [django_ct])
+            sizes = cursor.fetchall()
+
+        if not count:
+            self.stdout.write("No bills are indexed")
+            return
+
+        fields = {field.index_fieldname: field for field in index.fields.values()}
+
+        self.stdout.write(
+            "Measured {} bill document(s): {:.1f} MB of data and {:.1f} MB of "
+            "search vectors, as stored\n".format(
+                count, megabytes(data_size), megabytes(vector_size)
+            )
+        )
+        self.write_header("avg bytes", "total MB")
+
+        for key, size in sorted(sizes, key=lambda row: -row[1]):
+            self.write_row(
+                key,
+                fields.get(key),
+                "{:.0f}".format(size / count),
+                "{:.1f}".format(megabytes(size)),
+            )
+
+    def count_solr(self, index, url):
+        """
+        Report the number of documents with each field, and of distinct terms
+        in it, from the Luke handler of the Solr core at url. Lucene doesn't
+        track the size of fields.
+        """
+        fields = {field.index_fieldname: field for field in index.fields.values()}
+        count, info = core_field_info(url, sorted(fields))
+
+        self.stdout.write(
+            "Counted in {} document(s) of the core at {}\n".format(count, url)
+        )
+        self.write_header("documents", "distinct")
+
+        for field_name, field_info in sorted(
+            info.items(), key=lambda item: -item[1].get("distinct", 0)
+        ):
+            self.write_row(
+                field_name,
+                fields.get(field_name),
+                field_info.get("docs", ""),
+                field_info.get("distinct", ""),
+            )
+
+    def estimate(self, index, using, sample):
+        qs = index.build_queryset(using=using).order_by("pk")
+        if sample:
+            qs = qs[:sample]
+
+        sizes = collections.Counter()
+        sampled = 0
+
+        for bill in qs.iterator():
+            document = index.full_prepare(bill)
+
+            for field_name, field in index.fields.items():
+                sizes[field_name] += value_size(document.get(field.index_fieldname))
+
+            sampled += 1
+
+        if not sampled:
+            self.stdout.write("No bills to index")
+            return
+
+        total = index.index_queryset(using=using).count()
+
+        self.stdout.write("Estimated from {} of {} bill(s)\n".format(sampled, total))
+        self.write_header("avg bytes", "total MB")
+
+        for field_name, size in sizes.most_common():
+            average = size / sampled
+
+            self.write_row(
+                field_name,
+                index.fields[field_name],
+                "{:.0f}".format(average),
+                "{:.1f}".format(megabytes(average * total)),
+            )
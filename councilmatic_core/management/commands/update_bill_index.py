@@ -0,0 +1,400 @@
+import collections
+import datetime
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from haystack import connections as haystack_connections
+from haystack.constants import DEFAULT_ALIAS
+from haystack.query import SearchQuerySet
+from haystack.utils import get_model_ct
+
+from councilmatic_core.backends.postgres_backend import PostgresSearchBackend
+from councilmatic_core.indexing import (
+    Checkpoint,
+    batches,
+    bill_queryset,
+    get_bill_index,
+    index_range,
+    index_range_worker,
+    init_index_worker,
+    pk_ranges,
+    post_changed_documents,
+    reset_document_hashes,
+    standby_connection,
+    swap_solr_cores,
+)
+from councilmatic_core.models import SearchDocument
+from councilmatic_core.search import index_updated
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates the bill search index in parallel over primary key ranges, "
+        "checkpointing progress so an interrupted rebuild can resume"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--using",
+            default=DEFAULT_ALIAS,
+            help="Search connection to update.",
+        )
+
+        parser.add_argument(
+            "--workers",
+            default=multiprocessing.cpu_count(),
+            type=int,
+            help="Number of processes preparing and posting documents.",
+        )
+
+        parser.add_argument(
+            "--shard_size",
+            default=5000,
+            type=int,
+            help="Number of bills in each range handed to a worker.",
+        )
+
+        parser.add_argument(
+            "--batch_size",
+            default=500,
+            type=int,
+            help="Number of documents posted to the search backend at once.",
+        )
+
+        parser.add_argument(
+            "--age",
+            type=int,
+            help="Only index bills updated in the past AGE hours.",
+        )
+
+        parser.add_argument(
+            "--session",
+            action="append",
+            dest="sessions",
+            help=(
+                "Only index bills in the legislative session with this identifier. "
+                "Repeat it to index several sessions, e.g., only those still open."
+            ),
+        )
+
+        parser.add_argument(
+            "--swap",
+            default=False,
+            action="store_true",
+            help=(
+                "Rebuild the whole index while the live one serves searches. Solr "
+                "rebuilds into a standby core, swapped in once it holds every bill. "
+                "The PostgreSQL backend replaces documents in place."
+            ),
+        )
+
+        parser.add_argument(
+            "--clear",
+            default=False,
+            action="store_true",
+            help="Remove bills from the index before starting a new rebuild.",
+        )
+
+        parser.add_argument(
+            "--force",
+            default=False,
+            action="store_true",
+            help="Post every document, even if it has not changed since it was last posted.",
+        )
+
+        parser.add_argument(
+            "--checkpoint",
+            default="bill_index_checkpoint.json",
+            help="File recording which ranges have been indexed.",
+        )
+
+        parser.add_argument(
+            "--resume",
+            default=False,
+            action="store_true",
+            help=(
+                "Resume the rebuild recorded in the checkpoint file, of the bills "
+                "it was started with, whatever --age and --session are."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        using = options["using"]
+
+        if options["swap"]:
+            return self.rebuild_and_swap(using, options)
+
+        if options["clear"] and options["sessions"]:
+            raise CommandError(
+                "--clear removes every bill, so it can't be combined with --session"
+            )
+
+        index = get_bill_index(using)
+        checkpoint = Checkpoint(options["checkpoint"])
+
+        if options["resume"] and checkpoint.exists():
+            checkpoint.load()
+            self.stdout.write(
+                "Resuming rebuild, {} of {} range(s) done".format(
+                    len(checkpoint.done), len(checkpoint.ranges)
+                )
+            )
+
+        else:
+            if options["age"]:
+                checkpoint.start_date = timezone.now() - datetime.timedelta(
+                    hours=options["age"]
+                )
+
+            checkpoint.sessions = options["sessions"]
+
+            if options["clear"]:
+                backend = haystack_connections[using].get_backend()
+                backend.clear(models=[index.get_model()])
+
+                # Nothing is in the index anymore, so no document is unchanged.
+                reset_document_hashes([index.get_model()])
+
+            qs = bill_queryset(index, using, checkpoint.start_date, checkpoint.sessions)
+            checkpoint.ranges = pk_ranges(qs, options["shard_size"])
+            checkpoint.save()
+
+        counts = self.index_ranges(using, checkpoint, options, force=options["force"])
+
+        if counts["posted"] or options["clear"]:
+            index_updated(using=using)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Posted {posted} bill(s), skipped {skipped} unchanged bill(s)".format(
+                    **counts
+                )
+            )
+        )
+
+    def index_ranges(self, using, checkpoint, options, force=False, record_hashes=True):
+        pending = checkpoint.pending()
+        counts = collections.Counter(posted=0, skipped=0)
+
+        if options["workers"] > 1 and len(pending) > 1:
+            tasks = [
+                (
+                    i,
+                    using,
+                    start,
+                    end,
+                    options["batch_size"],
+                    checkpoint.start_date,
+                    force,
+                    checkpoint.sessions,
+                    record_hashes,
+                )
+                for i, start, end in pending
+            ]
+
+            # Forked workers must not share the parent's database connections.
+            connections.close_all()
+
+            # Fork workers, so Django is set up in them. It isn't in spawned
+            # workers, the default on macOS, or those of a fork server, the
+            # default on Linux since Python 3.14.
+            with multiprocessing.get_context("fork").Pool(
+                options["workers"], init_index_worker, (using,)
+            ) as pool:
+                for i, range_counts in pool.imap_unordered(index_range_worker, tasks):
+                    counts.update(self.range_done(checkpoint, i, range_counts))
+
+        else:
+            for i, start, end in pending:
+                range_counts = index_range(
+                    using,
+                    start,
+                    end,
+                    options["batch_size"],
+                    start_date=checkpoint.start_date,
+                    force=force,
+                    sessions=checkpoint.sessions,
+                    record_hashes=record_hashes,
+                )
+                counts.update(self.range_done(checkpoint, i, range_counts))
+
+        checkpoint.delete()
+
+        return counts
+
+    def rebuild_and_swap(self, using, options):
+        """
+        Rebuild the index while the live one keeps serving searches. Solr
+        rebuilds into the standby core at the connection's REBUILD_URL, and
+        only swaps it with the live core if it holds every bill.
+
+        The PostgreSQL backend has no standby to rebuild into, so documents
+        are replaced in the live index, a batch at a time, and searches see a
+        mix of old and new documents until the rebuild ends. Those of bills
+        that are no longer indexed are only removed once every bill has been
+        reindexed. Either way, bills updated during the rebuild are posted
+        again at the end.
+        """
+        if options["resume"] or options["age"] or options["sessions"]:
+            raise CommandError(
+                "--swap rebuilds every bill, so it can't be combined with "
+                "--resume, --age or --session"
+            )
+
+        backend = haystack_connections[using].get_backend()
+        model = get_bill_index(using).get_model()
+        started = timezone.now()
+
+        if isinstance(backend, PostgresSearchBackend):
+            # Each batch commits on its own, so searches never see an empty
+            # index, and rows are only locked while their batch is posted.
+            counts = self.rebuild(using, options)
+            caught_up = self.catch_up(using, started, options)
+            self.validate_in_place(using)
+            self.remove_stale_documents(using)
+
+            index_updated(using=using)
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "Reindexed {} bill(s) in place, and posted {} bill(s) "
+                    "updated since".format(counts["posted"], caught_up["posted"])
+                )
+            )
+            return
+
+        standby = standby_connection(using)
+
+        # The hashes recorded on bills describe the documents in the live
+        # core, so the standby core's aren't recorded.
+        haystack_connections[standby].get_backend().clear()
+        counts = self.rebuild(standby, options, record_hashes=False)
+        self.index_other_models(standby, options["batch_size"])
+        caught_up = self.catch_up(standby, started, options, record_hashes=False)
+        self.validate(standby)
+
+        swap_solr_cores(
+            settings.HAYSTACK_CONNECTIONS[using]["URL"],
+            settings.HAYSTACK_CONNECTIONS[using]["REBUILD_URL"],
+        )
+
+        # Documents posted to the old live core during the rebuild may
+        # not be in the new one, so post each bill again the next time it
+        # is updated.
+        reset_document_hashes([model])
+
+        index_updated(using=using)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Rebuilt the index with {} bill(s), posted {} bill(s) updated "
+                "since, and swapped it in".format(counts["posted"], caught_up["posted"])
+            )
+        )
+
+    def rebuild(self, using, options, record_hashes=True):
+        index = get_bill_index(using)
+
+        checkpoint = Checkpoint(options["checkpoint"])
+        checkpoint.ranges = pk_ranges(
+            bill_queryset(index, using), options["shard_size"]
+        )
+        checkpoint.save()
+
+        # Every document is posted, whatever was posted before.
+        return self.index_ranges(
+            using, checkpoint, options, force=True, record_hashes=record_hashes
+        )
+
+    def catch_up(self, using, started, options, record_hashes=True):
+        # Bills updated since the rebuild started may have been posted as
+        # they were before.
+        index = get_bill_index(using)
+        backend = haystack_connections[using].get_backend()
+
+        qs = bill_queryset(index, using, start_date=started).order_by("pk")
+        counts = collections.Counter(posted=0, skipped=0)
+
+        for batch in batches(
+            qs.iterator(chunk_size=options["batch_size"]), options["batch_size"]
+        ):
+            counts.update(
+                post_changed_documents(
+                    index, backend, batch, force=True, record_hashes=record_hashes
+                )
+            )
+
+        return counts
+
+    def remove_stale_documents(self, using):
+        # Documents of bills deleted, or no longer indexed, since they were
+        # posted.
+        index = get_bill_index(using)
+
+        SearchDocument.objects.filter(
+            django_ct=get_model_ct(index.get_model())
+        ).exclude(django_id__in=bill_queryset(index, using).values("pk")).delete()
+
+    def index_other_models(self, using, batch_size):
+        # Events, people and committees, if they are indexed, so the standby
+        # core is complete when it is swapped in.
+        bill_index = get_bill_index(using)
+        backend = haystack_connections[using].get_backend()
+
+        for index in haystack_connections[using].get_unified_index().collect_indexes():
+            if index is bill_index:
+                continue
+
+            qs = index.build_queryset(using=using).order_by("pk")
+
+            for batch in batches(qs.iterator(chunk_size=batch_size), batch_size):
+                backend.update(index, batch)
+
+    def validate_in_place(self, using):
+        index = get_bill_index(using)
+        bills = bill_queryset(index, using)
+
+        expected = bills.count()
+        indexed = SearchDocument.objects.filter(
+            django_ct=get_model_ct(index.get_model()),
+            django_id__in=bills.values("pk"),
+        ).count()
+
+        if indexed != expected:
+            raise CommandError(
+                "Only {} of {} bill(s) were reindexed. The documents already "
+                "replaced stay in the live index, and those of bills no longer "
+                "indexed were not removed.".format(indexed, expected)
+            )
+
+    def validate(self, using):
+        index = get_bill_index(using)
+
+        expected = bill_queryset(index, using).count()
+        indexed = SearchQuerySet(using=using).models(index.get_model()).count()
+
+        if indexed != expected:
+            raise CommandError(
+                "The rebuilt index has {} of {} bill(s), so it was not swapped "
+                "in".format(indexed, expected)
+            )
+
+    def range_done(self, checkpoint, i, counts):
+        checkpoint.mark_done(i)
+
+        start, end = checkpoint.ranges[i]
+        self.stdout.write(
+            "Posted {} and skipped {} bill(s) from {} to {} ({} of {} range(s))".format(
+                counts["posted"],
+                counts["skipped"],
+                start,
+                end or "end",
+                len(checkpoint.done),
+                len(checkpoint.ranges),
+            )
+        )
+
+        return counts
@@ -0,0 +1,225 @@
+import collections
+import concurrent.futures
+import datetime
+import time
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from councilmatic_core import urls
+from councilmatic_core.models import Bill, Event, Organization, Person
+
+
+# Detail pages are enumerated from these querysets, keyed by the first segment
+# of the URL pattern, e.g., legislation/<slug>/ and legislation/<slug>/rss/.
+DETAIL_QUERYSETS = {
+    "committee": Organization.committees,
+    "legislation": lambda: Bill.objects.filter(restrict_view=False),
+    "person": Person.objects.all,
+    "event": Event.objects.all,
+}
+
+# These patterns redirect, act, or are served by their own precomputed cache.
+SKIPPED_URLS = getattr(
+    settings,
+    "WARM_CACHE_SKIPPED_URLS",
+    [
+        "search",
+        "flush",
+        "pdfviewer",
+        "export_data",
+        "committee_widget",
+        "committee_widget_json",
+        "bill_widget",
+        "bill_widget_json",
+        "person_widget",
+        "person_widget_json",
+    ],
+)
+
+
+def default_host():
+    """
+    Return the first host in ALLOWED_HOSTS that names a host, rather than a
+    wildcard like "*", or localhost.
+    """
+    for host in settings.ALLOWED_HOSTS:
+        host = host.lstrip(".")
+
+        if host and "*" not in host:
+            return host
+
+    return "localhost"
+
+
+def read_traffic(path):
+    """
+    Read hit counts in `uniq -c` format, e.g., from
+
+        awk '{print $7}' access.log | sort | uniq -c
+
+    and return a Counter of paths.
+    """
+    traffic = collections.Counter()
+
+    with open(path) as f:
+        for line in f:
+            try:
+                count, url_path = line.split()
+            except ValueError:
+                continue
+
+            traffic[url_path.split("?")[0]] += int(count)
+
+    return traffic
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the pages in councilmatic_core.urls to warm the cache after a scrape"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--update_all",
+            default=False,
+            action="store_true",
+            help="Warm detail pages for every bill, person, committee and event.",
+        )
+
+        parser.add_argument(
+            "--window",
+            default=24,
+            type=int,
+            help="Warm detail pages for entities updated in the past WINDOW hours.",
+        )
+
+        parser.add_argument(
+            "--traffic",
+            help="File of hit counts per path in `uniq -c` format. Busier pages are warmed first.",
+        )
+
+        parser.add_argument(
+            "--workers",
+            default=4,
+            type=int,
+            help="Number of pages to render at once.",
+        )
+
+        parser.add_argument(
+            "--host",
+            default=default_host(),
+            help="Host header to send with each request.",
+        )
+
+    def handle(self, *args, **options):
+        traffic = collections.Counter()
+        if options["traffic"]:
+            traffic = read_traffic(options["traffic"])
+
+        window_start = None
+        if not options["update_all"]:
+            window_start = timezone.now() - datetime.timedelta(hours=options["window"])
+
+        paths = self.get_paths(window_start)
+
+        # Busiest first, then most recently changed. sorted is stable, so pages
+        # without traffic keep the order get_paths returned them in.
+        paths = sorted(paths, key=lambda path: -traffic[path])
+
+        self.stdout.write("Warming {} page(s)".format(len(paths)))
+
+        self.host = options["host"]
+
+        # Requests go through the middleware, as they would from a browser.
+        # Unlike the test client, a handler can serve several threads at once.
+        self.handler = BaseHandler()
+        self.handler.load_middleware()
+
+        timings = []
+        start = time.perf_counter()
+
+        with concurrent.futures.ThreadPoolExecutor(options["workers"]) as executor:
+            for path, status, elapsed in executor.map(self.render, paths):
+                timings.append(elapsed)
+
+                line = "{} {:.3f}s {}".format(status, elapsed, path)
+                if status == 200:
+                    self.stdout.write(line)
+                else:
+                    self.stderr.write(line)
+
+        if timings:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "Warmed {} page(s) in {:.3f}s (slowest {:.3f}s)".format(
+                        len(timings), time.perf_counter() - start, max(timings)
+                    )
+                )
+            )
+
+    def get_paths(self, window_start):
+        """
+        Return the paths to render, list pages first, then detail pages with
+        the most recently updated entities first.
+        """
+        list_paths = []
+        detail_patterns = collections.defaultdict(list)
+
+        for pattern in urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+
+            if pattern.name in SKIPPED_URLS:
+                continue
+
+            groups = pattern.pattern.regex.groupindex
+
+            if not groups:
+                list_paths.append(reverse(pattern.name))
+            elif set(groups) == {"slug"}:
+                prefix = pattern.pattern.regex.pattern.lstrip("^").split("/")[0]
+
+                if prefix in DETAIL_QUERYSETS:
+                    detail_patterns[prefix].append(pattern.name)
+
+        detail_paths = []
+
+        for prefix, names in detail_patterns.items():
+            qs = DETAIL_QUERYSETS[prefix]()
+
+            if window_start:
+                qs = qs.filter(updated_at__gte=window_start)
+
+            for updated_at, slug in qs.order_by("-updated_at").values_list(
+                "updated_at", "slug"
+            ):
+                if not slug:
+                    continue
+
+                for name in names:
+                    detail_paths.append((updated_at, reverse(name, args=(slug,))))
+
+        detail_paths.sort(key=lambda x: x[0], reverse=True)
+
+        return list_paths + [path for _, path in detail_paths]
+
+    def render(self, path):
+        request = RequestFactory(HTTP_HOST=self.host).get(path)
+
+        start = time.perf_counter()
+
+        try:
+            status = self.handler.get_response(request).status_code
+        except Exception as e:
+            status = "{}: {}".format(e.__class__.__name__, e)
+        finally:
+            # Each worker thread opens its own database connection.
+            connections.close_all()
+
+        return path, status, time.perf_counter() - start
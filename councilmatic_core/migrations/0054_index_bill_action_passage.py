@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index the columns IndexView.find_recently_passed filters on. Bill actions
+    belong to python-opencivicdata, so the indexes are created with SQL
+    rather than declared on the (proxy) BillAction model.
+    """
+
+    dependencies = [
+        ("councilmatic_core", "0053_add_councilmatic_bio"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS councilmatic_billaction_classification_gin "
+            "ON opencivicdata_billaction USING GIN (classification)",
+            reverse_sql="DROP INDEX IF EXISTS councilmatic_billaction_classification_gin",
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS councilmatic_billaction_date "
+            "ON opencivicdata_billaction (date)",
+            reverse_sql="DROP INDEX IF EXISTS councilmatic_billaction_date",
+        ),
+    ]
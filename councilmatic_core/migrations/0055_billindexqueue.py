@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("councilmatic_core", "0054_index_bill_action_passage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BillIndexQueue",
+            fields=[
+                (
+                    "bill_id",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("enqueued_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("councilmatic_core", "0055_billindexqueue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bill",
+            name="search_document_hash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+import re
+
+from django.db import migrations, models
+
+
+# A copy of councilmatic_core.utils.normalize_identifier as of this
+# migration, so later changes to it don't change what the migration does.
+def normalize_identifier(identifier):
+    identifier = re.sub(r"^\s*(file\s*#?|#)\s*", "", identifier, flags=re.IGNORECASE)
+    parts = identifier.upper().split()
+
+    if not parts:
+        return ""
+
+    first, *rest = parts
+    normalized = first + "".join(part.lstrip("0") or "0" for part in rest)
+
+    return re.sub(r"^([A-Z]*\d{4})0+(?=\d)", r"\1", normalized)
+
+
+def normalize_identifiers(apps, schema_editor):
+    Bill = apps.get_model("councilmatic_core", "Bill")
+
+    bills = []
+
+    for bill in Bill.objects.only("identifier").iterator():
+        bill.normalized_identifier = normalize_identifier(bill.identifier)
+        bills.append(bill)
+
+        if len(bills) == 1000:
+            Bill.objects.bulk_update(bills, ["normalized_identifier"])
+            bills = []
+
+    Bill.objects.bulk_update(bills, ["normalized_identifier"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("councilmatic_core", "0057_searchdocument"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bill",
+            name="normalized_identifier",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=100
+            ),
+        ),
+        migrations.RunPython(normalize_identifiers, migrations.RunPython.noop),
+    ]
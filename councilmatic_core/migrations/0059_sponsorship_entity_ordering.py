@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("councilmatic_core", "0058_bill_normalized_identifier"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="billsponsorship",
+            options={"ordering": ["id"]},
+        ),
+        migrations.AlterModelOptions(
+            name="billactionrelatedentity",
+            options={"ordering": ["id"]},
+        ),
+    ]
@@ -2,8 +2,10 @@ import datetime
 import os
 import pytz
 
-from django.db import models
+from django.db import connection, models
 from django.contrib.gis.db import models as geo_models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
 from django.urls import reverse, NoReverseMatch
 from django.utils import timezone
@@ -16,6 +18,8 @@ from proxy_overrides.related import ProxyForeignKey
 import opencivicdata.legislative.models
 import opencivicdata.core.models
 
+from councilmatic_core.utils import normalize_identifier
+
 
 static_storage = FileSystemStorage(
     location=os.path.join(settings.STATIC_ROOT), base_url="/"
@@ -460,6 +464,22 @@ class Bill(opencivicdata.legislative.models.Bill):
     restrict_view = models.BooleanField(default=False)
     last_action_date = models.DateField(blank=True, null=True)
 
+    # Hash of the search document last posted for this bill, so unchanged
+    # documents are not posted again.
+    search_document_hash = models.CharField(
+        max_length=64, blank=True, null=True, editable=False
+    )
+
+    # The identifier, normalized, so searches for it can find the bill
+    # without the search backend.
+    normalized_identifier = models.CharField(
+        max_length=100, blank=True, db_index=True, editable=False
+    )
+
+    def save(self, *args, **kwargs):
+        self.normalized_identifier = normalize_identifier(self.identifier)
+        super().save(*args, **kwargs)
+
     def delete(self, **kwargs):
         kwargs["keep_parents"] = kwargs.get("keep_parents", True)
         super().delete(**kwargs)
@@ -705,6 +725,8 @@ class Bill(opencivicdata.legislative.models.Bill):
 class BillSponsorship(opencivicdata.legislative.models.BillSponsorship):
     class Meta:
         proxy = True
+        # Match the order search documents embed sponsorships in.
+        ordering = ["id"]
 
     bill = ProxyForeignKey(Bill, related_name="sponsorships", on_delete=models.CASCADE)
     organization = ProxyForeignKey(Organization, null=True, on_delete=models.SET_NULL)
@@ -775,9 +797,79 @@ class BillAction(opencivicdata.legislative.models.BillAction):
 class BillActionRelatedEntity(opencivicdata.legislative.models.BillActionRelatedEntity):
     class Meta:
         proxy = True
+        # Match the order search documents embed related entities in.
+        ordering = ["id"]
 
     action = ProxyForeignKey(
         BillAction, related_name="related_entities", on_delete=models.CASCADE
     )
 
     organization = ProxyForeignKey(Organization, null=True, on_delete=models.SET_NULL)
+
+
+class BillIndexQueue(models.Model):
+    """
+    Bills waiting to be re-indexed. Saving a bill, or anything embedded in
+    its search document, enqueues it again, so repeated changes coalesce
+    into one row until the queue is flushed.
+    """
+
+    bill_id = models.CharField(max_length=100, primary_key=True)
+    enqueued_at = models.DateTimeField(db_index=True)
+
+    @classmethod
+    def enqueue(cls, bill_ids):
+        """
+        Queue bills, given a list of their ids or a queryset of them from
+        values_list, in one statement. A queryset is queued by the database,
+        however many bills it has, without fetching them.
+        """
+        if isinstance(bill_ids, models.QuerySet):
+            select, params = bill_ids.query.sql_with_params()
+            select = (
+                "SELECT DISTINCT affected.bill_id, %s FROM ({}) AS affected "
+                "WHERE affected.bill_id IS NOT NULL".format(select)
+            )
+            params = (timezone.now(),) + tuple(params)
+        else:
+            bill_ids = sorted({bill_id for bill_id in bill_ids if bill_id})
+            if not bill_ids:
+                return
+
+            select = "SELECT DISTINCT unnest(%s::varchar[]), %s"
+            params = (bill_ids, timezone.now())
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO {table} (bill_id, enqueued_at)
+                {select}
+                ON CONFLICT (bill_id) DO UPDATE
+                SET enqueued_at = EXCLUDED.enqueued_at
+                """.format(
+                    table=connection.ops.quote_name(cls._meta.db_table),
+                    select=select,
+                ),
+                params,
+            )
+
+
+class SearchDocument(models.Model):
+    """
+    A search document stored by the PostgreSQL search backend, i.e.,
+    councilmatic_core.backends.postgres_backend.
+    """
+
+    id = models.CharField(max_length=255, primary_key=True)
+    django_ct = models.CharField(max_length=100, db_index=True)
+    django_id = models.CharField(max_length=255)
+
+    # The prepared document, as it would be posted to Solr
+    data = models.JSONField()
+
+    # Maintained by the backend from the indexed fields in data, weighted by
+    # their boost
+    search_vector = SearchVectorField(null=True)
+
+    class Meta:
+        indexes = [GinIndex(fields=["search_vector"])]
@@ -0,0 +1,190 @@
+"""
+Match saved searches, e.g., those of BillSearchSubscription, against bills
+that changed, in process, rather than running each saved search against the
+search backend. Bills are prepared as they are for the index, once each, and
+only the saved searches that could match a bill are checked against it.
+"""
+import collections
+import html
+import re
+
+from django.conf import settings
+from haystack import connections as haystack_connections
+from haystack.constants import DEFAULT_ALIAS
+
+from .indexing import batches, get_bill_index
+
+
+WORD_RE = re.compile(r"\w+")
+
+# Quoted phrases, as AutoQuery finds them.
+PHRASE_RE = re.compile(r'"(?P<phrase>.*?)"')
+
+
+def words(text):
+    return WORD_RE.findall(html.unescape(text or "").lower())
+
+
+class SavedSearch(object):
+    """
+    A search for term, narrowed to facets, e.g., {"bill_type": ["ordinance"]},
+    as CouncilmaticFacetedSearchView saves it. Like AutoQuery, the term
+    matches documents with every word and quoted phrase in it, and none of
+    the words prefixed with a minus sign.
+    """
+
+    def __init__(self, key, term=None, facets=None):
+        self.key = key
+        self.facets = [
+            (field, value)
+            for field, values in (facets or {}).items()
+            for value in values
+        ]
+
+        self.words = []
+        self.excluded = []
+        self.phrases = []
+
+        term = term or ""
+        for phrase in PHRASE_RE.findall(term):
+            phrase_words = words(phrase)
+            if phrase_words:
+                self.phrases.append(" {} ".format(" ".join(phrase_words)))
+
+        for token in PHRASE_RE.sub(" ", term).split():
+            if token.startswith("-") and len(token) > 1:
+                self.excluded.extend(words(token[1:]))
+            else:
+                self.words.extend(words(token))
+
+    @property
+    def anchor(self):
+        """
+        Return a facet value or word that every document the search matches
+        has, or None if it matches documents without either.
+        """
+        if self.facets:
+            return self.facets[0]
+
+        for phrase in self.phrases:
+            return ("text", phrase.split()[0])
+
+        if self.words:
+            return ("text", self.words[0])
+
+        return None
+
+    def matches(self, document):
+        for field, value in self.facets:
+            if (field, value) not in document.terms:
+                return False
+
+        return (
+            all(word in document.words for word in self.words)
+            and not any(word in document.words for word in self.excluded)
+            and all(phrase in document.text for phrase in self.phrases)
+        )
+
+
+class PercolatedDocument(object):
+    """
+    The words of a prepared document's text, and its facet values, to
+    match saved searches against.
+    """
+
+    def __init__(self, document, text_field, facet_fields):
+        text_words = words(document.get(text_field))
+
+        self.text = " {} ".format(" ".join(text_words))
+        self.words = set(text_words)
+
+        self.terms = {("text", word) for word in self.words}
+        for field in facet_fields:
+            values = document.get(field)
+
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+
+            self.terms.update(
+                (field, str(value)) for value in values if value is not None
+            )
+
+
+class Percolator(object):
+    """
+    Match a batch of saved searches against documents in one pass. Searches
+    are filed under their anchor, so each document is only checked against
+    those filed under its words and facet values, and those without one.
+    """
+
+    def __init__(self, searches, text_field="text"):
+        self.text_field = text_field
+        self.anchored = collections.defaultdict(list)
+        self.unanchored = []
+        self.facet_fields = set()
+
+        for search in searches:
+            self.facet_fields.update(field for field, value in search.facets)
+
+            anchor = search.anchor
+            if anchor is None:
+                self.unanchored.append(search)
+            else:
+                self.anchored[anchor].append(search)
+
+    def match(self, document):
+        """
+        Return the keys of the saved searches that match the prepared
+        document.
+        """
+        document = PercolatedDocument(document, self.text_field, self.facet_fields)
+
+        candidates = list(self.unanchored)
+        for term in document.terms:
+            candidates.extend(self.anchored.get(term, []))
+
+        return [search.key for search in candidates if search.matches(document)]
+
+
+def match_saved_searches(searches, since=None, using=DEFAULT_ALIAS, batch_size=500):
+    """
+    Return a dictionary of the keys of searches that match bills updated
+    since the given datetime, or any bill, to the ids of the bills they
+    match.
+    """
+    index = get_bill_index(using)
+    text_field = haystack_connections[using].get_unified_index().document_field
+
+    percolator = Percolator(searches, text_field=text_field)
+    matches = collections.defaultdict(list)
+
+    qs = index.build_queryset(using=using, start_date=since).order_by("pk")
+
+    for batch in batches(qs.iterator(chunk_size=batch_size), batch_size):
+        for bill in batch:
+            for key in percolator.match(index.full_prepare(bill)):
+                matches[key].append(bill.pk)
+
+    return dict(matches)
+
+
+def match_bill_search_subscriptions(since=None, using=DEFAULT_ALIAS):
+    """
+    Return a dictionary of BillSearchSubscription ids to the ids of bills
+    updated since the given datetime that they match.
+    """
+    if not settings.USING_NOTIFICATIONS:
+        return {}
+
+    from notifications.models import BillSearchSubscription
+
+    searches = [
+        SavedSearch(
+            subscription.pk,
+            term=subscription.search_params.get("term"),
+            facets=subscription.search_params.get("facets"),
+        )
+        for subscription in BillSearchSubscription.objects.all()
+    ]
+
+    return match_saved_searches(searches, since=since, using=using)
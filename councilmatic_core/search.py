@@ -0,0 +1,737 @@
+import base64
+import binascii
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import NoReverseMatch, reverse
+from haystack import connections
+from haystack.constants import DEFAULT_ALIAS, DJANGO_CT, DJANGO_ID, ID
+from haystack.query import SQ, SearchQuerySet
+import requests
+
+from .indexing import get_bill_index
+from .models import Bill
+from .utils import (
+    ExactHighlighter,
+    bump_cache_version,
+    get_cache_version,
+    normalize_identifier,
+)
+
+
+# Search connection to use when the default one is down, e.g., one using
+# councilmatic_core.backends.postgres_backend.PostgresSearchEngine.
+SEARCH_FALLBACK_CONNECTION = getattr(settings, "SEARCH_FALLBACK_CONNECTION", None)
+
+# How long, in seconds, to remember whether the search backend is up.
+SEARCH_HEALTH_CHECK_INTERVAL = getattr(settings, "SEARCH_HEALTH_CHECK_INTERVAL", 30)
+
+# Whether the search page loads bills from the database, e.g., for templates
+# that use result.object, rather than rendering results from stored fields.
+SEARCH_LOAD_ALL = getattr(settings, "SEARCH_LOAD_ALL", False)
+
+# How long, in seconds, to cache pages of search results. Updating the index
+# expires them sooner.
+SEARCH_RESULT_CACHE_TIMEOUT = getattr(settings, "SEARCH_RESULT_CACHE_TIMEOUT", 60 * 60)
+
+# Fields to highlight matches of the search term in, and the number and size,
+# in characters, of the fragments around matches to show in search results.
+# Solr only highlights stored fields, so bill texts are highlighted in the
+# excerpt of the document field that is stored.
+SEARCH_HIGHLIGHT_FIELDS = getattr(settings, "SEARCH_HIGHLIGHT_FIELDS", ["text_excerpt"])
+SEARCH_HIGHLIGHT_SNIPPETS = getattr(settings, "SEARCH_HIGHLIGHT_SNIPPETS", 3)
+SEARCH_HIGHLIGHT_FRAGSIZE = getattr(settings, "SEARCH_HIGHLIGHT_FRAGSIZE", 200)
+
+# Number of characters to start suggesting bills at, how many to suggest,
+# and how long, in seconds, browsers may cache suggestions.
+SEARCH_SUGGEST_MIN_LENGTH = getattr(settings, "SEARCH_SUGGEST_MIN_LENGTH", 2)
+SEARCH_SUGGEST_LIMIT = getattr(settings, "SEARCH_SUGGEST_LIMIT", 8)
+SEARCH_SUGGEST_MAX_AGE = getattr(settings, "SEARCH_SUGGEST_MAX_AGE", 60 * 5)
+
+# Searches shaped like a bill identifier, e.g., "O2011-1234" or "File #2011
+# 123", are looked up by identifier before searching. Bare numbers, like
+# "2019", are searched for, as they are more likely years or addresses.
+SEARCH_IDENTIFIER_RE = re.compile(
+    getattr(
+        settings,
+        "SEARCH_IDENTIFIER_PATTERN",
+        r"^\s*((file\s*)?#\s*[a-z]{0,4}|[a-z]{1,4})[\s-]*\d[\d\s-]*$",
+    ),
+    re.IGNORECASE,
+)
+
+# Deepest page of search results reachable by page number. Past it, results
+# sorted by a field are paged with cursors, and those sorted by relevance end.
+SEARCH_MAX_PAGE = getattr(settings, "SEARCH_MAX_PAGE", 50)
+
+# Facets of the search page, whose counts are precomputed after indexing.
+SEARCH_FACET_FIELDS = getattr(
+    settings,
+    "SEARCH_FACET_FIELDS",
+    ["bill_type", "sponsorships", "controlling_body", "inferred_status"],
+)
+
+# Number of results of each search for bills, events, people and committees.
+SEARCH_SITE_LIMIT = getattr(settings, "SEARCH_SITE_LIMIT", 20)
+
+# Number of values of each facet listed on the search page, the most common
+# first. More are paged in from the facet values endpoint.
+SEARCH_FACET_LIMIT = getattr(settings, "SEARCH_FACET_LIMIT", 20)
+
+
+def search_backend_available(using=DEFAULT_ALIAS):
+    """
+    Return whether the search backend for the given connection responds.
+    Backends without a URL, e.g., the PostgreSQL backend, are always
+    available.
+    """
+    url = settings.HAYSTACK_CONNECTIONS[using].get("URL")
+
+    if not url:
+        return True
+
+    cache_key = "search_backend_available:{}".format(using)
+    available = cache.get(cache_key)
+
+    if available is None:
+        try:
+            requests.get(url, timeout=5)
+        except requests.RequestException:
+            available = False
+        else:
+            available = True
+
+        cache.set(cache_key, available, SEARCH_HEALTH_CHECK_INTERVAL)
+
+    return available
+
+
+def get_search_connection(using=DEFAULT_ALIAS):
+    """
+    Return the search connection to query: the given one if it is available,
+    otherwise SEARCH_FALLBACK_CONNECTION.
+    """
+    if search_backend_available(using):
+        return using
+
+    if SEARCH_FALLBACK_CONNECTION:
+        return SEARCH_FALLBACK_CONNECTION
+
+    # Most likely, Solr is down and needs restarting.
+    raise Exception(
+        "ConnectionError: Unable to connect to Solr at {}. Is Solr running?".format(
+            settings.HAYSTACK_CONNECTIONS[using]["URL"]
+        )
+    )
+
+
+def only_bills(searchqueryset):
+    """
+    Restrict searchqueryset to bills, if events, people or committees are
+    indexed too.
+    """
+    using = searchqueryset.query._using
+    unified_index = connections[using].get_unified_index()
+
+    if searchqueryset.query.models or len(unified_index.get_indexed_models()) < 2:
+        return searchqueryset
+
+    return searchqueryset.models(get_bill_index(using).get_model())
+
+
+def get_index_version():
+    """
+    Return the version of the search index. Include it in the keys of cached
+    search results, so that they expire whenever the index is updated.
+    """
+    return get_cache_version("search_index")
+
+
+def facets_are_cacheable(searchqueryset):
+    """
+    Return whether facet counts for searchqueryset are cached: those of the
+    search page without a query, and with at most one selected facet.
+    """
+    query = searchqueryset.query
+    return not query.query_filter and len(query.narrow_queries) <= 1
+
+
+def normalize_query(searchqueryset, **extra):
+    """
+    Return a cache key for searchqueryset that is the same for the same
+    search, whatever the order of its parameters, and changes whenever the
+    index is updated.
+    """
+    query = searchqueryset.query
+
+    normalized = {
+        "using": query._using,
+        "query": str(query.query_filter),
+        "models": sorted(str(model._meta) for model in query.models),
+        "facets": sorted(query.facets.items()),
+        "narrow_queries": sorted(query.narrow_queries),
+        **extra,
+    }
+
+    return "{}:{}".format(
+        get_index_version(),
+        hashlib.md5(
+            json.dumps(normalized, default=str, sort_keys=True).encode()
+        ).hexdigest(),
+    )
+
+
+def facet_counts_cache_key(searchqueryset):
+    return "search_facet_counts:{}".format(normalize_query(searchqueryset))
+
+
+def get_facet_counts(searchqueryset):
+    """
+    Return facet counts for searchqueryset, from the cache if they are
+    cacheable.
+    """
+    if not facets_are_cacheable(searchqueryset):
+        return searchqueryset.facet_counts()
+
+    cache_key = facet_counts_cache_key(searchqueryset)
+    facet_counts = cache.get(cache_key)
+
+    if facet_counts is None:
+        # Only counts are needed, not results.
+        clone = searchqueryset._clone()
+        clone.query.set_limits(0, 0)
+        facet_counts = clone.query.get_facet_counts()
+        cache.set(cache_key, facet_counts, None)
+
+    return facet_counts
+
+
+def highlight_query(query):
+    """
+    Return a query for the exact phrase, or words, of query that
+    ExactHighlighter highlights, in each of SEARCH_HIGHLIGHT_FIELDS.
+    """
+    query_words = ExactHighlighter(query).query_words
+
+    if not query_words:
+        return None
+
+    terms = " ".join(
+        '"{}"'.format(word.replace('"', "")) for word in sorted(query_words)
+    )
+
+    return " OR ".join(
+        "{}:({})".format(field, terms) for field in SEARCH_HIGHLIGHT_FIELDS
+    )
+
+
+def result_fields(searchqueryset):
+    """
+    Return the stored fields to fetch for results of searchqueryset, leaving
+    out the document field and SEARCH_HIGHLIGHT_FIELDS, which can be long.
+    """
+    unified_index = connections[searchqueryset.query._using].get_unified_index()
+    excluded = set(SEARCH_HIGHLIGHT_FIELDS) | {unified_index.document_field}
+
+    fields = {ID, DJANGO_CT, DJANGO_ID, "score"}
+    for field_name, field in unified_index.all_searchfields().items():
+        if field.stored and field_name not in excluded:
+            fields.add(field_name)
+
+    return sorted(fields)
+
+
+def with_highlighting(searchqueryset, query):
+    """
+    Ask the search backend for fragments of SEARCH_HIGHLIGHT_FIELDS around
+    matches of query, rather than the fields themselves.
+    """
+    hl_query = highlight_query(query)
+
+    if hl_query is None:
+        return searchqueryset
+
+    # Options are passed to Solr prefixed with "hl."
+    clone = searchqueryset.highlight(
+        fl=",".join(SEARCH_HIGHLIGHT_FIELDS),
+        snippets=SEARCH_HIGHLIGHT_SNIPPETS,
+        fragsize=SEARCH_HIGHLIGHT_FRAGSIZE,
+        q=hl_query,
+        requireFieldMatch="true",
+    )
+    clone.query.fields = result_fields(clone)
+
+    return clone
+
+
+def with_default_order(searchqueryset):
+    """
+    Sort searchqueryset by id, if it isn't sorted. Searches without a query
+    have no relevance to sort by, and sorting them by id, which every result
+    has, lets cursors page through them past SEARCH_MAX_PAGE.
+    """
+    if searchqueryset.query.order_by:
+        return searchqueryset
+
+    return searchqueryset.order_by(ID)
+
+
+def cursor_order(searchqueryset):
+    """
+    Return the fields searchqueryset is sorted by, with the id to break ties,
+    or None if it is sorted by relevance, which cursors can't page through.
+    """
+    order_by = list(searchqueryset.query.order_by)
+
+    if not order_by or any(field.lstrip("-") == "score" for field in order_by):
+        return None
+
+    if not any(field.lstrip("-") == ID for field in order_by):
+        order_by.append(ID)
+
+    return order_by
+
+
+def get_next_cursor(searchqueryset, results):
+    """
+    Return a cursor for the results after the last of results, or None if
+    searchqueryset can't be paged with cursors.
+    """
+    order_by = cursor_order(searchqueryset)
+
+    if not order_by or not results:
+        return None
+
+    values = [getattr(results[-1], field.lstrip("-"), None) for field in order_by]
+
+    # Results without a value to sort by can't be compared against.
+    if any(value is None for value in values):
+        return None
+
+    cursor = json.dumps(values, default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def after_cursor(searchqueryset, cursor):
+    """
+    Return searchqueryset narrowed to the results after cursor, by comparing
+    their sort values, rather than skipping the results before it. Raise
+    ValueError for invalid cursors.
+    """
+    order_by = cursor_order(searchqueryset)
+
+    if order_by is None:
+        raise ValueError("Searches sorted by relevance can't be paged with cursors")
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(order_by):
+        raise ValueError("Invalid cursor")
+
+    fields = (
+        connections[searchqueryset.query._using].get_unified_index().all_searchfields()
+    )
+
+    # Results after the cursor sort after it by the first field, or equal it
+    # by the first and sort after it by the second, and so on.
+    keyset = []
+    equal = []
+
+    for field, value in zip(order_by, values):
+        field_name = field.lstrip("-")
+
+        if field_name in fields:
+            value = fields[field_name].convert(value)
+
+        lookup = "lt" if field.startswith("-") else "gt"
+        after = SQ(**{"{}__{}".format(field_name, lookup): value})
+
+        for condition in equal:
+            after &= condition
+
+        keyset.append(after)
+        equal.append(SQ(**{"{}__exact".format(field_name): value}))
+
+    query = keyset[0]
+    for after in keyset[1:]:
+        query |= after
+
+    # Replace the order, rather than add to it, so cursors of later pages
+    # have as many values as the first.
+    searchqueryset = searchqueryset.filter(query)
+    searchqueryset.query.clear_order_by()
+
+    return searchqueryset.order_by(*order_by)
+
+
+class CachedSearchResults(object):
+    """
+    Stand-in for a SearchQuerySet that serves pages of results, with their
+    hit and facet counts, from the cache. Pages are cached under the
+    normalized query, so the same search is a hit whatever the order of its
+    parameters, until the index is updated.
+    """
+
+    def __init__(self, searchqueryset):
+        self.searchqueryset = searchqueryset
+        self.hits = None
+        self._facet_counts = None
+        self._pages = {}
+
+    @property
+    def query(self):
+        return self.searchqueryset.query
+
+    def cache_key(self, start, end):
+        query = self.searchqueryset.query
+
+        return "search_results:{}".format(
+            normalize_query(
+                self.searchqueryset,
+                order_by=query.order_by,
+                highlight=query.highlight,
+                fields=query.fields,
+                load_all=self.searchqueryset._load_all,
+                page=[start, end],
+            )
+        )
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k : k + 1][0]
+
+        start = k.start or 0
+        page = self._pages.get((start, k.stop))
+
+        if page is None:
+            cache_key = self.cache_key(start, k.stop)
+            page = cache.get(cache_key)
+
+        if page is None:
+            results = self.searchqueryset[start : k.stop]
+
+            # The query has run, so the counts come with the results.
+            page = {
+                "results": results,
+                "hits": self.searchqueryset.count(),
+                "facet_counts": self.searchqueryset.facet_counts(),
+            }
+
+            cache.set(cache_key, page, SEARCH_RESULT_CACHE_TIMEOUT)
+
+        # Pages and counts are asked for several times a request, e.g., by
+        # the paginator and the template, so only fetch each once.
+        self._pages[(start, k.stop)] = page
+        self.hits = page["hits"]
+        self._facet_counts = page["facet_counts"]
+
+        return page["results"]
+
+    def __len__(self):
+        if self.hits is None:
+            self[0:0]
+
+        return self.hits
+
+    def count(self):
+        return len(self)
+
+    def facet_counts(self):
+        if self._facet_counts is None:
+            self[0:0]
+
+        return self._facet_counts
+
+
+def find_bill_by_identifier(query):
+    """
+    Return the bill whose identifier query is, if query looks like one and
+    exactly one bill has it.
+    """
+    if not SEARCH_IDENTIFIER_RE.match(query):
+        return None
+
+    bills = Bill.objects.filter(
+        normalized_identifier=normalize_identifier(query), restrict_view=False
+    ).only("slug")[:2]
+
+    if len(bills) == 1:
+        return bills[0]
+
+
+def get_suggestions(prefix, using=None):
+    """
+    Return bills whose identifiers, friendly name, sponsors or controlling
+    bodies have words starting with the words of prefix. Suggestions for
+    each prefix are cached until the index is updated.
+    """
+    prefix = " ".join(prefix.lower().split())
+
+    if len(prefix) < SEARCH_SUGGEST_MIN_LENGTH:
+        return []
+
+    using = using or get_search_connection()
+
+    cache_key = "search_suggestions:{}:{}:{}".format(
+        get_index_version(), using, hashlib.md5(prefix.encode()).hexdigest()
+    )
+    suggestions = cache.get(cache_key)
+
+    if suggestions is None:
+        results = (
+            only_bills(SearchQuerySet(using=using))
+            .autocomplete(suggest=prefix)
+            .values("friendly_name", "slug", "description")[:SEARCH_SUGGEST_LIMIT]
+        )
+
+        suggestions = [
+            {
+                "name": result["friendly_name"],
+                "description": result["description"],
+                "url": reverse("bill_detail", args=(result["slug"],)),
+            }
+            for result in results
+        ]
+
+        cache.set(cache_key, suggestions, SEARCH_RESULT_CACHE_TIMEOUT)
+
+    return suggestions
+
+
+def without_facets(searchqueryset):
+    clone = searchqueryset._clone()
+    clone.query.facets = {}
+    return clone
+
+
+def facet_options(options, limit=SEARCH_FACET_LIMIT):
+    """
+    Return the options to count the most common values of a facet with, up
+    to limit, given the options it was asked for with. Facets of the search
+    page are counted the same way whatever their options, so the counts
+    warm_facet_counts caches are the ones the search page looks up.
+    """
+    # Values sorted by name would be the first few alphabetically, and
+    # sorting by count is the default.
+    options = {key: value for key, value in options.items() if key != "sort"}
+
+    return {"mincount": 1, **options, "limit": limit}
+
+
+def limit_facets(searchqueryset, limit=SEARCH_FACET_LIMIT):
+    """
+    Ask for the most common values of each facet of searchqueryset, up to
+    limit, rather than every value. The rest are paged in from the facet
+    values endpoint.
+    """
+    clone = searchqueryset._clone()
+
+    for field, options in clone.query.facets.items():
+        clone.query.facets[field] = facet_options(options, limit)
+
+    return clone
+
+
+def narrow_selected_facets(searchqueryset, selected_facets):
+    """
+    Narrow searchqueryset to selected_facets, e.g., 'bill_type_exact:Ordinance',
+    as FacetedSearchForm does.
+    """
+    for facet in selected_facets:
+        if ":" not in facet:
+            continue
+
+        field, value = facet.split(":", 1)
+
+        if value:
+            searchqueryset = searchqueryset.narrow(
+                '{}:"{}"'.format(field, searchqueryset.query.clean(value))
+            )
+
+    return searchqueryset
+
+
+def facet_prefix_options(prefix, using):
+    """
+    Return the facet options to count only values starting with prefix,
+    ignoring case, for the backend of the given search connection.
+    """
+    from .backends.postgres_backend import PostgresSearchBackend
+
+    if isinstance(connections[using].get_backend(), PostgresSearchBackend):
+        return {"prefix": prefix}
+
+    # Solr only matches prefixes case-sensitively, and facet values keep
+    # their case, so match values that contain prefix, ignoring case.
+    return {"contains": prefix, "contains.ignoreCase": "true"}
+
+
+def get_facet_values(
+    field,
+    q="",
+    selected_facets=(),
+    prefix="",
+    page=1,
+    sort="count",
+    using=None,
+    page_size=SEARCH_FACET_LIMIT,
+):
+    """
+    Return a page of values of field, with their counts, for the search for
+    q with selected_facets, and whether there is another page. Only values
+    starting with prefix are counted.
+    """
+    searchqueryset = only_bills(SearchQuerySet(using=using or get_search_connection()))
+
+    if q:
+        searchqueryset = searchqueryset.auto_query(q)
+
+    searchqueryset = narrow_selected_facets(searchqueryset, selected_facets)
+
+    # Ask for one more value than fits on the page, to tell if there are more.
+    options = {
+        "mincount": 1,
+        "limit": page_size + 1,
+        "offset": (page - 1) * page_size,
+        "sort": sort,
+    }
+    if prefix:
+        options.update(facet_prefix_options(prefix, searchqueryset.query._using))
+
+    facet_counts = get_facet_counts(searchqueryset.facet(field, **options))
+    values = facet_counts.get("fields", {}).get(field, [])
+
+    return values[:page_size], len(values) > page_size
+
+
+def warm_facet_counts(using=DEFAULT_ALIAS, facet_fields=None):
+    """
+    Cache facet counts for the search page without a query, and for each
+    facet value it lists selected on its own. Return the number of cached
+    counts.
+    """
+    searchqueryset = only_bills(SearchQuerySet(using=using))
+
+    for field in facet_fields or SEARCH_FACET_FIELDS:
+        searchqueryset = searchqueryset.facet(field)
+
+    # Ask for the facets the search page does.
+    searchqueryset = limit_facets(searchqueryset)
+
+    facet_counts = get_facet_counts(searchqueryset)
+    warmed = 1
+
+    for field, values in facet_counts.get("fields", {}).items():
+        for value, count in values:
+            get_facet_counts(
+                narrow_selected_facets(
+                    searchqueryset, ["{}_exact:{}".format(field, value)]
+                )
+            )
+            warmed += 1
+
+    return warmed
+
+
+def index_updated(using=DEFAULT_ALIAS):
+    """
+    Expire cached search results after the index is updated, and precompute
+    the search page's facet counts again.
+    """
+    bump_cache_version("search_index")
+    return warm_facet_counts(using=using)
+
+
+# Views of each type of search_site result, by their slugs.
+SITE_SEARCH_VIEWS = {
+    "bill": "bill_detail",
+    "event": "event_detail",
+    "person": "person",
+    "committee": "committee_detail",
+}
+
+
+def result_type(result, using=DEFAULT_ALIAS):
+    """
+    Return which of SITE_SEARCH_VIEWS result is, by the index it is from.
+    """
+    from .haystack_indexes import BillIndex, CommitteeIndex, EventIndex, PersonIndex
+
+    index = connections[using].get_unified_index().get_index(result.model)
+
+    for index_class, name in (
+        (BillIndex, "bill"),
+        (EventIndex, "event"),
+        (PersonIndex, "person"),
+        (CommitteeIndex, "committee"),
+    ):
+        if isinstance(index, index_class):
+            return name
+
+
+def site_search_url(type_, slug):
+    """
+    Return the URL of the view of a search_site result, in the city's app
+    namespace, if it has one.
+    """
+    view_name = SITE_SEARCH_VIEWS[type_]
+
+    try:
+        return reverse("{}:{}".format(settings.APP_NAME, view_name), args=(slug,))
+    except NoReverseMatch:
+        return reverse(view_name, args=(slug,))
+
+
+def search_site(q, using=None, limit=SEARCH_SITE_LIMIT):
+    """
+    Return the bills, events, people and committees that best match q,
+    rendered from their stored fields.
+    """
+    q = " ".join(q.split())
+
+    if not q:
+        return []
+
+    using = using or get_search_connection()
+
+    cache_key = "search_site:{}:{}:{}:{}".format(
+        get_index_version(), using, limit, hashlib.md5(q.encode()).hexdigest()
+    )
+    results = cache.get(cache_key)
+
+    if results is None:
+        searchqueryset = SearchQuerySet(using=using).auto_query(q)
+        searchqueryset.query.fields = [
+            ID,
+            DJANGO_CT,
+            DJANGO_ID,
+            "score",
+            "friendly_name",
+            "slug",
+        ]
+
+        results = []
+        for result in searchqueryset[:limit]:
+            type_ = result_type(result, using)
+
+            # Cities may index other models, which have no view to link to.
+            if type_ is None:
+                continue
+
+            results.append(
+                {
+                    "type": type_,
+                    "name": result.friendly_name,
+                    "url": site_search_url(type_, result.slug),
+                }
+            )
+
+        cache.set(cache_key, results, SEARCH_RESULT_CACHE_TIMEOUT)
+
+    return results
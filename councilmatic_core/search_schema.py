@@ -0,0 +1,184 @@
+"""
+Build a Solr schema tuned for the search indexes, rather than haystack's
+generic one, and compare it with the schema of a running core.
+
+Fields that are only faceted or sorted on are strings with docValues instead
+of analyzed text, dates are date points, and only the document field and
+boosted fields keep the norms that scoring them depends on.
+"""
+import requests
+from django.conf import settings
+from django.template.loader import render_to_string
+from haystack import connections as haystack_connections
+from haystack.constants import DEFAULT_ALIAS, DJANGO_CT, DJANGO_ID, ID
+from haystack.fields import FacetField
+
+
+SCHEMA_TEMPLATE = "search_configuration/councilmatic_schema.xml"
+
+# Fields that results are sorted on, besides dates and numbers.
+SORT_FIELDS = getattr(settings, "SEARCH_SORT_FIELDS", ("sort_name",))
+
+# Solr field types of haystack field types, single- and multi-valued.
+FIELD_TYPES = {
+    "string": ("text_en", "text_en"),
+    "date": ("pdate", "pdates"),
+    "datetime": ("pdate", "pdates"),
+    "integer": ("plong", "plongs"),
+    "float": ("pfloat", "pfloats"),
+    "boolean": ("boolean", "booleans"),
+    "ngram": ("ngram", "ngram"),
+    "edge_ngram": ("edge_ngram", "edge_ngram"),
+}
+
+TEXT_TYPES = ("text_en", "ngram", "edge_ngram")
+
+# Properties of fields compared with those of a running core.
+FIELD_PROPERTIES = (
+    "type",
+    "indexed",
+    "stored",
+    "multiValued",
+    "docValues",
+    "omitNorms",
+)
+
+
+def schema_field(field):
+    """
+    Return the Solr properties of a haystack field.
+    """
+    multi_valued = field.is_multivalued
+    single_type, multi_type = FIELD_TYPES.get(field.field_type, FIELD_TYPES["string"])
+
+    properties = {
+        "name": field.index_fieldname,
+        "type": multi_type if multi_valued else single_type,
+        "indexed": field.indexed,
+        "stored": field.stored,
+        "multiValued": multi_valued,
+        "docValues": False,
+        "omitNorms": True,
+    }
+
+    if (
+        isinstance(field, FacetField)
+        or field.faceted
+        or field.index_fieldname in SORT_FIELDS
+    ):
+        properties["type"] = "strings" if multi_valued else "string"
+        properties["docValues"] = True
+
+    elif properties["type"] not in TEXT_TYPES:
+        # Points are only sortable and faceted on with docValues.
+        properties["docValues"] = True
+
+    elif not field.indexed:
+        # Text that isn't searched needn't be analyzed.
+        properties["type"] = "strings" if multi_valued else "string"
+
+    else:
+        properties["omitNorms"] = not (field.document or field.boost != 1.0)
+
+    return properties
+
+
+def build_schema_fields(using=DEFAULT_ALIAS):
+    """
+    Return the Solr properties of the fields of the indexes of the given
+    search connection, and of the fields haystack adds to every document.
+    """
+    fields = [
+        {
+            "name": name,
+            "type": "string",
+            "indexed": True,
+            "stored": True,
+            "multiValued": False,
+            "docValues": False,
+            "omitNorms": True,
+        }
+        for name in (ID, DJANGO_CT, DJANGO_ID)
+    ]
+
+    searchfields = haystack_connections[using].get_unified_index().all_searchfields()
+
+    for field in sorted(searchfields.values(), key=lambda field: field.index_fieldname):
+        if field.index_fieldname not in (ID, DJANGO_CT, DJANGO_ID):
+            fields.append(schema_field(field))
+
+    return fields
+
+
+def render_schema(using=DEFAULT_ALIAS):
+    return render_to_string(
+        SCHEMA_TEMPLATE, {"fields": build_schema_fields(using), "ID": ID}
+    )
+
+
+def core_schema_fields(url):
+    """
+    Return the fields of the Solr core at url, with their default
+    properties, from its schema API.
+    """
+    response = requests.get(
+        "{}/schema/fields".format(url.rstrip("/")),
+        params={"showDefaults": "true", "wt": "json"},
+        timeout=30,
+    )
+    response.raise_for_status()
+
+    return response.json()["fields"]
+
+
+def core_field_info(url, field_names):
+    """
+    Return the number of documents and distinct terms of each of field_names
+    in the Solr core at url, and the number of documents in the core, from
+    its Luke handler.
+    """
+    response = requests.get(
+        "{}/admin/luke".format(url.rstrip("/")),
+        params={"fl": ",".join(field_names), "numTerms": 0, "wt": "json"},
+        timeout=300,
+    )
+    response.raise_for_status()
+    info = response.json()
+
+    return info["index"]["numDocs"], info["fields"]
+
+
+def diff_schema(expected, actual):
+    """
+    Return a line for each difference between the expected fields and those
+    of a core: "- name" for a missing field, "+ name" for an unexpected one,
+    and "~ name: ..." for a property that differs. Fields Solr manages, like
+    _version_, are ignored.
+    """
+    expected = {field["name"]: field for field in expected}
+    actual = {
+        field["name"]: field for field in actual if not field["name"].startswith("_")
+    }
+
+    differences = []
+
+    for name in sorted(expected.keys() | actual.keys()):
+        if name not in actual:
+            differences.append("- {}".format(name))
+
+        elif name not in expected:
+            differences.append("+ {}".format(name))
+
+        else:
+            for prop in FIELD_PROPERTIES:
+                expected_value = expected[name][prop]
+                actual_value = actual[name].get(prop, False)
+
+                if actual_value != expected_value:
+                    differences.append(
+                        "~ {}: {} is {}, expected {}".format(
+                            name, prop, actual_value, expected_value
+                        )
+                    )
+
+    return differences
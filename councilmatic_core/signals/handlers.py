@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils.text import slugify, Truncator
@@ -10,6 +11,7 @@ from opencivicdata.core.models import (
 from opencivicdata.legislative.models import (
     Event as OCDEvent,
     Bill as OCDBill,
+    BillAction as OCDBillAction,
     EventRelatedEntity as OCDEventRelatedEntity,
 )
 
@@ -18,8 +20,11 @@ from councilmatic_core.models import (
     Person as CouncilmaticPerson,
     Event as CouncilmaticEvent,
     Bill as CouncilmaticBill,
+    BillAction as CouncilmaticBillAction,
     Post as CouncilmaticPost,
 )
+from councilmatic_core.utils import bump_cache_version, normalize_identifier
+from councilmatic_core.widgets import invalidate_widget
 
 
 @receiver(post_save, sender=OCDOrganization)
@@ -32,6 +37,9 @@ def create_councilmatic_org(sender, instance, created, **kwargs):
         # just update the child table, not the parent table
         co.save_base(raw=True)
 
+    elif hasattr(instance, "councilmatic_organization"):
+        invalidate_widget("committee", instance.councilmatic_organization.slug)
+
 
 @receiver(post_save, sender=OCDPerson)
 def create_councilmatic_person(sender, instance, created, **kwargs):
@@ -43,6 +51,9 @@ def create_councilmatic_person(sender, instance, created, **kwargs):
         # just update the child table, not the parent table
         cp.save_base(raw=True)
 
+    elif hasattr(instance, "councilmatic_person"):
+        invalidate_widget("person", instance.councilmatic_person.slug)
+
 
 @receiver(post_save, sender=OCDEvent)
 def create_councilmatic_event(sender, instance, created, **kwargs):
@@ -75,10 +86,22 @@ def create_councilmatic_bill(sender, instance, created, **kwargs):
         cb = instance.councilmatic_bill
 
     cb.last_action_date = cb.get_last_action_date()
+    cb.normalized_identifier = normalize_identifier(instance.identifier)
 
     # just update the child table, not the parent table
     cb.save_base(raw=True)
 
+    invalidate_widget("bill", cb.slug)
+
+
+@receiver(post_save, sender=CouncilmaticBill)
+@receiver(post_save, sender=OCDBillAction)
+@receiver(post_save, sender=CouncilmaticBillAction)
+def invalidate_bill_caches(sender, instance, **kwargs):
+    # Wait for the import to commit, so pages aren't cached from a bill
+    # whose actions aren't saved yet under the new version.
+    transaction.on_commit(lambda: bump_cache_version("bills"))
+
 
 @receiver(post_save, sender=OCDPost)
 def create_councilmatic_post(sender, instance, created, **kwargs):
@@ -0,0 +1,178 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from haystack.signals import BaseSignalProcessor
+
+from opencivicdata.core.models import (
+    Organization as OCDOrganization,
+    Person as OCDPerson,
+)
+from opencivicdata.legislative.models import (
+    Event as OCDEvent,
+    Bill as OCDBill,
+    BillAbstract as OCDBillAbstract,
+    BillAction as OCDBillAction,
+    BillActionRelatedEntity as OCDBillActionRelatedEntity,
+    BillSource as OCDBillSource,
+    BillSponsorship as OCDBillSponsorship,
+)
+
+from councilmatic_core.models import (
+    Organization as CouncilmaticOrganization,
+    Person as CouncilmaticPerson,
+    Event as CouncilmaticEvent,
+    Bill as CouncilmaticBill,
+    BillAction as CouncilmaticBillAction,
+    BillActionRelatedEntity as CouncilmaticBillActionRelatedEntity,
+    BillSponsorship as CouncilmaticBillSponsorship,
+    BillIndexQueue,
+)
+
+
+def bill(instance):
+    return [instance.pk]
+
+
+def related_to_bill(instance):
+    return [instance.bill_id]
+
+
+def related_to_action(instance):
+    return OCDBillAction.objects.filter(id=instance.action_id).values_list(
+        "bill_id", flat=True
+    )
+
+
+def sponsored_by_person(instance):
+    return OCDBillSponsorship.objects.filter(person_id=instance.pk).values_list(
+        "bill_id", flat=True
+    )
+
+
+def acted_on_by_organization(instance):
+    return (
+        OCDBillAction.objects.filter(
+            Q(organization_id=instance.pk)
+            | Q(related_entities__organization_id=instance.pk)
+        )
+        .values_list("bill_id", flat=True)
+        .distinct()
+    )
+
+
+# Map each model embedded in bill documents to the bills it appears in.
+# Proxies send signals as themselves, so they are listed alongside the OCD
+# models pupa saves.
+AFFECTED_BILLS = {
+    OCDBill: bill,
+    CouncilmaticBill: bill,
+    OCDBillAbstract: related_to_bill,
+    OCDBillSource: related_to_bill,
+    OCDBillAction: related_to_bill,
+    CouncilmaticBillAction: related_to_bill,
+    OCDBillSponsorship: related_to_bill,
+    CouncilmaticBillSponsorship: related_to_bill,
+    OCDBillActionRelatedEntity: related_to_action,
+    CouncilmaticBillActionRelatedEntity: related_to_action,
+    OCDPerson: sponsored_by_person,
+    CouncilmaticPerson: sponsored_by_person,
+    OCDOrganization: acted_on_by_organization,
+    CouncilmaticOrganization: acted_on_by_organization,
+}
+
+# Bill documents only embed the names of people and organizations, so their
+# bills are queued when they are renamed or deleted, not on every save.
+NAMED_MODELS = (
+    OCDPerson,
+    CouncilmaticPerson,
+    OCDOrganization,
+    CouncilmaticOrganization,
+)
+
+# Councilmatic models with indexes of their own, by the OCD models pupa saves
+# and the accessor of the Councilmatic row of an OCD one.
+INDEXED_MODELS = {
+    OCDPerson: "councilmatic_person",
+    OCDOrganization: "councilmatic_organization",
+    OCDEvent: "councilmatic_event",
+    CouncilmaticPerson: None,
+    CouncilmaticOrganization: None,
+    CouncilmaticEvent: None,
+}
+
+
+class BillIndexSignalProcessor(BaseSignalProcessor):
+    """
+    Queue bills for re-indexing whenever they, or the people, organizations,
+    actions and sponsorships embedded in their documents, change. Enable it
+    with
+
+        HAYSTACK_SIGNAL_PROCESSOR = "councilmatic_core.signals.processors.BillIndexSignalProcessor"
+
+    and run the flush_bill_index_queue command to post the queued bills.
+
+    People, organizations and events, if they are indexed, are updated when
+    they are saved, as with haystack's RealtimeSignalProcessor.
+    """
+
+    def setup(self):
+        for sender in AFFECTED_BILLS:
+            post_save.connect(self.handle_change, sender=sender)
+
+            if sender in NAMED_MODELS:
+                pre_save.connect(self.note_rename, sender=sender)
+                # Sponsorships are unlinked from a deleted person before
+                # post_delete, so find their bills first.
+                pre_delete.connect(self.handle_change, sender=sender)
+            else:
+                post_delete.connect(self.handle_change, sender=sender)
+
+        for sender, accessor in INDEXED_MODELS.items():
+            post_save.connect(self.handle_save, sender=sender)
+
+            # Deleting an OCD row deletes its Councilmatic row too.
+            if accessor is None:
+                post_delete.connect(self.handle_delete, sender=sender)
+
+    def teardown(self):
+        for sender in AFFECTED_BILLS:
+            post_save.disconnect(self.handle_change, sender=sender)
+            pre_save.disconnect(self.note_rename, sender=sender)
+            pre_delete.disconnect(self.handle_change, sender=sender)
+            post_delete.disconnect(self.handle_change, sender=sender)
+
+        for sender in INDEXED_MODELS:
+            post_save.disconnect(self.handle_save, sender=sender)
+            post_delete.disconnect(self.handle_delete, sender=sender)
+
+    def note_rename(self, sender, instance, raw=False, update_fields=None, **kwargs):
+        # Raw saves, e.g., of the Councilmatic row of a new OCD person, only
+        # write their own table.
+        instance._bill_index_renamed = (
+            not raw
+            and not instance._state.adding
+            and (update_fields is None or "name" in update_fields)
+            and sender._base_manager.filter(pk=instance.pk)
+            .exclude(name=instance.name)
+            .exists()
+        )
+
+    def handle_change(self, sender, instance, **kwargs):
+        if kwargs["signal"] is post_save and sender in NAMED_MODELS:
+            if not getattr(instance, "_bill_index_renamed", False):
+                return
+
+        BillIndexQueue.enqueue(AFFECTED_BILLS[sender](instance))
+
+    def handle_save(self, sender, instance, **kwargs):
+        accessor = INDEXED_MODELS[sender]
+
+        if accessor:
+            # The Councilmatic row of a new OCD row is saved after it, and
+            # handled then.
+            instance = getattr(instance, accessor, None)
+            if instance is None:
+                return
+
+            sender = type(instance)
+
+        super().handle_save(sender, instance, **kwargs)
@@ -0,0 +1,112 @@
+/*
+Page in values of a search facet beyond the most common ones listed, and
+filter them by what has been typed. Containers with a
+data-facet-values-url attribute fill the list of facet values above them,
+e.g.,
+
+  <ul class="search-facet-list">...</ul>
+  <div class="facet-values" data-facet-values-url="/facet-values/sponsorships/" data-facet-name="sponsorships">
+    <input type="search" class="facet-values-prefix">
+    <a href="#" class="facet-values-more">More</a>
+  </div>
+*/
+"use strict"
+
+var CouncilmaticFacetValues = {}
+
+// Milliseconds to wait for typing to pause before filtering values.
+CouncilmaticFacetValues.delay = 250
+
+// Link to the current search, with value selected.
+CouncilmaticFacetValues.href = function (facetName, value) {
+  var params = new URLSearchParams(window.location.search)
+  params.delete("page")
+  params.delete("cursor")
+  params.append("selected_facets", facetName + "_exact:" + value)
+
+  return "/search/?" + params.toString()
+}
+
+CouncilmaticFacetValues.item = function (facetName, value) {
+  var item = document.createElement("li")
+  var link = document.createElement("a")
+
+  item.className = "small"
+  link.href = CouncilmaticFacetValues.href(facetName, value.name)
+  link.textContent = value.name
+  item.appendChild(link)
+
+  return item
+}
+
+CouncilmaticFacetValues.attach = function (container) {
+  var list = container.parentNode.querySelector(".search-facet-list")
+  var prefixInput = container.querySelector(".facet-values-prefix")
+  var more = container.querySelector(".facet-values-more")
+  var facetName = container.dataset.facetName
+  var nextPage = 2
+  var timeout = null
+
+  function load(page, replace) {
+    var search = new URLSearchParams(window.location.search)
+    var url = new URL(container.dataset.facetValuesUrl, window.location.href)
+    var prefix = prefixInput.value.trim()
+
+    url.searchParams.set("q", search.get("q") || "")
+    search.getAll("selected_facets").forEach(function (facet) {
+      url.searchParams.append("selected_facets", facet)
+    })
+    url.searchParams.set("page", page)
+    if (prefix) {
+      url.searchParams.set("prefix", prefix)
+      url.searchParams.set("sort", "index")
+    }
+
+    return fetch(url)
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error("Facet values returned " + response.status)
+        }
+
+        return response.json()
+      })
+      .then(function (payload) {
+        if (prefixInput.value.trim() !== prefix) {
+          return
+        }
+
+        if (replace) {
+          list.innerHTML = ""
+        }
+
+        payload.values.forEach(function (value) {
+          list.appendChild(CouncilmaticFacetValues.item(facetName, value))
+        })
+
+        nextPage = payload.next_page
+        more.style.display = nextPage ? "" : "none"
+      })
+      .catch(function () {
+        // Leave the values listed as they are, and stop offering more.
+        nextPage = null
+        more.style.display = "none"
+      })
+  }
+
+  more.addEventListener("click", function (event) {
+    event.preventDefault()
+
+    if (nextPage) {
+      load(nextPage, false)
+    }
+  })
+
+  prefixInput.addEventListener("input", function () {
+    clearTimeout(timeout)
+    timeout = setTimeout(function () { load(1, true) }, CouncilmaticFacetValues.delay)
+  })
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll("[data-facet-values-url]").forEach(CouncilmaticFacetValues.attach)
+})
@@ -0,0 +1,61 @@
+/*
+Suggest bills as users type in the search bar. Inputs with a
+data-suggest-url attribute fill the datalist named by their list attribute
+with suggestions from that URL, e.g.,
+
+  <input name="q" list="search-suggestions" data-suggest-url="/suggest/">
+  <datalist id="search-suggestions"></datalist>
+*/
+"use strict"
+
+var CouncilmaticSuggest = {}
+
+// Milliseconds to wait for typing to pause before asking for suggestions.
+CouncilmaticSuggest.delay = 150
+
+CouncilmaticSuggest.fill = function (datalist, suggestions) {
+  datalist.innerHTML = ""
+
+  suggestions.forEach(function (suggestion) {
+    var option = document.createElement("option")
+    option.value = suggestion.name
+    option.label = suggestion.description
+    datalist.appendChild(option)
+  })
+}
+
+CouncilmaticSuggest.attach = function (input) {
+  var datalist = document.getElementById(input.getAttribute("list"))
+  var timeout = null
+  var cache = {}
+
+  input.addEventListener("input", function () {
+    var prefix = input.value.trim().toLowerCase()
+
+    clearTimeout(timeout)
+
+    if (prefix in cache) {
+      CouncilmaticSuggest.fill(datalist, cache[prefix])
+      return
+    }
+
+    timeout = setTimeout(function () {
+      var url = new URL(input.dataset.suggestUrl, window.location.href)
+      url.searchParams.set("q", prefix)
+
+      fetch(url)
+        .then(function (response) { return response.json() })
+        .then(function (payload) {
+          cache[prefix] = payload.suggestions
+
+          if (input.value.trim().toLowerCase() === prefix) {
+            CouncilmaticSuggest.fill(datalist, payload.suggestions)
+          }
+        })
+    }, CouncilmaticSuggest.delay)
+  })
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll("input[data-suggest-url]").forEach(CouncilmaticSuggest.attach)
+})
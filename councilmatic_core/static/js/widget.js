@@ -0,0 +1,164 @@
+/*
+Lightweight Councilmatic embed. Add one or more placeholders to a page, e.g.
+
+  <div data-councilmatic-widget="https://chicago.councilmatic.org/legislation/o2011-1234/widget.json"></div>
+  <script src="https://chicago.councilmatic.org/static/js/widget.js" async></script>
+
+and each is replaced with a small card rendered from the widget payload.
+*/
+"use strict"
+
+var CouncilmaticWidget = {}
+
+CouncilmaticWidget.element = function (tag, text, className) {
+  var el = document.createElement(tag)
+
+  if (text) {
+    el.textContent = text
+  }
+
+  if (className) {
+    el.className = className
+  }
+
+  return el
+}
+
+CouncilmaticWidget.link = function (item, base) {
+  var a = CouncilmaticWidget.element("a", item.name)
+  a.href = new URL(item.url, base).href
+  a.target = "_blank"
+  return a
+}
+
+CouncilmaticWidget.line = function (label, value) {
+  var p = CouncilmaticWidget.element("p")
+  p.appendChild(CouncilmaticWidget.element("strong", label + ": "))
+
+  if (typeof value === "string") {
+    p.appendChild(document.createTextNode(value))
+  } else {
+    p.appendChild(value)
+  }
+
+  return p
+}
+
+CouncilmaticWidget.details = {
+  bill: function (payload, card, base) {
+    if (payload.status) {
+      card.appendChild(
+        CouncilmaticWidget.element("span", payload.status, "cm-status")
+      )
+    }
+
+    card.appendChild(CouncilmaticWidget.element("p", payload.description))
+
+    if (payload.primary_sponsor) {
+      card.appendChild(
+        CouncilmaticWidget.line(
+          "Primary sponsor",
+          CouncilmaticWidget.link(payload.primary_sponsor, base)
+        )
+      )
+    }
+
+    if (payload.latest_action) {
+      card.appendChild(
+        CouncilmaticWidget.line(
+          "Latest activity",
+          payload.latest_action.date +
+            " - " +
+            payload.latest_action.description +
+            " by " +
+            payload.latest_action.organization
+        )
+      )
+    }
+  },
+  person: function (payload, card, base) {
+    if (payload.title) {
+      card.appendChild(CouncilmaticWidget.element("p", payload.title))
+    }
+
+    var img = CouncilmaticWidget.element("img", null, "cm-headshot")
+    img.src = new URL(payload.headshot, base).href
+    img.alt = payload.name
+    card.appendChild(img)
+
+    payload.chair_of.forEach(function (committee) {
+      card.appendChild(
+        CouncilmaticWidget.line(
+          "Chairperson",
+          CouncilmaticWidget.link(committee, base)
+        )
+      )
+    })
+  },
+  committee: function (payload, card, base) {
+    if (payload.description) {
+      card.appendChild(
+        CouncilmaticWidget.line("Responsible for", payload.description)
+      )
+    }
+
+    card.appendChild(
+      CouncilmaticWidget.line("Members", String(payload.member_count))
+    )
+
+    payload.chairs.forEach(function (chair) {
+      card.appendChild(
+        CouncilmaticWidget.line(
+          "Chairperson",
+          CouncilmaticWidget.link(chair, base)
+        )
+      )
+    })
+
+    payload.upcoming_events.forEach(function (event) {
+      card.appendChild(
+        CouncilmaticWidget.line(
+          event.start_time.slice(0, 10),
+          CouncilmaticWidget.link(event, base)
+        )
+      )
+    })
+  },
+}
+
+CouncilmaticWidget.render = function (placeholder) {
+  var src = placeholder.getAttribute("data-councilmatic-widget")
+
+  return fetch(src)
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error("Could not load " + src)
+      }
+      return response.json()
+    })
+    .then(function (payload) {
+      var card = CouncilmaticWidget.element("div", null, "cm-widget")
+      var title = CouncilmaticWidget.element("h3")
+      title.appendChild(CouncilmaticWidget.link(payload, src))
+      card.appendChild(title)
+
+      CouncilmaticWidget.details[payload.type](payload, card, src)
+
+      placeholder.replaceChildren(card)
+    })
+    .catch(function (error) {
+      console.error(error)
+    })
+}
+
+CouncilmaticWidget.renderAll = function () {
+  document
+    .querySelectorAll("[data-councilmatic-widget]")
+    .forEach(CouncilmaticWidget.render)
+}
+
+if (document.readyState === "loading") {
+  document.addEventListener("DOMContentLoaded", CouncilmaticWidget.renderAll)
+} else {
+  CouncilmaticWidget.renderAll()
+}
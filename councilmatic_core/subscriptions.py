@@ -0,0 +1,56 @@
+"""
+Answer whether the user of a request is subscribed to a bill, committee,
+person or events, with an EXISTS query on the user's subscriptions rather
+than by iterating over all of them. Answers are remembered for the rest of
+the request.
+"""
+from django.conf import settings
+
+
+# Kinds of subscription, by the related name of a user's subscriptions of
+# that kind and the field of the object subscribed to, if any.
+SUBSCRIPTION_KINDS = {
+    "bill_actions": ("billactionsubscriptions", "bill"),
+    "committee_actions": ("committeeactionsubscriptions", "committee"),
+    "committee_events": ("committeeeventsubscriptions", "committee"),
+    "person": ("personsubscriptions", "person"),
+    "events": ("eventssubscriptions", None),
+}
+
+
+class Subscriptions(object):
+    def __init__(self, user):
+        self.user = user
+        self._subscribed = {}
+
+    def is_subscribed(self, kind, obj=None):
+        """
+        Return whether the user has a subscription of the given kind, to obj
+        if the kind is for a bill, committee or person.
+        """
+        if not settings.USING_NOTIFICATIONS or not self.user.is_authenticated:
+            return False
+
+        key = (kind, obj.pk if obj is not None else None)
+
+        if key not in self._subscribed:
+            related_name, field = SUBSCRIPTION_KINDS[kind]
+            subscriptions = getattr(self.user, related_name).all()
+
+            if field:
+                subscriptions = subscriptions.filter(**{field: key[1]})
+
+            self._subscribed[key] = subscriptions.exists()
+
+        return self._subscribed[key]
+
+
+def get_subscriptions(request):
+    """
+    Return the Subscriptions of the user of request, the same one for the
+    whole request.
+    """
+    if not hasattr(request, "_subscriptions"):
+        request._subscriptions = Subscriptions(request.user)
+
+    return request._subscriptions
@@ -100,7 +100,8 @@ def alternative_identifiers(id_original):
     id_1 = re.sub(" ", " 0", id_original)
     id_2 = re.sub(" ", "", id_original)
     id_3 = re.sub(" ", "", id_1)
-    return " ".join(i for i in set([id_original, id_1, id_2, id_3]))
+    # Sort, so the search documents containing them are stable between runs.
+    return " ".join(sorted(set([id_original, id_1, id_2, id_3])))
 
 
 @register.filter
@@ -156,3 +157,25 @@ def create_facet_string(selected_facets, query=None):
 @register.filter
 def remove_question(text):
     return text.rstrip("?")
+
+
+@register.filter
+def highlighted_fragments(result):
+    """
+    Return the fragments around matches of the search term highlighted by the
+    search backend, from the first of SEARCH_HIGHLIGHT_FIELDS, or the document
+    field, with any.
+    """
+    # Imported here, so loading these tags doesn't load the search backend.
+    from councilmatic_core.search import (
+        SEARCH_HIGHLIGHT_FIELDS,
+        SEARCH_HIGHLIGHT_SNIPPETS,
+    )
+
+    highlighted = result.highlighted or {}
+
+    for field in SEARCH_HIGHLIGHT_FIELDS + ["text"]:
+        if highlighted.get(field):
+            return highlighted[field][:SEARCH_HIGHLIGHT_SNIPPETS]
+
+    return []
@@ -14,6 +14,9 @@ admin.autodiscover()
 urlpatterns = [
     url(r"^$", views.IndexView.as_view(), name="index"),
     url(r"^search/$", RedirectView.as_view(), name="search"),
+    url(r"^suggest/$", views.suggest, name="suggest"),
+    url(r"^search/all/$", views.site_search, name="site_search"),
+    url(r"^facet-values/(?P<field>\w+)/$", views.facet_values, name="facet_values"),
     url(r"^about/$", views.AboutView.as_view(), name="about"),
     url(r"^committees/$", views.CommitteesView.as_view(), name="committees"),
     url(
@@ -41,6 +44,12 @@ urlpatterns = [
         views.CommitteeWidgetView.as_view(),
         name="committee_widget",
     ),
+    url(
+        r"^committee/(?P<slug>[^/]+)/widget\.json$",
+        views.widget_payload,
+        {"kind": "committee"},
+        name="committee_widget_json",
+    ),
     url(
         r"^legislation/(?P<slug>[^/]+)/$",
         views.BillDetailView.as_view(),
@@ -56,6 +65,12 @@ urlpatterns = [
         views.BillWidgetView.as_view(),
         name="bill_widget",
     ),
+    url(
+        r"^legislation/(?P<slug>[^/]+)/widget\.json$",
+        views.widget_payload,
+        {"kind": "bill"},
+        name="bill_widget_json",
+    ),
     url(r"^person/(?P<slug>[^/]+)/$", views.PersonDetailView.as_view(), name="person"),
     url(r"^person/(?P<slug>[^/]+)/rss/$", feeds.PersonDetailFeed(), name="person_feed"),
     url(
@@ -63,9 +78,20 @@ urlpatterns = [
         views.PersonWidgetView.as_view(),
         name="person_widget",
     ),
+    url(
+        r"^person/(?P<slug>[^/]+)/widget\.json$",
+        views.widget_payload,
+        {"kind": "person"},
+        name="person_widget_json",
+    ),
     url(r"^events/$", views.EventsView.as_view(), name="events"),
     url(r"^events/rss/$", feeds.EventsFeed(), name="events_feed"),
     url(r"^event/(?P<slug>.+)/$", views.EventDetailView.as_view(), name="event_detail"),
+    url(
+        r"^export/(?P<dataset>[a-z]+)\.(?P<export_format>[a-z]+)$",
+        views.export_data,
+        name="export_data",
+    ),
     url(r"^flush-cache/(.*)/$", views.flush, name="flush"),
     url(r"^pdfviewer/$", views.pdfviewer, name="pdfviewer"),
 ]
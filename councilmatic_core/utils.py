@@ -1,7 +1,10 @@
 import datetime
+import re
+import time
 import pytz
 
 from django.conf import settings
+from django.core.cache import cache
 from haystack.utils.highlighting import Highlighter
 
 
@@ -40,3 +43,81 @@ def to_datetime(date, local=False):
 
     else:
         return dt
+
+
+def person_title(person):
+    """
+    Describe a person's seat on the council, e.g., "Ward 1 Alderman", for
+    display beneath their name.
+    """
+    title = ""
+    if person.current_council_seat:
+        title = "%s %s" % (
+            person.current_council_seat,
+            settings.CITY_VOCAB["COUNCIL_MEMBER"],
+        )
+    elif person.latest_council_seat:
+        title = "Former %s, %s" % (
+            settings.CITY_VOCAB["COUNCIL_MEMBER"],
+            person.latest_council_seat,
+        )
+    elif (
+        getattr(settings, "EXTRA_TITLES", None) and person.slug in settings.EXTRA_TITLES
+    ):
+        title = settings.EXTRA_TITLES[person.slug]
+
+    return title
+
+
+def _cache_version_key(name):
+    return "councilmatic_cache_version:{}".format(name)
+
+
+def get_cache_version(name):
+    """
+    Return the current version of a family of cached values, e.g., everything
+    derived from bills. Include it in cache keys so that bumping the version
+    invalidates the whole family at once.
+    """
+    key = _cache_version_key(name)
+    cache.add(key, _initial_cache_version(), None)
+
+    return cache.get(key) or _initial_cache_version()
+
+
+def bump_cache_version(name):
+    key = _cache_version_key(name)
+
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The version was evicted, or never set.
+        version = _initial_cache_version()
+        cache.set(key, version, None)
+        return version
+
+
+def _initial_cache_version():
+    # Versions start from the time, in milliseconds, so a version that was
+    # evicted starts over past any version values were cached under before.
+    return int(time.time() * 1000)
+
+
+def normalize_identifier(identifier):
+    """
+    Normalize a bill identifier, or a search for one, so that the variants
+    the alternative_identifiers filter accounts for, e.g., "O2011 0123",
+    "o2011 123", "O2011123" and "O20110123", are equal. Prefixes like
+    "File #" are dropped.
+    """
+    identifier = re.sub(r"^\s*(file\s*#?|#)\s*", "", identifier, flags=re.IGNORECASE)
+    parts = identifier.upper().split()
+
+    if not parts:
+        return ""
+
+    first, *rest = parts
+    normalized = first + "".join(part.lstrip("0") or "0" for part in rest)
+
+    # Drop zeros padding the number after the year, once its space is gone.
+    return re.sub(r"^([A-Z]*\d{4})0+(?=\d)", r"\1", normalized)
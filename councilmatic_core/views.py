@@ -1,13 +1,15 @@
 import re
 import json
+import datetime
 import itertools
 from operator import attrgetter
 import urllib
-import requests
 from dateutil.relativedelta import relativedelta
 from dateutil import parser
 
 from django.shortcuts import render, redirect
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.conf import settings
 from django.views.generic import TemplateView, ListView, DetailView
 from django.views.decorators.clickjacking import xframe_options_exempt
@@ -15,6 +17,7 @@ from django.db.models import Max, Min
 from django.core.cache import cache
 from django.utils.text import slugify
 from django.utils.decorators import method_decorator
+from django.utils.cache import patch_cache_control
 from django.utils import timezone
 from django.templatetags.static import static
 
@@ -22,6 +25,32 @@ from haystack.forms import FacetedSearchForm
 from haystack.views import FacetedSearchView
 
 from .models import Person, Bill, Organization, Event, Post
+from .export import EXPORT_DATASETS, EXPORT_FORMATS, EXPORT_MAX_AGE, stream_export
+from .search import (
+    SEARCH_FACET_FIELDS,
+    SEARCH_FACET_LIMIT,
+    SEARCH_LOAD_ALL,
+    SEARCH_MAX_PAGE,
+    SEARCH_SUGGEST_MAX_AGE,
+    CachedSearchResults,
+    after_cursor,
+    facets_are_cacheable,
+    find_bill_by_identifier,
+    get_facet_counts,
+    get_facet_values,
+    get_next_cursor,
+    get_search_connection,
+    get_suggestions,
+    limit_facets,
+    only_bills,
+    search_site,
+    with_default_order,
+    with_highlighting,
+    without_facets,
+)
+from .subscriptions import get_subscriptions
+from .utils import get_cache_version, person_title
+from .widgets import get_widget_payload, WIDGET_MAX_AGE
 
 
 if settings.USING_NOTIFICATIONS:
@@ -29,29 +58,101 @@ if settings.USING_NOTIFICATIONS:
 
 
 class CouncilmaticFacetedSearchView(FacetedSearchView):
-    def extra_context(self):
-        # Raise an error if Councilmatic cannot connect to Solr.
-        # Most likely, Solr is down and needs restarting.
-        try:
-            solr_url = settings.HAYSTACK_CONNECTIONS["default"]["URL"]
-            requests.get(solr_url)
-        except requests.ConnectionError:
-            raise Exception(
-                "ConnectionError: Unable to connect to Solr at {}. Is Solr running?".format(
-                    solr_url
+    def __call__(self, request):
+        # Send searches for a bill identifier straight to the bill.
+        if not request.GET.getlist("selected_facets"):
+            bill = find_bill_by_identifier(request.GET.get("q", ""))
+
+            if bill:
+                return redirect("bill_detail", slug=bill.slug)
+
+        return super().__call__(request)
+
+    def build_form(self, form_kwargs=None):
+        form = super().build_form(form_kwargs)
+
+        # Fall back to SEARCH_FALLBACK_CONNECTION if Solr is down, or raise an
+        # error if there is none.
+        using = get_search_connection(form.searchqueryset.query._using)
+        form.searchqueryset = only_bills(form.searchqueryset.using(using))
+
+        return form
+
+    def get_results(self):
+        results = super().get_results()
+
+        if self.query:
+            results = with_highlighting(results, self.query)
+        else:
+            results = with_default_order(results)
+
+        # List the most common values of each facet. The rest are paged in
+        # from facet_values.
+        results = limit_facets(results)
+
+        # Facet counts of the search page without a query are cached, so
+        # don't ask the search backend to compute them with the results.
+        self.facet_counts = None
+        if facets_are_cacheable(results):
+            self.facet_counts = get_facet_counts(results)
+            results = without_facets(results)
+
+        return CachedSearchResults(results)
+
+    def build_page(self):
+        cursor = self.request.GET.get("cursor")
+
+        if cursor:
+            # Count facets over the whole search, not what's after the cursor.
+            self.facet_counts = self.facet_counts or self.results.facet_counts()
+
+            try:
+                self.results = CachedSearchResults(
+                    after_cursor(self.results.searchqueryset, cursor)
                 )
+            except ValueError:
+                raise Http404("Not a valid cursor.")
+
+        else:
+            try:
+                page_no = int(self.request.GET.get("page", 1))
+            except (TypeError, ValueError):
+                raise Http404("Not a valid number for page.")
+
+            # Deep offsets are slow for the search backend, so past
+            # SEARCH_MAX_PAGE, pages are reached with cursors.
+            if page_no > SEARCH_MAX_PAGE:
+                raise Http404(
+                    "Pages past {} are paged with cursors.".format(SEARCH_MAX_PAGE)
+                )
+
+        paginator, page = super().build_page()
+
+        self.next_cursor = None
+        if page.has_next() and (cursor or page.number >= SEARCH_MAX_PAGE):
+            self.next_cursor = get_next_cursor(
+                self.results.searchqueryset, page.object_list
             )
 
+        return paginator, page
+
+    def extra_context(self):
         extra = super(FacetedSearchView, self).extra_context()
         extra["request"] = self.request
-        extra["facets"] = self.results.facet_counts()
+        extra["facets"] = self.facet_counts or self.results.facet_counts()
+        extra["next_cursor"] = self.next_cursor
+        extra["cursor"] = self.request.GET.get("cursor")
+        extra["max_page"] = SEARCH_MAX_PAGE
+        extra["facet_limit"] = SEARCH_FACET_LIMIT
+        # Facets whose other values facet_values pages in.
+        extra["facet_values_fields"] = SEARCH_FACET_FIELDS
 
         q_filters = ""
 
         url_params = [
             (p, val)
             for (p, val) in self.request.GET.items()
-            if p != "page" and p != "selected_facets" and p != "amp" and p != "_"
+            if p not in ("page", "cursor", "selected_facets", "amp", "_")
         ]
         selected_facet_vals = self.request.GET.getlist("selected_facets")
         search_term = self.request.GET.get("q")
@@ -100,10 +201,16 @@ class CouncilmaticFacetedSearchView(FacetedSearchView):
 
 class CouncilmaticSearchForm(FacetedSearchForm):
     def __init__(self, *args, **kwargs):
-        self.load_all = True
+        # Results render from stored fields, unless a city opts into loading
+        # each page of bills from the database.
+        self.load_all = SEARCH_LOAD_ALL
 
         super(CouncilmaticSearchForm, self).__init__(*args, **kwargs)
 
+    def clean_q(self):
+        # Collapse whitespace, so the same search is cached once.
+        return " ".join(self.cleaned_data["q"].split())
+
     def no_query_found(self):
         return self.searchqueryset.all()
 
@@ -142,6 +249,12 @@ class IndexView(TemplateView):
     bill_model = Bill
     event_model = Event
 
+    recently_passed_classifications = getattr(
+        settings, "RECENTLY_PASSED_CLASSIFICATIONS", ["passage"]
+    )
+    recently_passed_days = getattr(settings, "RECENTLY_PASSED_DAYS", 30)
+    recently_passed_limit = getattr(settings, "RECENTLY_PASSED_LIMIT", 10)
+
     def get_context_data(self, **kwargs):
         context = super(IndexView, self).get_context_data(**kwargs)
 
@@ -152,6 +265,7 @@ class IndexView(TemplateView):
         context.update(
             {
                 "recently_passed": recently_passed,
+                "recently_passed_by_type": self.group_by_bill_type(recently_passed),
                 "next_council_meeting": self.event_model.next_city_council_meeting(),
                 "upcoming_committee_meetings": upcoming_meetings,
             }
@@ -160,12 +274,59 @@ class IndexView(TemplateView):
         return context
 
     def find_recently_passed(self, bill_model):
-        recently_passed = []
-        # Do you want to show recently passed bills? CUSTOMIZE FOR COUNCILMATIC.
-        # Otherwise avoid any unnecessary iterative processes when loading the index.
+        """
+        Return up to recently_passed_limit bills with an action classified as
+        one of recently_passed_classifications in the past
+        recently_passed_days days, most recently passed first.
+
+        The bills are found in a single query and cached until the next bill
+        is saved. Set recently_passed_days to None to hide the section.
+        """
+        if not self.recently_passed_days:
+            return []
+
+        cutoff = timezone.localdate() - datetime.timedelta(
+            days=self.recently_passed_days
+        )
+
+        cache_key = "recently_passed:{}:{}:{}:{}".format(
+            bill_model._meta.label_lower,
+            ",".join(self.recently_passed_classifications),
+            cutoff.isoformat(),
+            get_cache_version("bills"),
+        )
+
+        recently_passed = cache.get(cache_key)
+
+        if recently_passed is None:
+            # Filtering and annotating across the same relation reuses the
+            # join, so date_passed is the latest qualifying action.
+            recently_passed = list(
+                bill_model.objects.filter(
+                    restrict_view=False,
+                    actions__classification__overlap=self.recently_passed_classifications,
+                    actions__date__gte=cutoff.isoformat(),
+                )
+                .annotate(recently_passed_on=Max("actions__date"))
+                .order_by("-recently_passed_on", "-id")[: self.recently_passed_limit]
+            )
+
+            cache.set(cache_key, recently_passed, 60 * 60 * 24)
 
         return recently_passed
 
+    def group_by_bill_type(self, bills):
+        grouped = {}
+
+        for bill in bills:
+            # Bill.bill_type raises for bills with several classifications.
+            bill_type = bill.extras.get("local_classification") or (
+                bill.classification[0] if bill.classification else ""
+            )
+            grouped.setdefault(bill_type, []).append(bill)
+
+        return grouped
+
 
 class AboutView(TemplateView):
     template_name = "councilmatic_core/about.html"
@@ -247,17 +408,10 @@ class BillDetailView(DetailView):
         seo["title"] = "%s - %s" % (bill.friendly_name, settings.SITE_META["site_name"])
         context["seo"] = seo
 
-        context["user_subscribed"] = False
+        subscriptions = get_subscriptions(self.request)
+        context["user_subscribed"] = subscriptions.is_subscribed("bill_actions", bill)
         if self.request.user.is_authenticated:
-            user = self.request.user
-            context["user"] = user
-            # check if person of interest is subscribed to by user
-
-            if settings.USING_NOTIFICATIONS:
-                for bas in user.billactionsubscriptions.all():
-                    if bill == bas.bill:
-                        context["user_subscribed"] = True
-                        break
+            context["user"] = self.request.user
 
         return context
 
@@ -306,20 +460,15 @@ class CommitteeDetailView(DetailView):
         seo["title"] = "%s - %s" % (committee.name, settings.SITE_META["site_name"])
         context["seo"] = seo
 
-        context["user_subscribed_actions"] = False
-        context["user_subscribed_events"] = False
+        subscriptions = get_subscriptions(self.request)
+        context["user_subscribed_actions"] = subscriptions.is_subscribed(
+            "committee_actions", committee
+        )
+        context["user_subscribed_events"] = subscriptions.is_subscribed(
+            "committee_events", committee
+        )
         if self.request.user.is_authenticated:
-            user = self.request.user
-            context["user"] = user
-            # check if person of interest is subscribed to by user
-
-            if settings.USING_NOTIFICATIONS:
-                for cas in user.committeeactionsubscriptions.all():
-                    if committee == cas.committee:
-                        context["user_subscribed_actions"] = True
-                for ces in user.committeeeventsubscriptions.all():
-                    if committee == ces.committee:
-                        context["user_subscribed_events"] = True
+            context["user"] = self.request.user
 
         return context
 
@@ -344,23 +493,7 @@ class PersonDetailView(DetailView):
             .order_by("-last_action")[:10]
         )
 
-        title = ""
-        if person.current_council_seat:
-            title = "%s %s" % (
-                person.current_council_seat,
-                settings.CITY_VOCAB["COUNCIL_MEMBER"],
-            )
-        elif person.latest_council_seat:
-            title = "Former %s, %s" % (
-                settings.CITY_VOCAB["COUNCIL_MEMBER"],
-                person.latest_council_seat,
-            )
-        elif (
-            getattr(settings, "EXTRA_TITLES", None)
-            and person.slug in settings.EXTRA_TITLES
-        ):
-            title = settings.EXTRA_TITLES[person.slug]
-        context["title"] = title
+        context["title"] = person_title(person)
 
         seo = {}
         seo.update(settings.SITE_META)
@@ -407,18 +540,11 @@ class PersonDetailView(DetailView):
 
             context["map_geojson"] = json.dumps(map_geojson)
 
-        context["user_subscribed"] = False
-
-        if settings.USING_NOTIFICATIONS:
-            if self.request.user.is_authenticated:
-                user = self.request.user
-                context["user"] = user
-                # check if person of interest is subscribed to by user
+        subscriptions = get_subscriptions(self.request)
+        context["user_subscribed"] = subscriptions.is_subscribed("person", person)
 
-                for ps in user.personsubscriptions.all():
-                    if person == ps.person:
-                        context["user_subscribed"] = True
-                        break
+        if settings.USING_NOTIFICATIONS and self.request.user.is_authenticated:
+            context["user"] = self.request.user
 
         return context
 
@@ -500,14 +626,11 @@ class EventsView(ListView):
 
             context["upcoming_events"] = org_upcoming_events
 
-        context["user_subscribed"] = False
+        context["user_subscribed"] = get_subscriptions(self.request).is_subscribed(
+            "events"
+        )
         if self.request.user.is_authenticated:
-            user = self.request.user
-            context["user"] = user
-
-            if settings.USING_NOTIFICATIONS:
-                if len(user.eventssubscriptions.all()) > 0:
-                    context["user_subscribed"] = True
+            context["user"] = self.request.user
 
         return context
 
@@ -548,6 +671,110 @@ def flush(request, flush_key):
     return redirect("index")
 
 
+def widget_payload(request, kind, slug):
+    """
+    Serve the precomputed payload rendered by static/js/widget.js. Payloads
+    come from the cache, so embeds on third-party sites stay off the ORM.
+    """
+    payload = get_widget_payload(kind, slug)
+
+    if payload is None:
+        raise Http404
+
+    response = JsonResponse(payload)
+    patch_cache_control(response, public=True, max_age=WIDGET_MAX_AGE)
+    response["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+def suggest(request):
+    """
+    Suggest bills for what has been typed in the search bar.
+    """
+    response = JsonResponse({"suggestions": get_suggestions(request.GET.get("q", ""))})
+    patch_cache_control(response, public=True, max_age=SEARCH_SUGGEST_MAX_AGE)
+
+    return response
+
+
+def site_search(request):
+    """
+    Search bills, events, people and committees at once.
+    """
+    response = JsonResponse({"results": search_site(request.GET.get("q", ""))})
+    patch_cache_control(response, public=True, max_age=SEARCH_SUGGEST_MAX_AGE)
+
+    return response
+
+
+def facet_values(request, field):
+    """
+    Page through the values of a facet of the search for q with
+    selected_facets, e.g., for filtering sponsors by what has been typed.
+    """
+    if field not in SEARCH_FACET_FIELDS:
+        raise Http404
+
+    try:
+        page = int(request.GET.get("page", 1))
+    except ValueError:
+        raise Http404("Not a valid number for page.")
+
+    if page < 1:
+        raise Http404("Pages should be 1 or greater.")
+
+    sort = request.GET.get("sort", "count")
+    if sort not in ("count", "index"):
+        raise Http404("Facet values are sorted by count or index.")
+
+    values, has_next = get_facet_values(
+        field,
+        q=" ".join(request.GET.get("q", "").split()),
+        selected_facets=request.GET.getlist("selected_facets"),
+        prefix=request.GET.get("prefix", ""),
+        page=page,
+        sort=sort,
+    )
+
+    response = JsonResponse(
+        {
+            "values": [{"name": name, "count": count} for name, count in values],
+            "next_page": page + 1 if has_next else None,
+        }
+    )
+    patch_cache_control(response, public=True, max_age=SEARCH_SUGGEST_MAX_AGE)
+
+    return response
+
+
+def export_data(request, dataset, export_format):
+    if dataset not in EXPORT_DATASETS or export_format not in EXPORT_FORMATS:
+        raise Http404
+
+    # Exports dump the whole database, so only staff may download them,
+    # unless a city sets EXPORT_DATA_PUBLIC = True.
+    public = getattr(settings, "EXPORT_DATA_PUBLIC", False)
+    if not public and not request.user.is_staff:
+        raise PermissionDenied
+
+    response = StreamingHttpResponse(
+        stream_export(dataset, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response["Content-Disposition"] = 'attachment; filename="{}.{}"'.format(
+        dataset, export_format
+    )
+    response["X-Robots-Tag"] = "noindex"
+
+    if public:
+        patch_cache_control(response, public=True, max_age=EXPORT_MAX_AGE)
+    else:
+        patch_cache_control(response, private=True, max_age=EXPORT_MAX_AGE)
+
+    return response
+
+
 @xframe_options_exempt
 def pdfviewer(request):
     return render(request, "councilmatic_core/pdfviewer.html")
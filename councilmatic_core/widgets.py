@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.templatetags.static import static
+from django.urls import reverse
+
+from .models import Bill, Organization, Person
+from .templatetags.extras import remove_action_subj, short_blurb
+from .utils import person_title
+
+
+# Payloads are refreshed by the refresh_widgets command and dropped whenever
+# the underlying entity is saved. The timeout only bounds how long
+# time-sensitive content, e.g., upcoming events, can go stale.
+WIDGET_CACHE_TIMEOUT = getattr(settings, "WIDGET_CACHE_TIMEOUT", 60 * 60 * 24)
+
+# How long browsers and CDNs may hold on to a widget payload.
+WIDGET_MAX_AGE = getattr(settings, "WIDGET_MAX_AGE", 60 * 60)
+
+
+def _person_link(person):
+    return {"name": person.name, "url": reverse("person", args=(person.slug,))}
+
+
+def bill_payload(bill):
+    description = bill.listing_description
+    description = getattr(description, "abstract", description)
+
+    payload = {
+        "type": "bill",
+        "name": bill.friendly_name,
+        "url": reverse("bill_detail", args=(bill.slug,)),
+        "status": bill.inferred_status,
+        "description": short_blurb(description),
+        "topics": list(bill.topics),
+        "sponsor_count": bill.sponsorships.count(),
+        "primary_sponsor": None,
+        "latest_action": None,
+    }
+
+    primary_sponsor = bill.primary_sponsor
+    if primary_sponsor and primary_sponsor.person:
+        payload["primary_sponsor"] = _person_link(primary_sponsor.person)
+
+    current_action = bill.current_action
+    if current_action:
+        payload["latest_action"] = {
+            "date": current_action.date_dt,
+            "description": remove_action_subj(current_action.description),
+            "organization": current_action.organization.name,
+        }
+
+    return payload
+
+
+def person_payload(person):
+    return {
+        "type": "person",
+        "name": person.name,
+        "url": reverse("person", args=(person.slug,)),
+        "title": person_title(person),
+        "headshot": static(person.headshot.url),
+        "chair_of": [
+            {
+                "name": membership.organization.name,
+                "url": reverse(
+                    "committee_detail", args=(membership.organization.slug,)
+                ),
+            }
+            for membership in person.chair_role_memberships
+        ],
+        "committee_count": len(person.member_role_memberships),
+    }
+
+
+def committee_payload(committee):
+    description = None
+    if getattr(settings, "COMMITTEE_DESCRIPTIONS", None):
+        description = settings.COMMITTEE_DESCRIPTIONS.get(committee.slug)
+
+    return {
+        "type": "committee",
+        "name": committee.name,
+        "url": reverse("committee_detail", args=(committee.slug,)),
+        "description": description,
+        "member_count": committee.memberships.count(),
+        "chairs": [_person_link(membership.person) for membership in committee.chairs],
+        "upcoming_events": [
+            {
+                "name": event.name,
+                "url": event.event_page_url,
+                "start_time": event.start_time,
+            }
+            for event in committee.upcoming_events[:3]
+        ],
+    }
+
+
+WIDGETS = {
+    "bill": (Bill, bill_payload),
+    "person": (Person, person_payload),
+    "committee": (Organization, committee_payload),
+}
+
+
+def widget_cache_key(kind, slug):
+    return "councilmatic_widget:{}:{}".format(kind, slug)
+
+
+def refresh_widget(kind, obj):
+    """
+    Build the payload for obj and store it, so widget requests can be served
+    without touching the database.
+    """
+    _, build_payload = WIDGETS[kind]
+    payload = build_payload(obj)
+
+    cache.set(widget_cache_key(kind, obj.slug), payload, WIDGET_CACHE_TIMEOUT)
+
+    return payload
+
+
+def invalidate_widget(kind, slug):
+    cache.delete(widget_cache_key(kind, slug))
+
+
+def get_widget_payload(kind, slug):
+    """
+    Return the stored payload for the given entity, building it on a cache
+    miss. Return None if the entity does not exist.
+    """
+    payload = cache.get(widget_cache_key(kind, slug))
+
+    if payload is None:
+        model, _ = WIDGETS[kind]
+
+        try:
+            obj = model.objects.get(slug=slug)
+        except model.DoesNotExist:
+            return None
+
+        payload = refresh_widget(kind, obj)
+
+    return payload
@@ -2,12 +2,24 @@ import datetime
 import os
 from uuid import uuid4
 
+from haystack import connections as haystack_connections, indexes
 import pytest
 
-from councilmatic_core.models import Bill, Event
+from councilmatic_core.haystack_indexes import BillIndex, EventIndex, PersonIndex
+from councilmatic_core.models import (
+    Bill,
+    BillAction,
+    BillActionRelatedEntity,
+    BillSponsorship,
+    Event,
+    Organization,
+    Person,
+)
 from opencivicdata.core.models import Jurisdiction, Division
 from opencivicdata.legislative.models import (
+    BillAbstract,
     BillDocumentLink,
+    BillSource,
     EventDocument,
     EventDocumentLink,
     LegislativeSession,
@@ -81,6 +93,18 @@ def metro_bill(db, legislative_session):
     return bill
 
 
+@pytest.fixture
+@pytest.mark.django_db
+def city_council(db, jurisdiction):
+    return Organization.objects.create(
+        id="ocd-organization/ef168607-9135-4177-ad8e-c1f7a4806c3a",
+        name="Chicago City Council",
+        classification="legislature",
+        jurisdiction=jurisdiction,
+        slug="chicago-city-council",
+    )
+
+
 @pytest.fixture
 @pytest.mark.django_db
 def metro_event(db, jurisdiction):
@@ -148,3 +172,80 @@ def metro_event_document(metro_event, db):
     EventDocumentLink.objects.create(**document_link_info)
 
     return document
+
+
+class CityBillIndex(BillIndex, indexes.Indexable):
+    pass
+
+
+class CityPersonIndex(PersonIndex, indexes.Indexable):
+    pass
+
+
+class CityEventIndex(EventIndex, indexes.Indexable):
+    pass
+
+
+@pytest.fixture
+@pytest.mark.django_db
+def indexed_bill(metro_bill, city_council, jurisdiction):
+    metro_bill.classification = ["ordinance"]
+    metro_bill.slug = "2018-0285"
+    metro_bill.extras["plain_text"] = "<p>Ordinance &amp; text</p>"
+    metro_bill.save()
+
+    committee = Organization.objects.create(
+        id="ocd-organization/4a4e56c4-6c1e-4d09-b6d0-3c1e7c1f1e33",
+        name="Committee on Finance",
+        classification="committee",
+        jurisdiction=jurisdiction,
+        slug="committee-on-finance",
+    )
+
+    person = Person.objects.create(name="Jane Doe & Co", slug="jane-doe")
+
+    BillSponsorship.objects.create(
+        bill=metro_bill, person=person, name=person.name, primary=True
+    )
+    BillSponsorship.objects.create(bill=metro_bill, name="Unmatched Sponsor")
+
+    BillAction.objects.create(
+        bill=metro_bill,
+        organization=city_council,
+        description="Introduced",
+        date="2018-01-01",
+        order=1,
+    )
+    referral = BillAction.objects.create(
+        bill=metro_bill,
+        organization=city_council,
+        description="Referred",
+        date="2018-01-02",
+        order=2,
+    )
+    BillActionRelatedEntity.objects.create(
+        action=referral,
+        organization=committee,
+        name=committee.name,
+        entity_type="organization",
+    )
+
+    BillSource.objects.create(bill=metro_bill, url="https://example.com", note="web")
+    BillAbstract.objects.create(bill=metro_bill, abstract="An abstract")
+
+    return metro_bill
+
+
+@pytest.fixture
+def postgres_search(settings):
+    settings.HAYSTACK_CONNECTIONS["postgres"] = {
+        "ENGINE": "councilmatic_core.backends.postgres_backend.PostgresSearchEngine",
+    }
+    haystack_connections["postgres"].get_unified_index().build(
+        indexes=[CityBillIndex()]
+    )
+
+    yield "postgres"
+
+    del haystack_connections.thread_local.connections["postgres"]
+    del settings.HAYSTACK_CONNECTIONS["postgres"]
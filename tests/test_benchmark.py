@@ -0,0 +1,110 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from haystack import connections as haystack_connections
+import pytest
+
+from councilmatic_core.benchmark import (
+    BENCHMARK_CONNECTION,
+    overlap,
+    percentile,
+    read_query_log,
+)
+from councilmatic_core.models import Bill
+
+from .conftest import CityBillIndex
+
+
+@pytest.fixture
+def benchmark_search(settings):
+    settings.HAYSTACK_CONNECTIONS[BENCHMARK_CONNECTION] = {
+        "ENGINE": "councilmatic_core.backends.postgres_backend.PostgresSearchEngine",
+    }
+    haystack_connections[BENCHMARK_CONNECTION].get_unified_index().build(
+        indexes=[CityBillIndex()]
+    )
+
+    yield BENCHMARK_CONNECTION
+
+    del haystack_connections.thread_local.connections[BENCHMARK_CONNECTION]
+    del settings.HAYSTACK_CONNECTIONS[BENCHMARK_CONNECTION]
+
+
+@pytest.mark.django_db
+def test_benchmark_search(benchmark_search, tmp_path):
+    baseline = tmp_path / "baseline.json"
+    out = io.StringIO()
+
+    call_command(
+        "benchmark_search",
+        "--bills",
+        "30",
+        "--query-count",
+        "20",
+        "--output",
+        str(baseline),
+        stdout=out,
+    )
+
+    assert "Indexed 30 synthetic bill(s)" in out.getvalue()
+    assert "p95" in out.getvalue()
+
+    # The synthetic corpus is rolled back.
+    assert not Bill.objects.exists()
+
+    runs = json.loads(baseline.read_text())["runs"]
+    assert len(runs) == 20
+    assert any(run["hits"] for run in runs)
+
+    # The same corpus and searches find the same bills.
+    out = io.StringIO()
+    call_command(
+        "benchmark_search",
+        "--bills",
+        "30",
+        "--query-count",
+        "20",
+        "--baseline",
+        str(baseline),
+        stdout=out,
+    )
+
+    assert "Mean overlap with the baseline: 1.00" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_benchmark_search_arguments(benchmark_search, tmp_path):
+    with pytest.raises(CommandError, match="--repeat"):
+        call_command("benchmark_search", "--repeat", "0")
+
+    empty_log = tmp_path / "queries.txt"
+    empty_log.write_text("\n")
+
+    with pytest.raises(CommandError, match="no searches"):
+        call_command("benchmark_search", "--queries", str(empty_log))
+
+    with pytest.raises(CommandError, match="no searches"):
+        call_command("benchmark_search", "--query-count", "0")
+
+
+@pytest.mark.django_db
+def test_benchmark_search_shared_documents(benchmark_search, postgres_search):
+    with pytest.raises(CommandError, match="postgres"):
+        call_command("benchmark_search", "--bills", "1")
+
+
+def test_benchmark_helpers():
+    assert read_query_log(
+        ["zoning\n", "\n", '{"q": "", "selected_facets": ["bill_type_exact:order"]}']
+    ) == [
+        {"q": "zoning", "selected_facets": []},
+        {"q": "", "selected_facets": ["bill_type_exact:order"]},
+    ]
+
+    assert percentile([4, 1, 3, 2], 50) == 2
+    assert percentile([4, 1, 3, 2], 95) == 4
+
+    assert overlap(["a", "b"], ["b", "c"]) == 0.5
+    assert overlap([], []) == 1.0
@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+
+from django.core.management import call_command
+import pytest
+
+from councilmatic_core.export import export_bills, stream_export
+
+
+@pytest.mark.django_db
+def test_export_bills(metro_bill):
+    (exported_bill,) = list(export_bills(chunk_size=1))
+
+    assert exported_bill["id"] == metro_bill.id
+    assert exported_bill["session"] == metro_bill.legislative_session.identifier
+    assert exported_bill["actions"] == []
+    assert exported_bill["sponsorships"] == []
+    assert exported_bill["abstracts"] == []
+
+
+@pytest.mark.django_db
+def test_export_bills_csv(metro_bill):
+    rows = list(csv.reader(io.StringIO("".join(stream_export("bills", "csv")))))
+    header, row = rows
+
+    assert len(rows) == 2
+    assert row[header.index("identifier")] == metro_bill.identifier
+    assert json.loads(row[header.index("actions")]) == []
+
+
+@pytest.mark.django_db
+def test_export_data_command(metro_bill, metro_event):
+    for dataset, obj in (("bills", metro_bill), ("events", metro_event)):
+        out = io.StringIO()
+        call_command("export_data", dataset, stdout=out)
+
+        (line,) = out.getvalue().splitlines()
+        assert json.loads(line)["id"] == obj.id
+
+
+@pytest.mark.django_db
+def test_export_data_route(client, admin_client, metro_bill, settings):
+    # Only staff may download exports, unless they are public.
+    assert client.get("/export/bills.ndjson").status_code == 403
+
+    rv = admin_client.get("/export/bills.ndjson")
+    assert rv.status_code == 200
+    assert "private" in rv["Cache-Control"]
+
+    settings.EXPORT_DATA_PUBLIC = True
+
+    rv = client.get("/export/bills.ndjson")
+    assert rv.status_code == 200
+    assert rv.streaming
+    assert "public" in rv["Cache-Control"]
+
+    (line,) = b"".join(rv.streaming_content).decode().splitlines()
+    assert json.loads(line)["slug"] == metro_bill.slug
+
+    assert client.get("/export/votes.csv").status_code == 404
@@ -0,0 +1,419 @@
+import collections
+import io
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.utils import timezone
+from haystack import connection_router, connections as haystack_connections
+from opencivicdata.core.models import (
+    Organization as OCDOrganization,
+    Person as OCDPerson,
+)
+from opencivicdata.legislative.models import BillSource
+import pytest
+import requests
+
+from councilmatic_core.haystack_indexes import (
+    BillDocument,
+    BillIndex,
+    render_bill_text,
+)
+from councilmatic_core.indexing import (
+    Checkpoint,
+    chunk_text,
+    flush_bill_index_queue,
+    get_bill_index,
+    pk_ranges,
+    standby_connection,
+    swap_solr_cores,
+    with_document_data,
+)
+from councilmatic_core.management.commands.update_bill_index import (
+    Command as UpdateBillIndexCommand,
+)
+from councilmatic_core.models import (
+    Bill,
+    BillAction,
+    BillActionRelatedEntity,
+    BillIndexQueue,
+    BillSponsorship,
+    Person,
+)
+from councilmatic_core.signals.processors import BillIndexSignalProcessor
+
+from .conftest import CityBillIndex, CityPersonIndex
+
+
+def as_posted(document):
+    # Search backends post the string form of related objects.
+    return {
+        key: [str(v) for v in value] if isinstance(value, list) else value
+        for key, value in document.items()
+    }
+
+
+@pytest.mark.django_db
+def test_documents_from_document_data(indexed_bill, django_assert_num_queries):
+    index = BillIndex()
+    expected = as_posted(index.full_prepare(Bill.objects.get(pk=indexed_bill.pk)))
+
+    qs = index.build_queryset().filter(pk=indexed_bill.pk)
+
+    with django_assert_num_queries(1):
+        (bill,) = qs
+        document = index.full_prepare(bill)
+
+    assert as_posted(document) == expected
+    assert document["controlling_body"] == ["Committee on Finance"]
+
+
+@pytest.mark.django_db
+def test_document_data_is_ordered(indexed_bill, city_council):
+    for i in range(5):
+        BillSource.objects.create(
+            bill=indexed_bill, url="https://example.com/{}".format(i), note="web"
+        )
+        BillSponsorship.objects.create(bill=indexed_bill, name="Sponsor {}".format(i))
+
+    referral = BillAction.objects.get(description="Referred")
+    for i in range(5):
+        BillActionRelatedEntity.objects.create(
+            action=referral,
+            organization=city_council,
+            name=city_council.name,
+            entity_type="organization",
+        )
+
+    (bill,) = with_document_data(Bill.objects.filter(pk=indexed_bill.pk))
+
+    assert [source["url"] for source in bill.document_sources] == list(
+        BillSource.objects.order_by("id").values_list("url", flat=True)
+    )
+    assert bill.document_sponsorships == [
+        sponsorship.person.name if sponsorship.person else None
+        for sponsorship in BillSponsorship.objects.order_by("id")
+    ]
+    assert bill.document_actions[1]["related_organizations"] == [
+        entity.organization.name
+        for entity in BillActionRelatedEntity.objects.order_by("id")
+    ]
+
+
+@pytest.mark.django_db
+def test_pk_ranges(legislative_session):
+    for i in range(5):
+        Bill.objects.create(
+            id="ocd-bill/{}".format(i),
+            identifier="O2011-{}".format(i),
+            title="Bill {}".format(i),
+            slug="o2011-{}".format(i),
+            legislative_session=legislative_session,
+        )
+
+    assert pk_ranges(Bill.objects.all(), 2) == [
+        ["ocd-bill/0", "ocd-bill/2"],
+        ["ocd-bill/2", "ocd-bill/4"],
+        ["ocd-bill/4", None],
+    ]
+
+    assert pk_ranges(Bill.objects.none(), 2) == []
+
+
+def test_chunk_text():
+    assert chunk_text("", 10) == []
+    assert chunk_text("Ordinance text", 10) == ["Ordinance", "text"]
+    assert chunk_text("An ordinance amending the code", 10) == [
+        "An",
+        "ordinance",
+        "amending",
+        "the code",
+    ]
+    assert chunk_text("Supercalifragilistic", 10) == ["Supercalif", "ragilistic"]
+
+
+def test_checkpoint_resume(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+
+    checkpoint = Checkpoint(path)
+    checkpoint.ranges = [["a", "b"], ["b", None]]
+    checkpoint.start_date = timezone.now()
+    checkpoint.sessions = ["2011"]
+    checkpoint.mark_done(0)
+
+    resumed = Checkpoint(path)
+    resumed.load()
+    assert resumed.pending() == [(1, "b", None)]
+    assert resumed.start_date == checkpoint.start_date
+    assert resumed.sessions == ["2011"]
+
+    resumed.delete()
+    assert not resumed.exists()
+
+
+@pytest.mark.django_db
+def test_resume_indexes_the_same_bills(indexed_bill, postgres_search, mocker, tmp_path):
+    command = "councilmatic_core.management.commands.update_bill_index"
+    options = [
+        "--using",
+        postgres_search,
+        "--workers",
+        "1",
+        "--checkpoint",
+        str(tmp_path / "checkpoint.json"),
+    ]
+
+    index_range = mocker.patch(
+        "{}.index_range".format(command), side_effect=KeyboardInterrupt
+    )
+
+    with pytest.raises(KeyboardInterrupt):
+        call_command("update_bill_index", *options, "--age", "1", "--session", "2011")
+
+    start_date = index_range.call_args.kwargs["start_date"]
+    assert index_range.call_args.kwargs["sessions"] == ["2011"]
+
+    index_range.reset_mock(side_effect=True)
+    index_range.return_value = collections.Counter(posted=1, skipped=0)
+
+    call_command("update_bill_index", *options, "--resume", stdout=io.StringIO())
+
+    index_range.assert_called_once()
+    assert index_range.call_args.kwargs["start_date"] == start_date
+    assert index_range.call_args.kwargs["sessions"] == ["2011"]
+
+
+@pytest.mark.django_db
+def test_render_bill_text_matches_template(indexed_bill, settings):
+    text_field = BillIndex.fields["text"]
+    bill = Bill.objects.get(pk=indexed_bill.pk)
+    (annotated_bill,) = BillIndex().build_queryset().filter(pk=indexed_bill.pk)
+
+    template_text = text_field.prepare(bill)
+    assert "Jane Doe &amp; Co" in template_text
+
+    assert render_bill_text(bill) == template_text
+    assert render_bill_text(BillDocument(annotated_bill)) == template_text
+
+    settings.BILL_TEXT_RENDERER = "python"
+    assert text_field.prepare(bill) == template_text
+
+
+@pytest.fixture
+def bill_index_processor():
+    unified_index = haystack_connections["default"].get_unified_index()
+    unified_index.build(indexes=[CityBillIndex()])
+
+    processor = BillIndexSignalProcessor(haystack_connections, connection_router)
+
+    yield processor
+
+    processor.teardown()
+    unified_index.reset()
+
+
+@pytest.mark.django_db
+def test_changes_are_queued_and_flushed(indexed_bill, bill_index_processor, mocker):
+    sponsor = Person.objects.get(slug="jane-doe")
+    sponsor.name = "Jane Q. Doe"
+    sponsor.save()
+
+    indexed_bill.title = "An amended title"
+    indexed_bill.save()
+
+    assert list(BillIndexQueue.objects.values_list("bill_id", flat=True)) == [
+        indexed_bill.id
+    ]
+
+    backend = haystack_connections["default"].get_backend()
+    update = mocker.patch.object(backend, "update")
+
+    assert flush_bill_index_queue(debounce=60)["posted"] == 0
+    update.assert_not_called()
+
+    full_prepare = mocker.spy(get_bill_index(), "full_prepare")
+
+    assert flush_bill_index_queue(debounce=0)["posted"] == 1
+    ((index, (bill,)), _) = update.call_args
+    assert bill.title == "An amended title"
+
+    # The backend is handed the document that was hashed.
+    assert index.full_prepare(bill) is full_prepare.spy_return
+    assert full_prepare.call_count == 1
+    assert not BillIndexQueue.objects.exists()
+
+    # Saving the bill again without changes queues it, but the unchanged
+    # document is not posted.
+    indexed_bill.refresh_from_db()
+    indexed_bill.save()
+    update.reset_mock()
+
+    assert flush_bill_index_queue(debounce=0) == {
+        "posted": 0,
+        "skipped": 1,
+        "removed": 0,
+    }
+    update.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_only_renames_are_queued(indexed_bill, city_council, bill_index_processor):
+    # Routine saves of sponsors and organizations don't queue their bills.
+    Person.objects.get(slug="jane-doe").save()
+    OCDOrganization.objects.get(pk=city_council.pk).save()
+    assert not BillIndexQueue.objects.exists()
+
+    organization = OCDOrganization.objects.get(pk=city_council.pk)
+    organization.name = "Renamed City Council"
+    organization.save()
+
+    assert list(BillIndexQueue.objects.values_list("bill_id", flat=True)) == [
+        indexed_bill.id
+    ]
+
+
+@pytest.mark.django_db
+def test_other_indexes_are_updated(bill_index_processor, mocker):
+    unified_index = haystack_connections["default"].get_unified_index()
+    unified_index.build(indexes=[CityBillIndex(), CityPersonIndex()])
+    update_object = mocker.patch.object(CityPersonIndex, "update_object")
+
+    person = Person.objects.create(name="Jane Doe", slug="jane-doe")
+    update_object.reset_mock()
+
+    # pupa saves the OCD person.
+    OCDPerson.objects.get(pk=person.pk).save()
+
+    ((updated,), _) = update_object.call_args
+    assert isinstance(updated, Person)
+    assert updated.slug == "jane-doe"
+
+
+@pytest.fixture
+def solr_search(settings):
+    # Requests to Solr are mocked.
+    settings.HAYSTACK_CONNECTIONS["solr"] = {
+        "ENGINE": "councilmatic_core.backends.solr_backend.SolrEngine",
+        "URL": "http://localhost:8983/solr/councilmatic",
+        "REBUILD_URL": "http://localhost:8983/solr/councilmatic_standby",
+    }
+    standby = standby_connection("solr")
+
+    for alias in ("solr", standby):
+        haystack_connections[alias].get_unified_index().build(indexes=[CityBillIndex()])
+
+    yield "solr"
+
+    for alias in ("solr", standby):
+        del haystack_connections.thread_local.connections[alias]
+        del settings.HAYSTACK_CONNECTIONS[alias]
+
+
+def test_standby_connection(solr_search, settings):
+    assert standby_connection(solr_search) == "solr_standby"
+    assert settings.HAYSTACK_CONNECTIONS["solr_standby"] == {
+        "ENGINE": "councilmatic_core.backends.solr_backend.SolrEngine",
+        "URL": "http://localhost:8983/solr/councilmatic_standby",
+        "REBUILD_URL": "http://localhost:8983/solr/councilmatic_standby",
+        "RESET_DOCUMENT_HASHES": False,
+    }
+
+    with pytest.raises(ImproperlyConfigured):
+        standby_connection()
+
+
+@pytest.mark.django_db
+def test_clearing_solr_resets_hashes(indexed_bill, solr_search, mocker):
+    for alias in (solr_search, "solr_standby"):
+        mocker.patch.object(haystack_connections[alias].get_backend(), "conn")
+
+    Bill.objects.update(search_document_hash="live")
+
+    # Clearing the standby core leaves the live core's hashes be.
+    haystack_connections["solr_standby"].get_backend().clear()
+    assert Bill.objects.get().search_document_hash == "live"
+
+    haystack_connections[solr_search].get_backend().clear()
+    assert Bill.objects.get().search_document_hash is None
+
+
+def test_swap_solr_cores(mocker):
+    get = mocker.patch("councilmatic_core.indexing.requests.get")
+
+    swap_solr_cores(
+        "http://localhost:8983/solr/councilmatic/",
+        "http://localhost:8983/solr/councilmatic_standby",
+    )
+
+    get.assert_called_once_with(
+        "http://localhost:8983/solr/admin/cores",
+        params={
+            "action": "SWAP",
+            "core": "councilmatic",
+            "other": "councilmatic_standby",
+        },
+        timeout=60,
+    )
+
+    get.return_value.raise_for_status.side_effect = requests.HTTPError
+
+    with pytest.raises(requests.HTTPError):
+        swap_solr_cores(
+            "http://localhost:8983/solr/councilmatic",
+            "http://localhost:8983/solr/councilmatic_standby",
+        )
+
+
+@pytest.mark.django_db
+def test_swap_rebuild_into_standby_core(indexed_bill, solr_search, mocker, tmp_path):
+    Bill.objects.filter(pk=indexed_bill.pk).update(search_document_hash="live")
+
+    command = "councilmatic_core.management.commands.update_bill_index"
+    standby_backend = haystack_connections["solr_standby"].get_backend()
+    mocker.patch.object(standby_backend, "conn")
+    update = mocker.patch.object(standby_backend, "update")
+    mocker.patch("{}.Command.validate".format(command))
+    mocker.patch("{}.index_updated".format(command))
+
+    def swap(url, other_url):
+        # Hashes describe the live core until the standby one is swapped in.
+        assert Bill.objects.get(pk=indexed_bill.pk).search_document_hash == "live"
+
+    swap_solr_cores = mocker.patch(
+        "{}.swap_solr_cores".format(command), side_effect=swap
+    )
+
+    rebuild = UpdateBillIndexCommand.rebuild
+
+    def rebuild_then_update(self, *args, **kwargs):
+        counts = rebuild(self, *args, **kwargs)
+        Bill.objects.filter(pk=indexed_bill.pk).update(
+            title="Amended during the rebuild", updated_at=timezone.now()
+        )
+        return counts
+
+    mocker.patch.object(UpdateBillIndexCommand, "rebuild", rebuild_then_update)
+
+    call_command(
+        "update_bill_index",
+        "--using",
+        solr_search,
+        "--swap",
+        "--workers",
+        "1",
+        "--checkpoint",
+        str(tmp_path / "checkpoint.json"),
+        stdout=io.StringIO(),
+    )
+
+    swap_solr_cores.assert_called_once_with(
+        "http://localhost:8983/solr/councilmatic",
+        "http://localhost:8983/solr/councilmatic_standby",
+    )
+
+    # The bill updated during the rebuild is posted again before the swap.
+    assert update.call_count == 2
+    ((index, (bill,)), _) = update.call_args
+    assert bill.title == "Amended during the rebuild"
+
+    # The swapped in core's documents weren't hashed.
+    assert Bill.objects.get(pk=indexed_bill.pk).search_document_hash is None
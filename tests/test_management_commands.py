@@ -1,3 +1,4 @@
+import io
 import os
 
 from django.core.management import call_command
@@ -7,6 +8,10 @@ from councilmatic_core.management.commands.refresh_pic import Command as Refresh
 from councilmatic_core.management.commands.convert_attachment_text import (
     Command as ConvertAttachmentText,
 )
+from councilmatic_core.management.commands.warm_cache import (
+    Command as WarmCache,
+    default_host,
+)
 
 
 @pytest.mark.django_db
@@ -74,3 +79,43 @@ def test_convert_rtf(metro_bill):
         expected_html = f.read()
 
     assert metro_bill.extras["html_text"] == expected_html
+
+
+@pytest.mark.django_db
+def test_warm_cache_paths(metro_bill):
+    metro_bill.slug = "2018-0285"
+    metro_bill.save()
+
+    paths = WarmCache().get_paths(None)
+
+    # List pages come before detail pages, and exports aren't rendered.
+    assert paths.index("/") < paths.index("/legislation/2018-0285/")
+    assert not any(path.startswith("/export/") for path in paths)
+
+
+def test_warm_cache_default_host(settings):
+    settings.ALLOWED_HOSTS = ["*"]
+    assert default_host() == "localhost"
+
+    settings.ALLOWED_HOSTS = ["*", ".example.com"]
+    assert default_host() == "example.com"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_warm_cache(metro_bill, mocker, settings):
+    settings.ALLOWED_HOSTS = ["*"]
+    metro_bill.slug = "2018-0285"
+    metro_bill.save()
+
+    mocker.patch.object(
+        WarmCache,
+        "get_paths",
+        return_value=["/legislation/2018-0285/", "/legislation/not-a-bill/"],
+    )
+
+    out, err = io.StringIO(), io.StringIO()
+    call_command("warm_cache", "--workers", "2", stdout=out, stderr=err)
+
+    assert "Warmed 2 page(s)" in out.getvalue()
+    assert "/legislation/2018-0285/" in out.getvalue()
+    assert err.getvalue().startswith("404 ")
@@ -0,0 +1,49 @@
+import datetime
+
+from django.utils import timezone
+from haystack import connections as haystack_connections
+import pytest
+
+from councilmatic_core.percolator import SavedSearch, match_saved_searches
+
+from .conftest import CityBillIndex
+
+
+@pytest.fixture
+def bill_index():
+    unified_index = haystack_connections["default"].get_unified_index()
+    unified_index.build(indexes=[CityBillIndex()])
+
+    yield
+
+    unified_index.reset()
+
+
+@pytest.mark.django_db
+def test_match_saved_searches(indexed_bill, bill_index):
+    searches = [
+        SavedSearch("everything"),
+        SavedSearch("word", term="Referred"),
+        SavedSearch("phrase", term='"Jane Doe"'),
+        SavedSearch("out of order", term='"Doe Jane"'),
+        SavedSearch("excluded", term="referred -jane"),
+        SavedSearch("facet", facets={"bill_type": ["ordinance"]}),
+        SavedSearch(
+            "facets",
+            term="Introduced",
+            facets={"sponsorships": ["Jane Doe & Co"], "bill_type": ["resolution"]},
+        ),
+        SavedSearch("missing", term="zoning"),
+    ]
+
+    matches = match_saved_searches(searches)
+    assert matches == {
+        "everything": [indexed_bill.pk],
+        "word": [indexed_bill.pk],
+        "phrase": [indexed_bill.pk],
+        "facet": [indexed_bill.pk],
+    }
+
+    # Only bills updated since the last run are matched.
+    since = timezone.now() + datetime.timedelta(hours=1)
+    assert match_saved_searches(searches, since=since) == {}
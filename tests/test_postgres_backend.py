@@ -0,0 +1,569 @@
+import collections
+import io
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import Http404
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from haystack import connections as haystack_connections
+from haystack.query import SearchQuerySet
+import pytest
+import requests
+
+from councilmatic_core.indexing import post_changed_documents
+from councilmatic_core.models import Bill, BillSponsorship, Person, SearchDocument
+from councilmatic_core.search import (
+    CachedSearchResults,
+    after_cursor,
+    facet_prefix_options,
+    facets_are_cacheable,
+    get_facet_counts,
+    get_facet_values,
+    get_next_cursor,
+    get_search_connection,
+    get_suggestions,
+    index_updated,
+    limit_facets,
+    only_bills,
+    search_site,
+    warm_facet_counts,
+    with_highlighting,
+)
+from councilmatic_core.templatetags.extras import highlighted_fragments
+from councilmatic_core.views import (
+    CouncilmaticFacetedSearchView,
+    CouncilmaticSearchForm,
+)
+
+from .conftest import CityBillIndex, CityEventIndex, CityPersonIndex
+
+
+@pytest.mark.django_db
+def test_postgres_backend_search(indexed_bill, postgres_search):
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    backend = haystack_connections[postgres_search].get_backend()
+    backend.update(index, index.build_queryset().all())
+
+    assert SearchDocument.objects.count() == 1
+
+    sqs = SearchQuerySet(using=postgres_search)
+
+    results = sqs.auto_query("utility relocations")
+    assert results.count() == 1
+    (result,) = results
+    assert result.pk == indexed_bill.pk
+    assert result.identifier == "2018-0285"
+    assert result.score > 0
+
+    assert sqs.auto_query("zoning").count() == 0
+
+    narrowed = sqs.auto_query("relocations").narrow('bill_type_exact:"ordinance"')
+    assert narrowed.count() == 1
+    assert sqs.narrow('bill_type_exact:"resolution"').count() == 0
+
+    facets = sqs.facet("sponsorships").facet("bill_type").facet_counts()
+    assert facets["fields"]["bill_type"] == [("ordinance", 1)]
+    assert ("Jane Doe & Co", 1) in facets["fields"]["sponsorships"]
+
+    (highlighted,) = sqs.auto_query("introduced").highlight(fl="text_excerpt")
+    assert "<em>Introduced</em>" in highlighted.highlighted["text_excerpt"][0]
+
+    # Fields that aren't stored, like the bill text, are only searched.
+    (document,) = SearchDocument.objects.all()
+    assert "text" not in document.data
+    assert "ocr_full_text" not in document.data
+    assert document.data["text_excerpt"].startswith("2018-0285")
+
+    # Updating the bill replaces its document.
+    backend.update(index, index.build_queryset().all())
+    assert SearchDocument.objects.count() == 1
+
+    backend.remove(indexed_bill)
+    assert sqs.count() == 0
+
+
+@pytest.mark.django_db
+def test_clear_resets_document_hashes(indexed_bill, postgres_search):
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    backend = haystack_connections[postgres_search].get_backend()
+
+    assert post_changed_documents(index, backend, [indexed_bill])["posted"] == 1
+    backend.clear()
+
+    indexed_bill.refresh_from_db()
+    assert indexed_bill.search_document_hash is None
+    assert post_changed_documents(index, backend, [indexed_bill])["posted"] == 1
+    assert SearchDocument.objects.count() == 1
+
+
+def test_search_connection_fallback(settings, mocker):
+    settings.HAYSTACK_CONNECTIONS["default"]["URL"] = "http://localhost:8983/solr"
+    mocker.patch(
+        "councilmatic_core.search.requests.get", side_effect=requests.ConnectionError
+    )
+
+    try:
+        with pytest.raises(Exception, match="Is Solr running?"):
+            get_search_connection()
+
+        mocker.patch("councilmatic_core.search.SEARCH_FALLBACK_CONNECTION", "postgres")
+        assert get_search_connection() == "postgres"
+    finally:
+        del settings.HAYSTACK_CONNECTIONS["default"]["URL"]
+
+
+@pytest.mark.django_db
+def test_cached_facet_counts(
+    indexed_bill, postgres_search, settings, django_assert_num_queries
+):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    haystack_connections[postgres_search].get_backend().update(
+        index, index.build_queryset().all()
+    )
+
+    # The page without a query, and with each of ordinance and Jane Doe & Co
+    # selected.
+    assert warm_facet_counts(postgres_search, ["bill_type", "sponsorships"]) == 3
+
+    sqs = limit_facets(
+        SearchQuerySet(using=postgres_search).facet("bill_type").facet("sponsorships")
+    )
+
+    with django_assert_num_queries(0):
+        assert get_facet_counts(sqs)["fields"]["bill_type"] == [("ordinance", 1)]
+        get_facet_counts(sqs.narrow('sponsorships_exact:"Jane Doe & Co"'))
+
+    # Searches with a query, or several selected facets, are not cached.
+    assert not facets_are_cacheable(sqs.auto_query("relocations"))
+    assert not facets_are_cacheable(
+        sqs.narrow('bill_type_exact:"ordinance"').narrow(
+            'sponsorships_exact:"Jane Doe & Co"'
+        )
+    )
+
+    # Updating the index caches counts for SEARCH_FACET_FIELDS, whatever the
+    # sort order.
+    index_updated(postgres_search)
+
+    with django_assert_num_queries(0):
+        get_facet_counts(
+            limit_facets(
+                sqs.facet("controlling_body")
+                .facet("inferred_status")
+                .order_by("-score")
+            )
+        )
+
+    # Facets with options of their own are counted like the warmed ones.
+    city_sqs = (
+        SearchQuerySet(using=postgres_search)
+        .facet("bill_type", mincount=1)
+        .facet("sponsorships", sort="index", limit=50)
+        .facet("controlling_body")
+        .facet("inferred_status")
+    )
+
+    with django_assert_num_queries(0):
+        get_facet_counts(limit_facets(city_sqs))
+
+
+@pytest.mark.django_db
+def test_results_render_from_stored_fields(
+    indexed_bill, postgres_search, django_assert_num_queries
+):
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    haystack_connections[postgres_search].get_backend().update(
+        index, index.build_queryset().all()
+    )
+
+    (result,) = SearchQuerySet(using=postgres_search).all()
+
+    with django_assert_num_queries(0):
+        html = render_to_string("partials/search_result.html", {"r": result})
+        html += render_to_string("partials/tags.html", {"result": result})
+
+    assert "/legislation/{}/".format(indexed_bill.slug) in html
+    assert "An abstract" in html
+    assert "Jane Doe &amp; Co" in html
+    assert "controlling_body_exact%3ACommittee on Finance" in html
+
+
+@pytest.mark.django_db
+def test_cached_search_results(
+    indexed_bill, postgres_search, settings, django_assert_num_queries, mocker
+):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    haystack_connections[postgres_search].get_backend().update(
+        index, index.build_queryset().all()
+    )
+
+    sqs = SearchQuerySet(using=postgres_search).facet("bill_type")
+
+    results = CachedSearchResults(
+        sqs.auto_query("relocations")
+        .narrow('bill_type_exact:"ordinance"')
+        .narrow('sponsorships_exact:"Jane Doe & Co"')
+    )
+    (result,) = results[0:20]
+    assert result.pk == indexed_bill.pk
+
+    # The same search, with facets selected in another order.
+    results = CachedSearchResults(
+        sqs.auto_query("relocations")
+        .narrow('sponsorships_exact:"Jane Doe & Co"')
+        .narrow('bill_type_exact:"ordinance"')
+    )
+
+    with django_assert_num_queries(0):
+        assert [r.pk for r in results[0:20]] == [indexed_bill.pk]
+        assert len(results) == 1
+        assert results.facet_counts()["fields"]["bill_type"] == [("ordinance", 1)]
+
+    # Each page is fetched from the cache once per instance.
+    results = CachedSearchResults(sqs.auto_query("relocations"))
+    results[0:20]
+    cache_get = mocker.spy(cache, "get")
+
+    for _ in range(3):
+        assert [r.pk for r in results[0:20]] == [indexed_bill.pk]
+        assert results.count() == 1
+
+    cache_get.assert_not_called()
+
+    # Updating the index expires cached pages.
+    cache_key = results.cache_key(0, 20)
+    index_updated(postgres_search)
+    assert results.cache_key(0, 20) != cache_key
+
+
+@pytest.mark.django_db
+def test_highlighted_fragments(indexed_bill, postgres_search, settings):
+    indexed_bill.extras["plain_text"] = " ".join(
+        ["Section {}. Nothing to see here.".format(i) for i in range(50)]
+        + ["Section 50. The utility relocations are approved."]
+    )
+    indexed_bill.save()
+
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    haystack_connections[postgres_search].get_backend().update(
+        index, index.build_queryset().all()
+    )
+
+    sqs = SearchQuerySet(using=postgres_search).auto_query("utility relocations")
+    (result,) = with_highlighting(sqs, "utility relocations")
+
+    # Bill texts are not stored, and the document field is left out.
+    assert result.ocr_full_text is None
+    assert result.text is None
+    assert result.identifier == "2018-0285"
+
+    fragments = highlighted_fragments(result)
+    assert any(
+        "The <em>utility</em> <em>relocations</em> are approved" in fragment
+        for fragment in fragments
+    )
+    assert not any("Section 10." in fragment for fragment in fragments)
+
+
+@pytest.mark.django_db
+def test_search_index_size(indexed_bill, postgres_search):
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    haystack_connections[postgres_search].get_backend().update(
+        index, index.build_queryset().all()
+    )
+
+    stdout = io.StringIO()
+    call_command("search_index_size", using=postgres_search, stdout=stdout)
+    output = stdout.getvalue()
+
+    assert output.startswith("Measured 1 bill document(s)")
+    rows = {line.split()[0]: line.split()[1:] for line in output.splitlines()[2:]}
+    assert rows["text_excerpt"][:2] == ["yes", "yes"]
+    assert int(rows["text_excerpt"][2]) > 0
+    assert "ocr_full_text" not in rows
+
+    stdout = io.StringIO()
+    call_command(
+        "search_index_size", using=postgres_search, estimate=True, stdout=stdout
+    )
+    output = stdout.getvalue()
+
+    assert output.startswith("Estimated from 1 of 1 bill(s)")
+    assert "ocr_full_text" in output
+
+
+@pytest.mark.django_db
+def test_suggestions(indexed_bill, postgres_search):
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    haystack_connections[postgres_search].get_backend().update(
+        index, index.build_queryset().all()
+    )
+
+    for prefix in ("2018-02", "Jane  D", "committee fin"):
+        (suggestion,) = get_suggestions(prefix, using=postgres_search)
+        assert suggestion["name"] == "2018-0285"
+        assert suggestion["url"] == "/legislation/2018-0285/"
+
+    assert get_suggestions("doe jane", using=postgres_search)
+    assert get_suggestions("ane", using=postgres_search) == []
+    assert get_suggestions("j", using=postgres_search) == []
+
+
+@pytest.mark.django_db
+def test_cursor_paging(legislative_session, postgres_search):
+    for i, last_action_date in enumerate(
+        ["2018-01-01", "2018-01-02", "2018-01-02", "2018-01-02", None, "2018-01-03"]
+    ):
+        Bill.objects.create(
+            id="ocd-bill/{}".format(i),
+            identifier="O2018-{}".format(i),
+            title="Bill {}".format(i),
+            slug="o2018-{}".format(i),
+            legislative_session=legislative_session,
+            classification=["ordinance"],
+            last_action_date=last_action_date,
+        )
+
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    haystack_connections[postgres_search].get_backend().update(
+        index, index.build_queryset().all()
+    )
+
+    sqs = SearchQuerySet(using=postgres_search).order_by("-last_action_date")
+
+    pages = []
+    page = list(sqs[:2])
+    while page:
+        pages.append([result.id for result in page])
+        cursor = get_next_cursor(sqs, page)
+        page = list(after_cursor(sqs, cursor)[:2]) if cursor else []
+
+    # Bills with the same date are paged by id, and bills without a date,
+    # which sort last, can't be paged past.
+    assert pages == [
+        ["ocd-bill/5", "ocd-bill/1"],
+        ["ocd-bill/2", "ocd-bill/3"],
+        ["ocd-bill/0", "ocd-bill/4"],
+    ]
+
+    # Results sorted by relevance have no cursor.
+    assert get_next_cursor(sqs.order_by("-score"), page) is None
+
+    with pytest.raises(ValueError):
+        after_cursor(sqs, "not a cursor")
+
+
+def search_page(view, params):
+    view.request = RequestFactory().get("/search/", params)
+    view.form = view.build_form()
+    view.query = view.get_query()
+    view.results = view.get_results()
+    paginator, page = view.build_page()
+
+    return [result.id for result in page.object_list], view.next_cursor
+
+
+@pytest.mark.django_db
+def test_deep_paging_without_query(legislative_session, postgres_search, mocker):
+    for i in range(7):
+        Bill.objects.create(
+            id="ocd-bill/{}".format(i),
+            identifier="O2018-{}".format(i),
+            title="Bill {}".format(i),
+            slug="o2018-{}".format(i),
+            legislative_session=legislative_session,
+            classification=["ordinance"],
+        )
+
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    haystack_connections[postgres_search].get_backend().update(
+        index, index.build_queryset().all()
+    )
+
+    mocker.patch("councilmatic_core.views.SEARCH_MAX_PAGE", 2)
+    view = CouncilmaticFacetedSearchView(
+        form_class=CouncilmaticSearchForm,
+        searchqueryset=SearchQuerySet(using=postgres_search),
+        results_per_page=2,
+    )
+
+    ids, cursor = search_page(view, {"page": 1})
+    assert cursor is None
+
+    ids, cursor = search_page(view, {"page": 2})
+    pages = [ids]
+
+    # Past SEARCH_MAX_PAGE, pages are reached by cursor.
+    with pytest.raises(Http404):
+        search_page(view, {"page": 3})
+
+    while cursor:
+        ids, cursor = search_page(view, {"cursor": cursor})
+        pages.append(ids)
+
+    assert pages == [
+        ["ocd-bill/2", "ocd-bill/3"],
+        ["ocd-bill/4", "ocd-bill/5"],
+        ["ocd-bill/6"],
+    ]
+
+
+@pytest.mark.django_db
+def test_facet_values(indexed_bill, postgres_search):
+    person = Person.objects.create(name="Unmatched Sponsor", slug="unmatched-sponsor")
+    BillSponsorship.objects.create(bill=indexed_bill, person=person, name=person.name)
+
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    haystack_connections[postgres_search].get_backend().update(
+        index, index.build_queryset().all()
+    )
+
+    sqs = SearchQuerySet(using=postgres_search).facet("sponsorships", sort="index")
+    facets = limit_facets(sqs, limit=1).facet_counts()
+    assert facets["fields"]["sponsorships"] == [("Jane Doe & Co", 1)]
+
+    def facet_values(**kwargs):
+        return get_facet_values(
+            "sponsorships", using=postgres_search, page_size=1, **kwargs
+        )
+
+    assert facet_values(sort="index") == ([("Jane Doe & Co", 1)], True)
+    assert facet_values(sort="index", page=2) == ([("Unmatched Sponsor", 1)], False)
+    assert facet_values(prefix="Unm") == ([("Unmatched Sponsor", 1)], False)
+    assert facet_values(prefix="unm") == ([("Unmatched Sponsor", 1)], False)
+    assert facet_values(prefix="matched") == ([], False)
+
+    assert facet_values(q="relocations", selected_facets=["bill_type_exact:ordinance"])[
+        0
+    ]
+    assert facet_values(q="zoning") == ([], False)
+
+
+def test_facet_prefix_options(postgres_search):
+    assert facet_prefix_options("Unm", postgres_search) == {"prefix": "Unm"}
+
+    # Other backends, like Solr, can't match prefixes ignoring case.
+    assert facet_prefix_options("unm", "default") == {
+        "contains": "unm",
+        "contains.ignoreCase": "true",
+    }
+
+
+@pytest.mark.django_db
+def test_search_site(indexed_bill, metro_event, postgres_search, mocker):
+    metro_event.slug = "system-safety-committee"
+    metro_event.save()
+
+    unified_index = haystack_connections[postgres_search].get_unified_index()
+    unified_index.build(indexes=[CityBillIndex(), CityEventIndex(), CityPersonIndex()])
+
+    backend = haystack_connections[postgres_search].get_backend()
+    for index in unified_index.get_indexes().values():
+        backend.update(index, index.build_queryset().all())
+
+    assert search_site("Jane Doe", using=postgres_search) == [
+        {"type": "person", "name": "Jane Doe & Co", "url": "/person/jane-doe/"},
+        {"type": "bill", "name": "2018-0285", "url": "/legislation/2018-0285/"},
+    ]
+
+    assert search_site("safety security", using=postgres_search)[0] == {
+        "type": "event",
+        "name": "System Safety, Security and Operations Committee",
+        "url": "/event/system-safety-committee/",
+    }
+
+    # Results of other indexes, which have no view, are left out.
+    mocker.patch(
+        "councilmatic_core.search.result_type",
+        side_effect=lambda result, using: "bill" if result.model is Bill else None,
+    )
+
+    assert search_site("Jane Doe", using=postgres_search) == [
+        {"type": "bill", "name": "2018-0285", "url": "/legislation/2018-0285/"},
+    ]
+
+    # Searches for bills leave out events and people.
+    sqs = only_bills(SearchQuerySet(using=postgres_search))
+    assert [r.pk for r in sqs.auto_query("Jane Doe")] == [indexed_bill.pk]
+
+
+@pytest.mark.django_db
+def test_swap_rebuild(indexed_bill, postgres_search, tmp_path):
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    backend = haystack_connections[postgres_search].get_backend()
+    backend.update(index, index.build_queryset().all())
+
+    # A bill deleted since it was indexed.
+    stale = SearchDocument.objects.get()
+    stale.id = "councilmatic_core.bill.ocd-bill/deleted"
+    stale.django_id = "ocd-bill/deleted"
+    stale.save()
+
+    call_command(
+        "update_bill_index",
+        "--using",
+        postgres_search,
+        "--swap",
+        "--checkpoint",
+        str(tmp_path / "checkpoint.json"),
+        stdout=io.StringIO(),
+    )
+
+    assert SearchQuerySet(using=postgres_search).models(Bill).count() == 1
+    assert SearchDocument.objects.get().django_id == indexed_bill.pk
+
+    # Documents are replaced in place, so their hashes are recorded.
+    indexed_bill.refresh_from_db()
+    assert indexed_bill.search_document_hash
+
+    with pytest.raises(CommandError):
+        call_command(
+            "update_bill_index", "--using", postgres_search, "--swap", "--age", "1"
+        )
+
+
+@pytest.mark.django_db
+def test_swap_rebuild_in_place_fails(indexed_bill, postgres_search, tmp_path, mocker):
+    index = haystack_connections[postgres_search].get_unified_index().get_index(Bill)
+    backend = haystack_connections[postgres_search].get_backend()
+    backend.update(index, index.build_queryset().all())
+
+    stale = SearchDocument.objects.get()
+    stale.id = "councilmatic_core.bill.ocd-bill/deleted"
+    stale.django_id = "ocd-bill/deleted"
+    stale.save()
+    SearchDocument.objects.filter(django_id=indexed_bill.pk).delete()
+
+    # A rebuild that posts nothing.
+    mocker.patch(
+        "councilmatic_core.management.commands.update_bill_index.Command.rebuild",
+        return_value=collections.Counter(posted=0, skipped=0),
+    )
+    mocker.patch(
+        "councilmatic_core.management.commands.update_bill_index.Command.catch_up",
+        return_value=collections.Counter(posted=0, skipped=0),
+    )
+
+    with pytest.raises(CommandError, match="Only 0 of 1 bill"):
+        call_command(
+            "update_bill_index",
+            "--using",
+            postgres_search,
+            "--swap",
+            "--checkpoint",
+            str(tmp_path / "checkpoint.json"),
+            stdout=io.StringIO(),
+        )
+
+    # Stale documents are only removed once every bill is reindexed.
+    assert SearchDocument.objects.get().django_id == "ocd-bill/deleted"
@@ -72,3 +72,20 @@ def test_event_routes(route_setup, client):
     for event in Event.objects.all():
         event_url = "/event/{}/".format(event.slug)
         assert client.get(event_url).status_code == 200
+
+
+@pytest.mark.django_db
+def test_widget_payload_routes(client, metro_bill):
+    metro_bill.slug = "2018-0285"
+    metro_bill.save()
+
+    rv = client.get("/legislation/{}/widget.json".format(metro_bill.slug))
+    assert rv.status_code == 200
+    assert "public" in rv["Cache-Control"]
+
+    payload = rv.json()
+    assert payload["type"] == "bill"
+    assert payload["name"] == metro_bill.friendly_name
+    assert payload["latest_action"] is None
+
+    assert client.get("/person/nobody/widget.json").status_code == 404
@@ -0,0 +1,75 @@
+from xml.etree import ElementTree
+
+import pytest
+
+from councilmatic_core.search_schema import (
+    build_schema_fields,
+    core_field_info,
+    diff_schema,
+    render_schema,
+)
+
+
+@pytest.mark.django_db
+def test_build_schema_fields(postgres_search):
+    fields = {field["name"]: field for field in build_schema_fields(postgres_search)}
+
+    # Facets and sorts are strings with docValues.
+    for name in ("bill_type", "bill_type_exact", "sort_name"):
+        assert fields[name]["type"] == "string"
+        assert fields[name]["docValues"]
+
+    assert fields["sponsorships_exact"]["type"] == "strings"
+    assert fields["last_action_date"]["type"] == "pdate"
+
+    # Only the document field and boosted fields keep norms.
+    assert fields["text"]["type"] == "text_en"
+    assert not fields["text"]["omitNorms"]
+    assert not fields["description"]["omitNorms"]
+    assert fields["identifier"]["omitNorms"]
+
+    # Text that isn't searched isn't analyzed.
+    assert fields["listing_description"]["type"] == "string"
+
+    # Bill texts are searched, and only an excerpt of them is stored.
+    assert not fields["text"]["stored"]
+    assert not fields["ocr_full_text"]["stored"]
+    assert fields["text_excerpt"]["stored"]
+    assert fields["text_excerpt"]["type"] == "text_en"
+
+    schema = ElementTree.fromstring(render_schema(postgres_search))
+    rendered = {field.get("name"): field for field in schema.iter("field")}
+    assert rendered["bill_type_exact"].get("docValues") == "true"
+    assert rendered["id"].get("required") == "true"
+
+    core_fields = [dict(field) for name, field in fields.items() if name != "id"]
+    core_fields.append({"name": "_version_", "type": "plong"})
+    core_fields.append({"name": "old_field", "type": "text_en"})
+    for field in core_fields:
+        if field["name"] == "sort_name":
+            field.update(type="text_en", docValues=False)
+
+    assert diff_schema(fields.values(), core_fields) == [
+        "- id",
+        "+ old_field",
+        "~ sort_name: type is text_en, expected string",
+        "~ sort_name: docValues is False, expected True",
+    ]
+
+
+def test_core_field_info(mocker):
+    get = mocker.patch("councilmatic_core.search_schema.requests.get")
+    get.return_value.json.return_value = {
+        "index": {"numDocs": 2},
+        "fields": {"text_excerpt": {"docs": 2, "distinct": 40}},
+    }
+
+    assert core_field_info(
+        "http://localhost:8983/solr/councilmatic/", ["identifier", "text_excerpt"]
+    ) == (2, {"text_excerpt": {"docs": 2, "distinct": 40}})
+
+    get.assert_called_once_with(
+        "http://localhost:8983/solr/councilmatic/admin/luke",
+        params={"fl": "identifier,text_excerpt", "numTerms": 0, "wt": "json"},
+        timeout=300,
+    )
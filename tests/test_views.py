@@ -0,0 +1,168 @@
+import datetime
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.utils import timezone
+import pytest
+
+from councilmatic_core.models import Bill, BillAction
+from councilmatic_core.search import SEARCH_IDENTIFIER_RE
+from councilmatic_core.subscriptions import get_subscriptions
+from councilmatic_core.utils import (
+    bump_cache_version,
+    get_cache_version,
+    normalize_identifier,
+)
+from councilmatic_core.views import CouncilmaticFacetedSearchView, IndexView
+
+
+@pytest.mark.django_db
+def test_find_recently_passed(metro_bill, city_council):
+    today = timezone.localdate()
+
+    BillAction.objects.create(
+        bill=metro_bill,
+        organization=city_council,
+        description="Introduced",
+        date=(today - datetime.timedelta(days=60)).isoformat(),
+        classification=["introduction"],
+        order=1,
+    )
+
+    view = IndexView()
+    assert view.find_recently_passed(Bill) == []
+
+    BillAction.objects.create(
+        bill=metro_bill,
+        organization=city_council,
+        description="Passed",
+        date=today.isoformat(),
+        classification=["passage"],
+        order=2,
+    )
+
+    (recently_passed,) = view.find_recently_passed(Bill)
+    assert recently_passed == metro_bill
+    assert recently_passed.recently_passed_on == today.isoformat()
+
+    view.recently_passed_days = None
+    assert view.find_recently_passed(Bill) == []
+
+
+@pytest.mark.django_db
+def test_group_by_bill_type(metro_bill):
+    metro_bill.classification = ["ordinance", "resolution"]
+    unclassified = Bill(classification=[], extras={})
+    local = Bill(classification=["bill"], extras={"local_classification": "order"})
+
+    assert IndexView().group_by_bill_type([metro_bill, unclassified, local]) == {
+        "ordinance": [metro_bill],
+        "": [unclassified],
+        "order": [local],
+    }
+
+
+@pytest.mark.django_db
+def test_recently_passed_cache_is_invalidated(
+    metro_bill, city_council, settings, django_capture_on_commit_callbacks
+):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+    view = IndexView()
+    assert view.find_recently_passed(Bill) == []
+
+    # The cached list is kept until the passage commits.
+    with django_capture_on_commit_callbacks() as callbacks:
+        BillAction.objects.create(
+            bill=metro_bill,
+            organization=city_council,
+            description="Passed",
+            date=timezone.localdate().isoformat(),
+            classification=["passage"],
+            order=1,
+        )
+
+        assert view.find_recently_passed(Bill) == []
+
+    for callback in callbacks:
+        callback()
+
+    assert view.find_recently_passed(Bill) == [metro_bill]
+
+
+def test_cache_version_survives_eviction(settings, mocker):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+    clock = mocker.patch("councilmatic_core.utils.time.time", return_value=1000.0)
+
+    assert get_cache_version("bills") == 1000000
+    assert bump_cache_version("bills") == 1000001
+
+    cache.delete("councilmatic_cache_version:bills")
+    clock.return_value = 1001.0
+
+    # The version doesn't start over at one used before.
+    assert get_cache_version("bills") == 1001000
+
+
+def test_normalize_identifier():
+    assert normalize_identifier("O2011 0123") == "O2011123"
+    assert normalize_identifier("o2011 123") == "O2011123"
+    assert normalize_identifier("O20110123") == "O2011123"
+    assert normalize_identifier("O2011 0") == normalize_identifier("O201100")
+    assert normalize_identifier("File #2011 123") == "2011123"
+    assert normalize_identifier("2018-0285") == "2018-0285"
+
+
+@pytest.mark.django_db
+def test_identifier_search_redirects(metro_bill, mocker):
+    metro_bill.slug = "2018-0285"
+    metro_bill.save()
+
+    view = CouncilmaticFacetedSearchView()
+    search = mocker.patch("haystack.views.FacetedSearchView.__call__")
+
+    response = view(RequestFactory().get("/search/", {"q": " file #2018-0285"}))
+    assert response.status_code == 302
+    assert response.url == "/legislation/2018-0285/"
+    search.assert_not_called()
+
+    # Bare numbers, like years, are searched for, even when a bill has them
+    # as its identifier.
+    for q in ("2018-0285", "2019", "311", "2018-0286", "utility relocations"):
+        view(RequestFactory().get("/search/", {"q": q}))
+        search.assert_called()
+        search.reset_mock()
+
+
+def test_identifier_pattern():
+    for q in ("O2011-1234", "File #2011 123", "#2019", "file # 2018-0285", "bl 12"):
+        assert SEARCH_IDENTIFIER_RE.match(q), q
+
+    for q in ("2019", "311", "2018-0285", "ordinance 2019", "file 2019 budget"):
+        assert not SEARCH_IDENTIFIER_RE.match(q), q
+
+
+def test_subscriptions_are_remembered(mocker, settings):
+    settings.USING_NOTIFICATIONS = True
+
+    request = RequestFactory().get("/")
+    request.user = mocker.Mock(is_authenticated=True)
+    subscriptions = request.user.personsubscriptions.all.return_value
+    subscriptions.filter.return_value.exists.return_value = True
+
+    person = mocker.Mock(pk="ocd-person/1")
+
+    assert get_subscriptions(request).is_subscribed("person", person)
+    assert get_subscriptions(request).is_subscribed("person", person)
+    subscriptions.filter.assert_called_once_with(person="ocd-person/1")
+
+    anonymous_request = RequestFactory().get("/")
+    anonymous_request.user = AnonymousUser()
+    assert not get_subscriptions(anonymous_request).is_subscribed("person", person)